@@ -0,0 +1,127 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Commands and the helpers backing them
+
+Ranger imports every directory in plugins/ as a plugin, so importing this
+package registers the extra settings the commands use.  Their defaults can be
+overridden in rc.conf like any other setting.
+
+Ranger only registers the commands found in the plugin module itself, so the
+commands in commands.py, which override stock ones like cd and scout, are
+registered here, through the ranger.fm that ranger sets while it imports
+plugins.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+import ranger.api
+from ranger.container.settings import (
+    ALLOWED_SETTINGS, SIGNAL_PRIORITY_SANITIZE, SIGNAL_PRIORITY_SYNC)
+from ranger.core.shared import SettingsAware
+
+
+SETTINGS = {
+    'cd_tab_index': (bool, True),
+    'cd_tab_time_budget': (float, 0.3),
+    'cd_tab_max_dirs': (int, 2000),
+    'cd_frecency': (bool, True),
+    'cd_frecency_max_entries': (int, 200000),
+    'content_filter_workers': (int, 4),
+    'content_filter_max_bytes': (int, 1048576),
+    'grep_workers': (int, 0),
+    'grep_context_lines': (int, 3),
+    'grep_index_max_size': (int, 256),
+    'flat_max_entries': (int, 100000),
+    'flat_cache': (bool, True),
+    'flat_cache_max_size': (int, 64),
+    'delete_workers': (int, 0),
+    'delete_scan_budget': (float, 5.0),
+    'trash_native': (bool, True),
+    'tags_log': (bool, True),
+    'copy_buffer_log': (bool, True),
+    'copy_buffer_share': (bool, False),
+    'yank_clipboard': (str, 'auto'),
+}
+
+
+def _register_settings():
+    settings = getattr(SettingsAware, 'settings', None)
+    for name, (typ, default) in SETTINGS.items():
+        if name in ALLOWED_SETTINGS:
+            continue
+        ALLOWED_SETTINGS[name] = typ
+        if settings is not None:
+            # Settings binds these only for the settings it knew when created;
+            # without them, setting a value would do nothing
+            # pylint: disable=protected-access
+            settings.signal_bind('setopt.' + name, settings._sanitize,
+                                 priority=SIGNAL_PRIORITY_SANITIZE)
+            settings.signal_bind('setopt.' + name, settings._raw_set_with_signal,
+                                 priority=SIGNAL_PRIORITY_SYNC)
+            settings.set(name, default)
+
+
+_register_settings()
+
+# Registers the content filters of the filter stack and the trash linemode
+from . import (  # noqa: E402,F401 pylint: disable=wrong-import-position,unused-import
+    contentfilter, trash)
+from . import commands  # noqa: E402 pylint: disable=wrong-import-position
+
+if getattr(ranger, 'fm', None) is not None:
+    ranger.fm.commands.load_commands_from_module(commands)
+
+
+HOOK_INIT_OLD = ranger.api.hook_init
+
+
+def hook_init(fm):
+    from ranger.container.tags import Tags
+    from .tagindex import IndexedTags
+    from .taglog import LoggedTags
+    if type(fm.tags) is Tags:  # pylint: disable=unidiomatic-typecheck
+        if fm.settings.tags_log:
+            logfile = fm.datapath('tagged.log')
+            first_run = not os.path.exists(logfile)
+            classic = fm.tags
+            fm.tags = LoggedTags(logfile)
+            if first_run and classic.tags:
+                fm.tags.tags.update(classic.tags)
+                fm.tags.dump()
+        else:
+            fm.tags = IndexedTags.from_tags(fm.tags)
+
+    from .column import patch_browser_column
+    patch_browser_column()
+
+    from .copybuffer import install
+    logfile = None
+    if fm.settings.copy_buffer_log and not ranger.args.clean:
+        logfile = fm.datapath('copy_buffer.log')
+    buffer = install(fm, logfile)
+    if fm.settings.copy_buffer_share and not ranger.args.clean:
+        from .copyshare import share
+        try:
+            share(fm, buffer)
+        except OSError as err:
+            fm.notify('Cannot share the copy buffer: %s' % err, bad=True)
+
+    def record_visit(signal):
+        if not fm.settings.cd_frecency or signal.new is None:
+            return
+        from .frecency import get_frecency_store
+        store = get_frecency_store(fm.datapath('frecency'),
+                                   fm.settings.cd_frecency_max_entries, sync=False)
+        try:
+            store.add(signal.new.path)
+        except OSError as err:
+            fm.notify(err, bad=True)
+
+    fm.signal_bind('cd', record_visit)
+    return HOOK_INIT_OLD(fm)
+
+
+ranger.api.hook_init = hook_init
@@ -0,0 +1,159 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Writing to the clipboard without waiting for the clipboard tools
+
+The first clipboard tool on $PATH is looked up once and remembered until
+$PATH or the modification time of one of its directories changes, which is
+when a tool can have been installed or removed.
+
+The text is handed to a writer thread, which starts the tool for every
+target (xclip and xsel have two) at once and pipes the text into them.
+The tools own the selection after the write, so they can't be kept
+running, but yank returns as soon as the text is queued.  Only the latest
+text waits: a yank made while the tools are still busy replaces the one
+queued before it, so a burst of large yanks costs one write.
+
+The "yank_clipboard" setting names a command that gets the text on stdin
+instead of the detected tool, like "tmux load-buffer -", or "tee FILE" as
+a stand-in for the clipboard when there's no display.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import atexit
+import os
+import shlex
+import subprocess
+import threading
+
+
+TOOLS = (
+    ('pbcopy', [[]]),
+    ('wl-copy', [[]]),
+    ('xclip', [[], ['-selection', 'clipboard']]),
+    ('xsel', [[], ['-b']]),
+)
+WAIT_SECONDS = 5.0
+
+_DETECTED = {}
+
+
+def _which(name, dirs):
+    for directory in dirs:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def detect():
+    """The commands of the first clipboard tool on $PATH, or []"""
+    dirs = [d for d in os.environ.get('PATH', os.defpath).split(os.pathsep) if d]
+    mtimes = []
+    for directory in dirs:
+        try:
+            mtimes.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    key = (tuple(dirs), tuple(mtimes))
+    commands = _DETECTED.get(key)
+    if commands is None:
+        commands = []
+        for name, targets in TOOLS:
+            path = _which(name, dirs)
+            if path is not None:
+                commands = [[path] + target for target in targets]
+                break
+        _DETECTED.clear()
+        _DETECTED[key] = commands
+    return commands
+
+
+def clipboard_commands(setting=''):
+    """The commands to pipe the text into, from the setting or detected"""
+    if setting and setting != 'auto':
+        return [shlex.split(setting)]
+    return detect()
+
+
+class ClipboardWriter(object):
+    """Pipes texts into clipboard commands in a thread
+
+    `error' is the last error of a command, until someone takes it.
+    """
+
+    def __init__(self):
+        self.error = None
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._thread = None
+
+    def write(self, commands, text):
+        """Queue text for commands, replacing what wasn't written yet"""
+        with self._cond:
+            self._pending = (commands, text)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued was written; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._busy, timeout)
+
+    def take_error(self):
+        with self._cond:
+            error, self.error = self.error, None
+            return error
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._pending is not None)
+                (commands, text), self._pending = self._pending, None
+                self._busy = True
+            error = self._run(commands, text.encode('utf-8', 'surrogateescape'))
+            if error is not None:
+                with self._cond:
+                    self.error = error
+
+    @staticmethod
+    def _run(commands, data):
+        """Start every command, then feed them; returns the first error"""
+        error = None
+        processes = []
+        for command in commands:
+            try:
+                processes.append(subprocess.Popen(
+                    command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, start_new_session=True))
+            except OSError as err:
+                error = error or err
+        for process in processes:
+            try:
+                process.stdin.write(data)
+                process.stdin.close()
+            except OSError as err:
+                error = error or err
+        for process in processes:
+            try:
+                # xclip, xsel and wl-copy fork to serve the selection
+                process.wait(WAIT_SECONDS)
+            except subprocess.TimeoutExpired as err:
+                process.kill()
+                process.wait()
+                error = error or err
+        return error
+
+
+WRITER = ClipboardWriter()
+
+# Don't lose a yank made right before quitting
+atexit.register(WRITER.flush, WAIT_SECONDS)
@@ -0,0 +1,91 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""What a browser column sees of the file manager while it draws
+
+Ranger's column lists the paths of the whole copy buffer every time it
+draws a directory, and looks up every file it draws in all tags.
+patch_browser_column() makes the column draw with a ColumnView as its fm
+instead.  The view answers copy_buffer with just the copied files among
+those the column shows.  Its tags look up the files of the column's
+directory in the tags of that directory, which IndexedTags keeps, and
+other paths in all tags.  Everything else is handed to the file manager,
+and other code that uses the file manager during the draw sees it as is.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+
+class ColumnView(object):  # pylint: disable=too-few-public-methods
+    """The file manager as seen by one column while it draws"""
+
+    def __init__(self, fm, column):
+        self._fm = fm
+        self._column = column
+        self._tags = None
+
+    def __getattr__(self, name):
+        return getattr(self._fm, name)
+
+    @property
+    def copy_buffer(self):
+        # Read when the column asks, after it has set its scroll position
+        buffer = self._fm.copy_buffer
+        visible_in = getattr(buffer, 'visible_in', None)
+        if visible_in is None:
+            return buffer
+        column = self._column
+        start = column.scroll_begin
+        return visible_in(column.target.files[start:start + column.hei])
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            tags = self._fm.tags
+            if getattr(tags, 'tagged_in', None) is not None:
+                tags = DirectoryTags(tags, self._column.target.path)
+            self._tags = tags
+        return self._tags
+
+
+class DirectoryTags(object):
+    """The tags of IndexedTags as seen from one directory
+
+    Only `in' and marker() are supported, which is what the column uses.
+    The tags of the directory are looked up once.
+    """
+
+    def __init__(self, tags, directory):
+        self.default_tag = tags.default_tag
+        self._all = tags.tags
+        self._head = directory.rstrip('/')
+        self._tagged = tags.tagged_in(directory)
+
+    def _get(self, path):
+        head, _, name = path.rpartition('/')
+        if head == self._head:
+            return self._tagged.get(name)
+        return self._all.get(path)
+
+    def __contains__(self, path):
+        return path is not None and self._get(path) is not None
+
+    def marker(self, path):
+        tag = self._get(path)
+        return self.default_tag if tag is None else tag
+
+
+def patch_browser_column():
+    from ranger.gui.widgets.browsercolumn import BrowserColumn
+    draw = BrowserColumn._draw_directory  # pylint: disable=protected-access
+    if getattr(draw, 'view_patched', False):
+        return
+
+    def _draw_directory(column):
+        column.fm = ColumnView(column.fm, column)
+        try:
+            return draw(column)
+        finally:
+            del column.fm  # back to the class attribute
+    _draw_directory.view_patched = True
+    BrowserColumn._draw_directory = _draw_directory  # pylint: disable=protected-access
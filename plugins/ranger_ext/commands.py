@@ -0,0 +1,1530 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""The commands of the plugin, overriding ranger's own of the same name
+
+Ranger registers the commands of a plugin's top module only, so the package
+loads this module's commands explicitly.  commands_full.py stays ranger's
+reference copy of the stock commands.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+
+from ranger.api.commands import Command
+
+
+class cd(Command):
+    """:cd [-r] <path>
+    :cd -z <tokens...>
+
+    The cd command changes the directory.
+    If the path is a file, selects that file.
+    The command 'cd -' is equivalent to typing ``.
+    Using the option "-r" will get you to the real path.
+    Using the option "-z" will jump to the most frecent visited directory
+    whose base name starts with the last token and whose path contains the
+    other tokens in order.
+    """
+
+    _scan = None
+
+    def _frecency_store(self):
+        from .frecency import get_frecency_store
+        return get_frecency_store(self.fm.datapath('frecency'),
+                                  self.fm.settings.cd_frecency_max_entries)
+
+    def _jump(self, tokens):
+        store = self._frecency_store()
+        for path in store.query(tokens):
+            if os.path.isdir(path):
+                self.fm.cd(path)
+                return
+            store.remove(path)
+        self.fm.notify("No visited directory matches: %s" % ' '.join(tokens), bad=True)
+
+    def execute(self):
+        if self.arg(1) == '-z':
+            self._jump(self.args[2:])
+            return
+
+        if self.arg(1) == '-r':
+            self.shift()
+            destination = os.path.realpath(self.rest(1))
+            if os.path.isfile(destination):
+                self.fm.select_file(destination)
+                return
+        else:
+            destination = self.rest(1)
+
+        if not destination:
+            destination = '~'
+
+        if destination == '-':
+            self.fm.enter_bookmark('`')
+        else:
+            self.fm.cd(destination)
+
+    def _tab_args(self):
+        # dest must be rest because path could contain spaces
+        if self.arg(1) == '-r':
+            start = self.start(2)
+            dest = self.rest(2)
+        else:
+            start = self.start(1)
+            dest = self.rest(1)
+
+        if dest:
+            head, tail = os.path.split(os.path.expanduser(dest))
+            if head:
+                dest_exp = os.path.join(os.path.normpath(head), tail)
+            else:
+                dest_exp = tail
+        else:
+            dest_exp = ''
+        return (start, dest_exp, os.path.join(self.fm.thisdir.path, dest_exp),
+                dest.endswith(os.path.sep))
+
+    def _tab_paths(self, dest, dest_abs, ends_with_sep):
+        def generate(prefix):
+            try:
+                for path in self._scan.subdirs(dest_abs):
+                    yield os.path.join(prefix, path)
+            except OSError:
+                pass
+
+        if not dest:
+            return generate(''), dest_abs
+
+        if ends_with_sep:
+            return generate(dest), ''
+
+        return None, None
+
+    def _tab_match(self, path_user, path_file):
+        if self.fm.settings.cd_tab_case == 'insensitive':
+            path_user = path_user.lower()
+            path_file = path_file.lower()
+        elif self.fm.settings.cd_tab_case == 'smart' and path_user.islower():
+            path_file = path_file.lower()
+        return path_file.startswith(path_user)
+
+    def _tab_normal(self, dest, dest_abs):
+        dest_dir = os.path.dirname(dest)
+        dest_base = os.path.basename(dest)
+
+        def generate():
+            try:
+                dirnames = self._scan.subdirs(os.path.dirname(dest_abs))
+            except OSError:
+                return
+            for d in dirnames:
+                if self._tab_match(dest_base, d):
+                    yield os.path.join(dest_dir, d)
+
+        return generate(), ''
+
+    def _tab_fuzzy_match(self, basepath, tokens):
+        """ Find directories matching tokens recursively """
+        if self.fm.settings.cd_tab_index:
+            from .dirindex import get_dir_index
+            index = get_dir_index(self.fm.datapath('dirindex'))
+            for path in index.fuzzy_match(basepath, tokens, self._tab_match,
+                                          check=self._scan.check,
+                                          max_dirs=self.fm.settings.cd_tab_max_dirs):
+                yield path
+            return
+
+        if not tokens:
+            tokens = ['']
+        paths = [basepath]
+        while paths:
+            token = tokens.pop()
+            matches = []
+            for path in paths:
+                try:
+                    directories = self._scan.subdirs(path)
+                except OSError:
+                    continue
+                found = [os.path.join(path, d) for d in directories
+                         if self._tab_match(token, d)]
+                if tokens:
+                    matches += found
+                else:
+                    for match in found:
+                        yield match
+            paths = matches
+
+    def _tab_fuzzy(self, dest, dest_abs):
+        if not os.path.isabs(dest):
+            paths_rel = self.fm.thisdir.path
+        else:
+            paths_rel = ''
+
+        def generate():
+            tokens = []
+            basepath = dest_abs
+            while True:
+                basepath_old = basepath
+                basepath, token = os.path.split(basepath)
+                if basepath == basepath_old:
+                    break
+                if os.path.isdir(basepath_old) and not token.startswith('.'):
+                    basepath = basepath_old
+                    break
+                tokens.append(token)
+
+            for path in self._tab_fuzzy_match(basepath, tokens):
+                if paths_rel:
+                    yield os.path.relpath(os.path.join(basepath, path), paths_rel)
+                else:
+                    yield path
+
+        return generate(), paths_rel
+
+    def _tab_frecency(self):
+        paths = self._frecency_store().query(self.args[2:], limit=50)
+        return [self.start(1) + path for path in paths] or None
+
+    def quick(self):
+        from .completion import cancel_pending
+        cancel_pending()
+        return False
+
+    def tab(self, tabnum):
+        from os.path import sep
+        from .completion import Completion
+
+        if self.arg(1) == '-z':
+            return self._tab_frecency()
+
+        start, dest, dest_abs, ends_with_sep = self._tab_args()
+
+        # The directories are listed on a worker thread so that a slow or
+        # dead mount can not freeze the console.
+        self._scan = Completion(max_dirs=self.fm.settings.cd_tab_max_dirs)
+        paths, paths_rel = self._tab_paths(dest, dest_abs, ends_with_sep)
+        if paths is None:
+            if self.fm.settings.cd_tab_fuzzy:
+                paths, paths_rel = self._tab_fuzzy(dest, dest_abs)
+            else:
+                paths, paths_rel = self._tab_normal(dest, dest_abs)
+        paths = self._scan.collect(paths, self.fm.settings.cd_tab_time_budget)
+        if self._scan.partial:
+            self.fm.notify("Tab completion incomplete after scanning %d directories"
+                           % self._scan.dirs_scanned)
+
+        paths.sort()
+
+        if self.fm.settings.cd_bookmarks:
+            from .prefixtree import BookmarkTree
+            tree = BookmarkTree.get(self.fm.bookmarks)
+            paths[0:0] = [
+                os.path.relpath(bookmark, paths_rel) if paths_rel else bookmark
+                for path in paths
+                for bookmark in tree.below(os.path.join(paths_rel, path))
+            ]
+
+        if not paths:
+            return None
+        if len(paths) == 1:
+            return start + paths[0] + sep
+        return [start + dirname + sep for dirname in paths]
+
+
+class delete(Command):
+    """:delete
+
+    Tries to delete the selection or the files passed in arguments (if any).
+    The arguments use a shell-like escaping.
+
+    "Selection" is defined as all the "marked files" (by default, you
+    can mark files with space or v). If there are no marked files,
+    use the "current file" (where the cursor is)
+
+    When attempting to delete non-empty directories or multiple
+    marked files, it will require a confirmation.
+
+    The files are deleted in the background.  Removing the task from the
+    task view (w) cancels the deletion.
+    """
+
+    allow_abbrev = False
+    escape_macros_for_shell = True
+
+    def execute(self):
+        import shlex
+        from functools import partial
+        from .delete import ask_confirmation, delete_files, has_entries
+
+        if self.rest(1):
+            files = shlex.split(self.rest(1))
+            many_files = (len(files) > 1 or has_entries(files[0]))
+        else:
+            cwd = self.fm.thisdir
+            tfile = self.fm.thisfile
+            if not cwd or not tfile:
+                self.fm.notify("Error: no file selected for deletion!", bad=True)
+                return
+
+            # relative_path used for a user-friendly output in the confirmation.
+            files = [f.relative_path for f in self.fm.thistab.get_selection()]
+            many_files = (cwd.marked_items or has_entries(tfile.path))
+
+        confirm = self.fm.settings.confirm_on_delete
+        if confirm != 'never' and (confirm != 'multiple' or many_files):
+            ask_confirmation(self.fm, 'deletion', files,
+                             partial(self._question_callback, files))
+        else:
+            # no need for a confirmation, just delete
+            delete_files(self.fm, files)
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+    def _question_callback(self, files, answer, scan=None):
+        from .delete import delete_files
+
+        if answer == 'y' or answer == 'Y':
+            delete_files(self.fm, files, scan)
+
+
+class trash(Command):
+    """:trash
+
+    Tries to move the selection or the files passed in arguments (if any) to
+    the trash.  With the setting trash_native, the files are renamed into the
+    freedesktop.org trash of their filesystem; otherwise the rifle rules with
+    label "trash" are used.
+    The arguments use a shell-like escaping.
+
+    "Selection" is defined as all the "marked files" (by default, you
+    can mark files with space or v). If there are no marked files,
+    use the "current file" (where the cursor is)
+
+    When attempting to trash non-empty directories or multiple
+    marked files, it will require a confirmation.
+    """
+
+    allow_abbrev = False
+    escape_macros_for_shell = True
+
+    def execute(self):
+        import shlex
+        from functools import partial
+        from .delete import ask_confirmation, has_entries
+
+        if self.rest(1):
+            files = shlex.split(self.rest(1))
+            many_files = (len(files) > 1 or has_entries(files[0]))
+        else:
+            cwd = self.fm.thisdir
+            tfile = self.fm.thisfile
+            if not cwd or not tfile:
+                self.fm.notify("Error: no file selected for deletion!", bad=True)
+                return
+
+            # relative_path used for a user-friendly output in the confirmation.
+            files = [f.relative_path for f in self.fm.thistab.get_selection()]
+            many_files = (cwd.marked_items or has_entries(tfile.path))
+
+        confirm = self.fm.settings.confirm_on_delete
+        if confirm != 'never' and (confirm != 'multiple' or many_files):
+            ask_confirmation(self.fm, 'deletion', files,
+                             partial(self._question_callback, files))
+        else:
+            # no need for a confirmation, just delete
+            self._trash(files)
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+    def _question_callback(self, files, answer, _scan=None):
+        if answer == 'y' or answer == 'Y':
+            self._trash(files)
+
+    def _trash(self, files):
+        from .pathmove import move_paths
+        from .trash import trash_paths
+
+        if not self.fm.settings.trash_native:
+            self.fm.execute_file(files, label='trash')
+            return
+        moved, errors = trash_paths(files)
+        pairs = [(path, item.path) for path, item in moved]
+        move_paths(self.fm, pairs)
+        self.fm.copy_buffer.discard_paths(path for path, _ in pairs)
+        self.fm.thistab.ensure_correct_pointer()
+        if errors:
+            self.fm.notify("Trashed %d files; %d failed, first: %s"
+                           % (len(moved), len(errors), errors[0]), bad=True)
+        else:
+            self.fm.notify("Trashed %d files" % len(moved))
+
+
+class trash_open(Command):
+    """:trash_open [<path>]
+
+    Opens the trash that files in <path> (or the current directory) go to.
+    The files are listed with their original path and deletion date.
+    """
+
+    def execute(self):
+        from time import time
+        from .trash import TrashError, load_sizes, trash_for
+
+        path = self.rest(1) or self.fm.thisdir.path
+        try:
+            trash = trash_for(os.path.expanduser(path), create=False)
+        except (OSError, TrashError) as err:
+            self.fm.notify(err, bad=True)
+            return
+        if not os.path.isdir(trash.files_dir):
+            self.fm.notify("Nothing was trashed to %s yet" % trash.path)
+            return
+        self.fm.cd(trash.files_dir)
+        directory = self.fm.thisdir
+        # Files that aren't listed yet take the linemode from this rule
+        pattern = '^%s/[^/]+$' % re.escape(trash.files_dir)
+        if not any(method == 'path' and argument.pattern == pattern
+                   for method, argument, _ in self.fm.default_linemodes):
+            self.fm.default_linemodes.appendleft(['path', re.compile(pattern), 'trash'])
+        if directory.files is not None:
+            directory.set_linemode_of_children('trash')
+
+        def sizes_loaded():
+            # Makes the browser column draw the sizes on its next redraw
+            directory.last_update_time = time()
+            self.fm.ui.need_redraw = True
+        load_sizes(trash, sizes_loaded)
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+
+class trash_restore(Command):
+    """:trash_restore
+
+    Moves the selected files of a trash view back to where they came from.
+    """
+
+    def execute(self):
+        from .pathmove import move_paths
+        from .trash import TrashError, forget, trash_of_directory
+
+        trash = trash_of_directory(self.fm.thisdir.path)
+        if trash is None:
+            self.fm.notify("Not in a trash directory, see :trash_open", bad=True)
+            return
+        restored = []
+        errors = []
+        for fobj in self.fm.thistab.get_selection():
+            item = trash.read_item(fobj.basename)
+            if item is None:
+                errors.append("%s has no .trashinfo file" % fobj.basename)
+                continue
+            try:
+                trash.restore(item)
+            except (OSError, TrashError) as err:
+                errors.append(err)
+                continue
+            restored.append((item.path, item.original))
+        forget(path for path, _ in restored)
+        move_paths(self.fm, restored)
+        self.fm.thisdir.content_outdated = True
+        if errors:
+            self.fm.notify("Restored %d files; %d failed, first: %s"
+                           % (len(restored), len(errors), errors[0]), bad=True)
+        else:
+            self.fm.notify("Restored %d files" % len(restored))
+
+
+class trash_empty(Command):
+    """:trash_empty [<days>]
+
+    Deletes the files in the trash of the current directory's filesystem,
+    or only those that were trashed more than <days> days ago.  The files
+    are deleted in the background like with :delete.
+    """
+
+    def execute(self):
+        from functools import partial
+        from time import time
+        from .trash import TrashError, trash_for
+
+        try:
+            days = float(self.arg(1) or 0)
+        except ValueError:
+            self.fm.notify("Syntax: trash_empty [<days>]", bad=True)
+            return
+        try:
+            trash = trash_for(self.fm.thisdir.path, create=False)
+        except (OSError, TrashError) as err:
+            self.fm.notify(err, bad=True)
+            return
+        items = trash.items()
+        if days:
+            cutoff = time() - days * 86400
+            items = [item for item in items
+                     if item.deleted is not None and item.deleted < cutoff]
+        if not items:
+            self.fm.notify("Nothing to delete in %s" % trash.path)
+            return
+        self.fm.ui.console.ask(
+            "Delete %d files from %s for good? (y/N)" % (len(items), trash.path),
+            partial(self._question_callback, items),
+            ('n', 'N', 'y', 'Y'),
+        )
+
+    def _question_callback(self, items, answer):
+        from .trash import TrashEmptyLoader
+
+        if answer == 'y' or answer == 'Y':
+            self.fm.loader.add(TrashEmptyLoader(items, self.fm.settings.delete_workers))
+
+
+class mark_tag(Command):
+    """:mark_tag [<tags>]
+
+    Mark all tags that are tagged with either of the given tags.
+    When leaving out the tag argument, all tagged files are marked.
+    """
+    do_mark = True
+
+    def execute(self):
+        from .tagindex import tagged_files
+
+        cwd = self.fm.thisdir
+        tags = self.rest(1).replace(" ", "")
+        if not self.fm.tags or not cwd.files:
+            return
+        for fileobj, tag in tagged_files(self.fm.tags, cwd):
+            if not tags or tag in tags:
+                cwd.mark_item(fileobj, val=self.do_mark)
+        self.fm.ui.status.need_redraw = True
+        self.fm.ui.need_redraw = True
+
+
+class unmark_tag(mark_tag):
+    """:unmark_tag [<tags>]
+
+    Unmark all tags that are tagged with either of the given tags.
+    When leaving out the tag argument, all tagged files are unmarked.
+    """
+    do_mark = False
+
+
+class load_copy_buffer(Command):
+    """:load_copy_buffer
+
+    Load the copy buffer from datadir/copy_buffer
+    """
+    copy_buffer_filename = 'copy_buffer'
+
+    def execute(self):
+        from .copybuffer import CopyBufferCheck
+        fname = self.fm.datapath(self.copy_buffer_filename)
+        try:
+            fobj = open(fname, 'r', errors='surrogateescape')
+        except OSError:
+            return self.fm.notify(
+                "Cannot open %s" % (fname or self.copy_buffer_filename), bad=True)
+
+        # The paths that are gone are dropped by the check in the background
+        with fobj:
+            self.fm.copy_buffer = [g for g in fobj.read().split("\n") if g]
+        self.fm.loader.add(CopyBufferCheck(self.fm.copy_buffer))
+        self.fm.ui.redraw_main_column()
+        return None
+
+
+class save_copy_buffer(Command):
+    """:save_copy_buffer
+
+    Save the copy buffer to datadir/copy_buffer
+    """
+    copy_buffer_filename = 'copy_buffer'
+
+    def execute(self):
+        fname = None
+        fname = self.fm.datapath(self.copy_buffer_filename)
+        try:
+            fobj = open(fname, 'w', errors='surrogateescape')
+        except OSError:
+            return self.fm.notify("Cannot open %s" %
+                                  (fname or self.copy_buffer_filename), bad=True)
+        with fobj:
+            fobj.write("\n".join(self.fm.copy_buffer.paths()))
+        return None
+
+
+class tags_import(Command):
+    """:tags_import <file>
+
+    Adds the tags of a file in the format of ranger's "tagged" file.
+    """
+
+    def execute(self):
+        path = os.path.expanduser(self.rest(1))
+        if not path:
+            self.fm.notify("Syntax: tags_import <file>", bad=True)
+            return
+        if not hasattr(self.fm.tags, 'import_file'):
+            self.fm.notify("The tags are not kept in a log, see tags_log", bad=True)
+            return
+        try:
+            count = self.fm.tags.import_file(path)
+        except (OSError, IOError) as err:
+            self.fm.notify(err, bad=True)
+            return
+        self.fm.ui.need_redraw = True
+        self.fm.notify("Imported %d tags" % count)
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+
+class tags_export(Command):
+    """:tags_export <file>
+
+    Writes all tags to a file in the format of ranger's "tagged" file.
+    """
+
+    def execute(self):
+        path = os.path.expanduser(self.rest(1))
+        if not path:
+            self.fm.notify("Syntax: tags_export <file>", bad=True)
+            return
+        if not hasattr(self.fm.tags, 'export_file'):
+            self.fm.notify("The tags are not kept in a log, see tags_log", bad=True)
+            return
+        try:
+            self.fm.tags.export_file(path)
+        except (OSError, IOError) as err:
+            self.fm.notify(err, bad=True)
+            return
+        self.fm.notify("Exported %d tags to %s" % (len(self.fm.tags.tags), path))
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+
+class rename(Command):
+    """:rename <newname>
+
+    Changes the name of the currently highlighted file to <newname>
+    """
+
+    def execute(self):
+        from ranger.container.file import File
+        from os import access
+        from .pathmove import move_paths
+
+        new_name = self.rest(1)
+
+        if not new_name:
+            return self.fm.notify('Syntax: rename <newname>', bad=True)
+
+        if new_name == self.fm.thisfile.relative_path:
+            return None
+
+        if access(new_name, os.F_OK):
+            return self.fm.notify("Can't rename: file already exists!", bad=True)
+
+        if self.fm.rename(self.fm.thisfile, new_name):
+            file_new = File(new_name)
+            move_paths(self.fm, [(self.fm.thisfile.path, file_new.path)])
+            self.fm.thisdir.pointed_obj = file_new
+            self.fm.thisfile = file_new
+
+        return None
+
+    def tab(self, tabnum):
+        return self._tab_directory_content()
+
+
+class bulkrename(Command):
+    """:bulkrename [resume|rollback]
+
+    This command opens a list of selected files in an external editor.
+    After you edit and save the file, it will compute the renames needed
+    to apply your changes, creating directories and going through temporary
+    names where files swap their names.
+
+    The plan is opened in an editor for you to review.  After you close it,
+    the files are renamed by ranger itself.  If you edit the plan, it is run
+    as a shell script instead.
+
+    The progress is kept in a journal, so an interrupted run can be finished
+    with ":bulkrename resume" or undone with ":bulkrename rollback".
+    """
+
+    def execute(self):
+        # pylint: disable=too-many-locals,too-many-statements,too-many-branches
+        import sys
+        import tempfile
+        from ranger.container.file import File
+        from .rename import (
+            RenameError, RenameJournal, describe, plan_renames)
+        py3 = sys.version_info[0] >= 3
+
+        journal = RenameJournal(self.fm.datapath('bulkrename.journal'))
+        if self.arg(1) in ('resume', 'rollback'):
+            if not journal.exists():
+                self.fm.notify("No interrupted bulkrename to %s" % self.arg(1),
+                               bad=True)
+                return
+            try:
+                journal.load()
+                if self.arg(1) == 'resume':
+                    self._renamed(journal.run())
+                else:
+                    journal.rollback()
+                    self.fm.thisdir.content_outdated = True
+                    self.fm.notify("Bulkrename rolled back")
+            except (RenameError, OSError) as err:
+                self.fm.notify(err, bad=True)
+            return
+        if journal.exists():
+            self.fm.notify('An interrupted bulkrename is pending, use '
+                           '":bulkrename resume" or ":bulkrename rollback"', bad=True)
+            return
+
+        # Create and edit the file list
+        filenames = [f.relative_path for f in self.fm.thistab.get_selection()]
+        with tempfile.NamedTemporaryFile(delete=False) as listfile:
+            listpath = listfile.name
+            if py3:
+                listfile.write("\n".join(filenames).encode(
+                    encoding="utf-8", errors="surrogateescape"))
+            else:
+                listfile.write("\n".join(filenames))
+        self.fm.execute_file([File(listpath)], app='editor')
+        with (open(listpath, 'r', encoding="utf-8", errors="surrogateescape") if
+              py3 else open(listpath, 'r')) as listfile:
+            new_filenames = listfile.read().split("\n")
+        os.unlink(listpath)
+        if all(a == b for a, b in zip(filenames, new_filenames)):
+            self.fm.notify("No renaming to be done!")
+            return
+
+        # Compute the plan
+        base = self.fm.thisdir.path
+        try:
+            ops = plan_renames([
+                (os.path.join(base, old), os.path.join(base, new))
+                for old, new in zip(filenames, new_filenames) if old != new])
+        except RenameError as err:
+            self.fm.notify(err, bad=True)
+            return
+
+        with tempfile.NamedTemporaryFile() as cmdfile:
+            script_lines = []
+            script_lines.append("# These renames will be done when you close"
+                                " the editor.")
+            script_lines.append("# Please double-check everything, clear the"
+                                " file to abort.")
+            script_lines.append("# If you change anything, the file is run as"
+                                " a shell script instead.")
+            script_lines.extend(describe(ops))
+            # Make sure not to forget the ending newline
+            script_content = "\n".join(script_lines) + "\n"
+            if py3:
+                script_content = script_content.encode(encoding="utf-8",
+                                                       errors="surrogateescape")
+            cmdfile.write(script_content)
+            cmdfile.flush()
+
+            # Open the plan and let the user review it, then check if the
+            # plan was modified by the user
+            self.fm.execute_file([File(cmdfile.name)], app='editor')
+            cmdfile.seek(0)
+            edited_content = cmdfile.read()
+            if not edited_content.strip():
+                self.fm.notify("Bulkrename aborted")
+                return
+            if edited_content != script_content:
+                self.fm.run(['/bin/sh', cmdfile.name], flags='w')
+                self.fm.notify("files have not been retagged")
+                return
+
+        # Do the renaming
+        try:
+            self._renamed(journal.start(ops))
+        except (RenameError, OSError) as err:
+            self.fm.thisdir.content_outdated = True
+            self.fm.notify(err, bad=True)
+
+    def _renamed(self, pairs):
+        """Move tags and bookmarks along, update the files in the listing"""
+        from .pathmove import move_paths
+        from .rename import refresh_renamed
+
+        move_paths(self.fm, pairs)
+        refresh_renamed(self.fm, self.fm.thisdir, pairs)
+        self.fm.notify("Renamed %d files" % len(pairs))
+
+
+class scout(Command):
+    """:scout [-FLAGS...] <pattern>
+
+    Swiss army knife command for searching, traveling and filtering files.
+
+    Flags:
+     -a    Automatically open a file on unambiguous match
+     -e    Open the selected file when pressing enter
+     -f    Filter files that match the current search pattern
+     -g    Interpret pattern as a glob pattern
+     -i    Ignore the letter case of the files
+     -k    Keep the console open when changing a directory with the command
+     -l    Letter skipping; e.g. allow "rdme" to match the file "readme"
+     -m    Mark the matching files after pressing enter
+     -M    Unmark the matching files after pressing enter
+     -p    Permanent filter: hide non-matching files after pressing enter
+     -r    Interpret pattern as a regular expression pattern
+     -R    Recursive; search the whole subtree and list the matches in place
+           of the directory content as they are found
+     -s    Smart case; like -i unless pattern contains upper case letters
+     -t    Apply filter and search pattern as you type
+     -v    Inverts the match
+     -z    Fuzzy matching; jump to the best match and, when filtering, sort
+           the matches by how well they match
+
+    Multiple flags can be combined.  For example, ":scout -gpt" would create
+    a :filter-like command using globbing.
+    """
+    # pylint: disable=bad-whitespace
+    AUTO_OPEN     = 'a'
+    OPEN_ON_ENTER = 'e'
+    FILTER        = 'f'
+    SM_GLOB       = 'g'
+    IGNORE_CASE   = 'i'
+    KEEP_OPEN     = 'k'
+    SM_LETTERSKIP = 'l'
+    MARK          = 'm'
+    UNMARK        = 'M'
+    PERM_FILTER   = 'p'
+    SM_REGEX      = 'r'
+    RECURSIVE     = 'R'
+    SMART_CASE    = 's'
+    AS_YOU_TYPE   = 't'
+    INVERT        = 'v'
+    SM_FUZZY      = 'z'
+    # pylint: enable=bad-whitespace
+
+    # The directory, its files, the flags and the regex of the last filter
+    # applied as you type, so that the next keypress can narrow the matches.
+    _last_filter = None
+
+    # The (directory, flags, pattern), listing and loader of the running
+    # recursive search.
+    _recursive = None
+
+    # The file list and regex the match positions were computed for, the
+    # positions themselves and, in ranked mode, {position: rank}.
+    _index = None
+
+    def __init__(self, *args, **kwargs):
+        super(scout, self).__init__(*args, **kwargs)
+        self._regex = None
+        self.flags, self.pattern = self.parse_flags()
+
+    def execute(self):  # pylint: disable=too-many-branches
+        thisdir = self.fm.thisdir
+        flags = self.flags
+        pattern = self.pattern
+        regex = self._build_regex()
+        count = self._count(move=True)
+
+        self.fm.thistab.last_search = regex
+        self.fm.set_search_method(order="search")
+
+        if self.RECURSIVE in flags:
+            # Keep the search running and its results listed
+            self._search_recursive()
+            scout._recursive = None
+            return
+
+        if (self.MARK in flags or self.UNMARK in flags) and thisdir.files:
+            value = flags.find(self.MARK) > flags.find(self.UNMARK)
+            if self.FILTER in flags:
+                for fobj in thisdir.files:
+                    thisdir.mark_item(fobj, value)
+            else:
+                for fobj in thisdir.files:
+                    if regex.search(fobj.relative_path):
+                        thisdir.mark_item(fobj, value)
+
+        if self.PERM_FILTER in flags:
+            thisdir.filter = regex if pattern else None
+
+        # clean up:
+        self.cancel()
+
+        if self.OPEN_ON_ENTER in flags or \
+                (self.AUTO_OPEN in flags and count == 1):
+            if pattern == '..':
+                self.fm.cd(pattern)
+            else:
+                self.fm.move(right=1)
+                if self.quickly_executed:
+                    self.fm.block_input(0.5)
+
+        if self.KEEP_OPEN in flags and thisdir != self.fm.thisdir:
+            # reopen the console:
+            if not pattern:
+                self.fm.open_console(self.line)
+            else:
+                self.fm.open_console(self.line[0:-len(pattern)])
+
+        if self.quickly_executed and thisdir != self.fm.thisdir and pattern != "..":
+            self.fm.block_input(0.5)
+
+    def cancel(self):
+        if self.RECURSIVE in self.flags:
+            self._stop_recursive(restore=True)
+            return
+        scout._last_filter = None
+        self.fm.thisdir.temporary_filter = None
+        self.fm.thisdir.refilter()
+
+    def quick(self):
+        asyoutype = self.AS_YOU_TYPE in self.flags
+        if self.RECURSIVE in self.flags:
+            if asyoutype:
+                self._search_recursive()
+            return False
+        if self.FILTER in self.flags:
+            self.fm.thisdir.temporary_filter = self._build_regex()
+        if self.PERM_FILTER in self.flags and asyoutype:
+            self.fm.thisdir.filter = self._build_regex()
+        if self.FILTER in self.flags or self.PERM_FILTER in self.flags and asyoutype:
+            self._refilter()
+        elif self.PERM_FILTER in self.flags:
+            # The filter is only set on <Enter>, keep showing all files
+            self.fm.thisdir.refilter()
+        if self._count(move=asyoutype) == 1 and self.AUTO_OPEN in self.flags:
+            return True
+        return False
+
+    def _narrows(self, previous):
+        """Whether the matches of the current regex are a subset of previous
+
+        This holds if the pattern only grew, since the regex of the old pattern
+        is then a prefix of the new one.  In regex mode that is only true for
+        patterns without special characters, and inverting breaks it.
+        """
+        thisdir, files, flags, regex = previous
+        if thisdir is not self.fm.thisdir or files is not thisdir.files:
+            return False
+        if flags != self.flags or self.INVERT in flags:
+            return False
+        if self.SM_REGEX in flags and \
+                re.search(r'[\\.^$*+?{}\[\]|()]', self.pattern.lstrip('^')):
+            return False
+        new_regex = self._build_regex()
+        if regex.flags & re.IGNORECASE and not new_regex.flags & re.IGNORECASE:
+            return False
+        return new_regex.pattern.startswith(regex.pattern)
+
+    def _refilter(self):
+        """Refilter the directory, narrowing the last matches if possible"""
+        from time import time
+
+        thisdir = self.fm.thisdir
+        regex = self._build_regex()
+        if scout._last_filter is not None and self._narrows(scout._last_filter):
+            search = regex.search
+            thisdir.files = [f for f in thisdir.files if search(f.basename)]
+            # Do what Directory.refilter() does after filtering
+            thisdir.last_update_time = time()
+            if thisdir.files and not thisdir.pointed_obj:
+                thisdir.pointed_obj = thisdir.files[0]
+            elif not thisdir.files:
+                thisdir.content_loaded = False
+                thisdir.pointed_obj = None
+            thisdir.move_to_obj(thisdir.pointed_obj)
+        else:
+            thisdir.refilter()
+        if self._ranked() and (self.FILTER in self.flags or
+                               self.AS_YOU_TYPE in self.flags):
+            files = thisdir.files
+            thisdir.files = [files[i] for i in regex.rank([f.basename for f in files])]
+            thisdir.move_to_obj(thisdir.pointed_obj)
+        scout._last_filter = (thisdir, thisdir.files, self.flags, regex)
+
+    def _stop_recursive(self, restore=False):
+        if scout._recursive is None:
+            return
+        _, listing, loader = scout._recursive
+        scout._recursive = None
+        loader.cancel()
+        if restore:
+            listing.restore()
+
+    def _search_recursive(self):
+        """Search the subtree below the directory, streaming the matches"""
+        from .virtual import StreamLoader, VirtualListing
+        from .walker import ParallelWalker
+
+        thisdir = self.fm.thisdir
+        key = (thisdir, self.flags, self.pattern)
+        if scout._recursive is not None and scout._recursive[0] == key:
+            return
+        self._stop_recursive(restore=not self.pattern)
+        if not self.pattern:
+            return
+
+        search = self._build_regex().search
+        skip = None
+        if not self.fm.settings.show_hidden and self.fm.settings.hidden_filter:
+            skip = re.compile(self.fm.settings.hidden_filter).search
+        walker = ParallelWalker(thisdir.path, skip=skip,
+                                accept=lambda entry: search(entry.name))
+        listing = VirtualListing(thisdir)
+        listing.begin()
+        loader = StreamLoader(walker.start(), listing,
+                              'Searching for "%s"' % self.pattern)
+        listing.on_leave = loader.cancel
+        self.fm.loader.add(loader)
+        scout._recursive = (key, listing, loader)
+
+    def _ranked(self):
+        return self.SM_FUZZY in self.flags and self.INVERT not in self.flags
+
+    def tab(self, tabnum):
+        self._count(move=True, offset=tabnum)
+
+    def _build_regex(self):
+        if self._regex is not None:
+            return self._regex
+
+        frmat = "%s"
+        flags = self.flags
+        pattern = self.pattern
+
+        if pattern == ".":
+            return re.compile("")
+
+        ignore_case = self.IGNORE_CASE in flags or \
+            self.SMART_CASE in flags and pattern.islower()
+
+        if self.SM_FUZZY in flags:
+            from .matcher import FuzzyMatcher, InvertedMatcher
+            self._regex = FuzzyMatcher(pattern, ignore_case)
+            if self.INVERT in flags:
+                self._regex = InvertedMatcher(self._regex)
+            return self._regex
+
+        # Handle carets at start and dollar signs at end separately
+        raw_pattern = pattern
+        if pattern.startswith('^'):
+            pattern = pattern[1:]
+            frmat = "^" + frmat
+        if pattern.endswith('$'):
+            pattern = pattern[:-1]
+            frmat += "$"
+
+        # Apply one of the search methods
+        if self.SM_REGEX in flags:
+            regex = pattern
+        elif self.SM_GLOB in flags:
+            regex = re.escape(pattern).replace("\\*", ".*").replace("\\?", ".")
+        elif self.SM_LETTERSKIP in flags:
+            regex = ".*".join(re.escape(c) for c in pattern)
+        else:
+            regex = re.escape(pattern)
+
+        regex = frmat % regex
+
+        # Compile Regular Expression
+        # pylint: disable=no-member
+        options = re.UNICODE
+        if ignore_case:
+            options |= re.IGNORECASE
+        # pylint: enable=no-member
+
+        # Globs and letter skipping get matchers that can't backtrack; the
+        # regex serves as their pattern so that it reads the same as before
+        from .matcher import \
+            GlobMatcher, InvertedMatcher, SubsequenceMatcher
+        if self.SM_GLOB in flags:
+            self._regex = GlobMatcher(raw_pattern, regex, ignore_case)
+        elif self.SM_LETTERSKIP in flags:
+            self._regex = SubsequenceMatcher(raw_pattern, regex, ignore_case)
+        else:
+            try:
+                self._regex = re.compile(regex, options)
+            except re.error:
+                self._regex = re.compile("")
+                return self._regex
+
+        # Invert regular expression if necessary
+        if self.INVERT in flags:
+            self._regex = InvertedMatcher(self._regex, "^(?:(?!%s).)*$" % regex)
+        return self._regex
+
+    def _index_key(self):
+        regex = self._build_regex()
+        return (len(self.fm.thisdir.files), type(regex), regex.pattern, regex.flags)
+
+    def _cached_index(self):
+        """The positions and ranks of _match_index() if they are computed"""
+        index = scout._index
+        if index is not None and index[0] is self.fm.thisdir.files \
+                and index[1] == self._index_key():
+            return index[2], index[3]
+        return None
+
+    def _match_index(self):
+        """Return the positions of the matching files, computed once per pattern
+
+        The index is kept until the file list or the regex changes, so that
+        cycling through the matches with <TAB> doesn't search again.  In
+        ranked mode the positions are ordered by score instead of position,
+        and the ranks map a position to its place in that order.
+        """
+        cached = self._cached_index()
+        if cached is not None:
+            return cached
+        files = self.fm.thisdir.files
+        regex = self._build_regex()
+        if self._ranked():
+            positions = regex.rank([f.relative_path for f in files])
+            ranks = dict((position, rank) for rank, position in enumerate(positions))
+        else:
+            search = regex.search
+            positions = [i for i, fobj in enumerate(files)
+                         if search(fobj.relative_path)]
+            ranks = None
+        scout._index = (files, self._index_key(), positions, ranks)
+        return positions, ranks
+
+    def _count_from_pointer(self, move):
+        """Count the matches from the pointer on, stopping at the second one
+
+        Returns 0, 1, or 2 for two or more matches, which is all that the
+        callers need.  The first match is moved to if `move' is set.
+        """
+        from itertools import chain
+
+        cwd = self.fm.thisdir
+        files = cwd.files
+        search = self._build_regex().search
+        start = cwd.pointer % len(files)
+        count = 0
+        for i in chain(range(start, len(files)), range(start)):
+            if search(files[i].relative_path):
+                count += 1
+                if count > 1:
+                    break
+                if move:
+                    cwd.move(to=i)
+                    self.fm.thisfile = cwd.pointed_obj
+        return count
+
+    def _count(self, move=False, offset=0):
+        """Count the matches and move to the next one if `move' is set
+
+        Cycling with an offset uses the match index.  Otherwise counting
+        stops at the second match unless the index was already computed.
+        """
+        from bisect import bisect_left, bisect_right
+
+        cwd = self.fm.thisdir
+        pattern = self.pattern
+
+        if not pattern or not cwd.files:
+            return 0
+        if pattern == '.':
+            return 0
+        if pattern == '..':
+            return 1
+        ranked = self._ranked()
+        if not offset and (not move or not ranked) and self._cached_index() is None:
+            return self._count_from_pointer(move)
+        if ranked:
+            return self._count_ranked(move, offset)
+
+        positions, _ = self._match_index()
+        count = len(positions)
+        if move and count:
+            start = (cwd.pointer + offset) % len(cwd.files)
+            if offset < 0:
+                # the last match at or before start
+                target = positions[bisect_right(positions, start) - 1]
+            else:
+                # the first match at or after start
+                target = positions[bisect_left(positions, start) % count]
+            cwd.move(to=target)
+            self.fm.thisfile = cwd.pointed_obj
+        return count
+
+    def _count_ranked(self, move, offset):
+        """Count the matches, moving to the best one or cycling by score"""
+        cwd = self.fm.thisdir
+        ranking, ranks = self._match_index()
+        if move and ranking:
+            rank = ranks.get(cwd.pointer)
+            if offset and rank is not None:
+                cwd.move(to=ranking[(rank + offset) % len(ranking)])
+            else:
+                cwd.move(to=ranking[0])
+            self.fm.thisfile = cwd.pointed_obj
+        return len(ranking)
+
+
+class filter_stack(Command):
+    """
+    :filter_stack ...
+
+    Manages the filter stack.
+
+        filter_stack add FILTER_TYPE ARGS...
+        filter_stack pop
+        filter_stack decompose
+        filter_stack rotate [N=1]
+        filter_stack clear
+        filter_stack show
+
+    The filters are tried cheapest first and remember their results per
+    file.  `show' lists how long each filter took and how many files it
+    rejected.
+    """
+    def execute(self):
+        from ranger.core.filter_stack import SIMPLE_FILTERS, FILTER_COMBINATORS
+        from .filterstack import get_filter_stack
+
+        subcommand = self.arg(1)
+        # Changed in place, so that the cached results survive
+        stack = get_filter_stack(self.fm.thisdir)
+
+        if subcommand == "add":
+            try:
+                stack.append(
+                    SIMPLE_FILTERS[self.arg(2)](self.rest(3))
+                )
+            except KeyError:
+                FILTER_COMBINATORS[self.arg(2)](stack)
+            except re.error as ex:
+                self.fm.notify("Invalid regular expression: {}".format(ex), bad=True)
+                return
+        elif subcommand == "pop":
+            stack.pop()
+        elif subcommand == "decompose":
+            inner_filters = stack.pop().decompose()
+            if inner_filters:
+                stack.extend(inner_filters)
+        elif subcommand == "clear":
+            del stack[:]
+        elif subcommand == "rotate":
+            rotate_by = int(self.arg(2) or self.quantifier or 1)
+            stack[:] = stack[-rotate_by:] + stack[:-rotate_by]
+        elif subcommand == "show":
+            pager = self.fm.ui.open_pager()
+            pager.set_source(["Filter stack: "] + stack.describe())
+            pager.move(to=100, percentage=True)
+            return
+        else:
+            self.fm.notify(
+                "Unknown subcommand: {}".format(subcommand),
+                bad=True
+            )
+            return
+
+        self.fm.thisdir.refilter()
+
+
+class grep(Command):
+    """:grep <regex>
+
+    Looks for a regular expression in all marked files or directories
+
+    The search runs in the background with a pool of processes.  Hidden files
+    are skipped unless they are shown, and so are binary files.  The files
+    with hits are listed in the current directory as they are found, and
+    grep_jump moves from hit to hit.  Without an argument, :grep stops the
+    running search.
+    """
+
+    def execute(self):
+        from .grep import GrepSearch
+        from .trigram import find_trigram_index
+
+        if not self.rest(1):
+            if GrepSearch.current is not None:
+                GrepSearch.current.cancel()
+            return
+        try:
+            re.compile(self.rest(1).encode('utf-8'))
+        except re.error as err:
+            self.fm.notify('grep: %s' % err, bad=True)
+            return
+        index = find_trigram_index(self.fm.datapath('grep_index'),
+                                   self.fm.thisdir.path)
+        GrepSearch(self.fm.thisdir,
+                   [f.path for f in self.fm.thistab.get_selection()],
+                   self.rest(1), workers=self.fm.settings.grep_workers,
+                   index=index).start()
+
+
+class grep_index(Command):
+    """:grep_index build|info|drop [<path>]
+
+    Manages the trigram index that lets :grep skip files which can't match.
+
+        grep_index build    index the directory, or update its index
+        grep_index info     show what the index of the directory holds
+        grep_index drop     delete the index of the directory
+
+    :grep uses the index of the current directory or its closest indexed
+    parent.  Only files whose mtime and size didn't change since they were
+    indexed are skipped.  The index stops growing at grep_index_max_size MB.
+    """
+
+    def execute(self):
+        from .trigram import find_trigram_index, get_trigram_index
+
+        directory = self.fm.datapath('grep_index')
+        subcommand = self.arg(1)
+        path = os.path.join(self.fm.thisdir.path, os.path.expanduser(self.rest(2)))
+        if subcommand == 'build':
+            max_size = self.fm.settings.grep_index_max_size * 1024 * 1024
+            try:
+                index = get_trigram_index(directory, path, max_size)
+            except OSError as err:
+                self.fm.notify(err, bad=True)
+                return
+            self.fm.notify('Indexing %s' % index.root)
+            index.build(on_finish=lambda index: self.fm.notify(
+                'Index built: ' + index.describe()))
+        elif subcommand in ('info', 'drop'):
+            index = find_trigram_index(directory, path)
+            if index is None:
+                self.fm.notify('No grep index for %s' % path, bad=True)
+            elif subcommand == 'info':
+                self.fm.notify(index.describe())
+            else:
+                index.drop()
+                self.fm.notify('Dropped the grep index of %s' % index.root)
+        else:
+            self.fm.notify('Usage: grep_index build|info|drop [<path>]', bad=True)
+
+    def tab(self, tabnum):
+        return ['grep_index ' + name for name in ('build', 'info', 'drop')
+                if name.startswith(self.arg(1))]
+
+
+class grep_jump(Command):
+    """:grep_jump [N=1]
+
+    Moves the cursor to the file of the N-th next hit of :grep and scrolls the
+    preview to its line.  Negative values go back.
+    """
+
+    def execute(self):
+        from .grep import GrepSearch
+
+        search = GrepSearch.current
+        if search is None or search.directory is not self.fm.thisdir:
+            self.fm.notify('No grep results here', bad=True)
+            return
+        hits = search.flat_hits()
+        if not hits:
+            self.fm.notify('No grep hits', bad=True)
+            return
+        step = int(self.arg(1) or self.quantifier or 1)
+        positions = [(fobj.path, lineno) for fobj, lineno, _ in hits]
+        try:
+            index = positions.index(search.position) + step
+        except ValueError:
+            thisfile = self.fm.thisfile
+            firsts = [i for i, (fobj, _, _) in enumerate(hits) if fobj is thisfile]
+            index = firsts[0] if firsts else (0 if step > 0 else -1)
+        fobj, lineno, line = hits[index % len(hits)]
+        search.position = (fobj.path, lineno)
+
+        self.fm.move(to=self.fm.thisdir.files.index(fobj))
+        self.fm.notify('%s:%d: %s' % (fobj.relative_path, lineno, line))
+        self._scroll_preview_to(lineno)
+
+    def _scroll_preview_to(self, lineno):
+        # The preview column starts at the top when its file changes, which
+        # happens when it is drawn, so draw it before scrolling
+        self.fm.ui.redraw()
+        try:
+            column = self.fm.ui.browser.columns[-1]
+        except (AttributeError, IndexError):
+            return
+        offset = max(lineno - 1 - self.fm.settings.grep_context_lines, 0)
+        self.fm.scroll_preview(offset - getattr(column, 'scroll_extra', 0))
+
+
+class flat(Command):
+    """
+    :flat <level>
+
+    Flattens the directory view up to the specified level.
+
+        -1 fully flattened
+         0 remove flattened view
+
+    The tree is walked in the background and the files are listed as they
+    are found, up to flat_max_entries of them.  Leaving the directory stops
+    the walk and shows its normal content again.
+
+    Complete listings are cached (see :flat_cache), and directories whose
+    mtime didn't change since are taken from the cache instead of listed.
+    """
+
+    _stream = None
+
+    def execute(self):
+        try:
+            level_str = self.rest(1)
+            level = int(level_str)
+        except ValueError:
+            level = self.quantifier
+        if level is None:
+            self.fm.notify("Syntax: flat <level>", bad=True)
+            return
+        if level < -1:
+            self.fm.notify("Need an integer number (-1, 0, 1, ...)", bad=True)
+            return
+        thisdir = self.fm.thisdir
+        restore = flat._stream is not None and flat._stream[0].directory is thisdir
+        self._stop()
+        if level == 0:
+            if restore:
+                thisdir.flat = 0
+                return
+            self.fm.thisdir.unload()
+            self.fm.thisdir.flat = level
+            self.fm.thisdir.load_content()
+            return
+        self._stream_flat(level)
+
+    @staticmethod
+    def _stop():
+        if flat._stream is not None:
+            listing, loader = flat._stream
+            flat._stream = None
+            loader.cancel()
+            if listing.directory.content_loaded and \
+                    not listing.directory.content_outdated:
+                listing.restore()
+
+    def _stream_flat(self, level):
+        from .virtual import StreamLoader, VirtualListing
+        from .walker import ParallelWalker
+
+        thisdir = self.fm.thisdir
+        if thisdir.flat:
+            thisdir.unload()
+            thisdir.flat = 0
+            thisdir.load_content()
+        cache = None
+        if self.fm.settings.flat_cache:
+            from .flatcache import open_cache
+            cache = open_cache(self.fm.datapath('flat_cache'), thisdir.path, level)
+        walker = ParallelWalker(thisdir.path,
+                                max_depth=None if level == -1 else level + 1,
+                                follow_links=level > 0,
+                                on_directory=cache.record if cache else None,
+                                cached=cache.lookup if cache else None)
+        listing = VirtualListing(thisdir)
+        listing.begin()
+
+        def on_finish(loader):
+            if loader.truncated:
+                self.fm.notify('flat: stopped after %d entries (flat_max_entries)'
+                               % loader.found, bad=True)
+            elif cache is not None and not loader.walker.cancelled:
+                cache.save(self.fm.settings.flat_cache_max_size * 1024 * 1024)
+
+        loader = StreamLoader(walker.start(), listing, 'Flattening %s' % thisdir.path,
+                              on_finish=on_finish,
+                              max_entries=self.fm.settings.flat_max_entries)
+        listing.on_leave = loader.cancel
+        self.fm.loader.add(loader)
+        flat._stream = (listing, loader)
+
+
+class flat_cache(Command):
+    """:flat_cache info|drop [<path>]|clear
+
+    Manages the cache of flat listings.
+
+        flat_cache info           show the size of the cache
+        flat_cache drop [<path>]  forget the listings of the directory
+        flat_cache clear          forget all listings
+    """
+
+    def execute(self):
+        from .flatcache import cache_size, invalidate
+
+        directory = self.fm.datapath('flat_cache')
+        subcommand = self.arg(1)
+        if subcommand == 'info':
+            count, size = cache_size(directory)
+            self.fm.notify('Flat cache: %d listings, %.1f of %d MB' % (
+                count, size / 1e6, self.fm.settings.flat_cache_max_size))
+        elif subcommand == 'drop':
+            path = os.path.normpath(os.path.join(
+                self.fm.thisdir.path, os.path.expanduser(self.rest(2))))
+            self.fm.notify('Dropped %d cached listings of %s'
+                           % (invalidate(directory, path), path))
+        elif subcommand == 'clear':
+            self.fm.notify('Dropped %d cached listings' % invalidate(directory))
+        else:
+            self.fm.notify('Usage: flat_cache info|drop [<path>]|clear', bad=True)
+
+    def tab(self, tabnum):
+        return ['flat_cache ' + name for name in ('info', 'drop', 'clear')
+                if name.startswith(self.arg(1))]
+
+
+class yank(Command):
+    """:yank [name|dir|path]
+
+    Copies the file's name (default), directory or path into both the primary X
+    selection and the clipboard.
+    """
+
+    modes = {
+        '': 'basename',
+        'name_without_extension': 'basename_without_extension',
+        'name': 'basename',
+        'dir': 'dirname',
+        'path': 'path',
+    }
+
+    def execute(self):
+        from .clipboard import WRITER, clipboard_commands
+
+        error = WRITER.take_error()
+        if error is not None:
+            self.fm.notify("Could not write to the clipboard: %s" % error, bad=True)
+
+        commands = clipboard_commands(self.fm.settings.yank_clipboard)
+        if not commands:
+            return
+
+        mode = self.modes[self.arg(1)]
+        selection = self.get_selection_attr(mode)
+
+        new_clipboard_contents = "\n".join(selection)
+        WRITER.write(commands, new_clipboard_contents)
+
+    def get_selection_attr(self, attr):
+        return [getattr(item, attr) for item in
+                self.fm.thistab.get_selection()]
+
+    def tab(self, tabnum):
+        return (
+            self.start(1) + mode for mode
+            in sorted(self.modes.keys())
+            if mode
+        )
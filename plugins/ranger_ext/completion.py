@@ -0,0 +1,90 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Time-budgeted tab completion that scans directories on a worker thread
+
+A stuck network mount blocks the thread that lists it, so the scan runs
+on a daemon thread.  The console only waits for the time budget and takes
+whatever was found so far.  A scan that is still running is cancelled the
+next time the console line changes.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import threading
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+class Completion(object):
+    """Collect the items of a generator on a worker thread
+
+    The generator should list directories with subdirs() so that the scan
+    stops when it is cancelled or has listed max_dirs directories.
+    """
+
+    current = None
+
+    def __init__(self, max_dirs=0):
+        self.max_dirs = max_dirs
+        self.dirs_scanned = 0
+        self.results = []
+        self.finished = False
+        self._cancelled = threading.Event()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise ScanCancelled()
+        if self.max_dirs and self.dirs_scanned >= self.max_dirs:
+            raise ScanCancelled()
+        self.dirs_scanned += 1
+
+    def subdirs(self, path):
+        """Return the subdirectories of path, like next(os.walk(path))[1]"""
+        self.check()
+        names = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if self._cancelled.is_set():
+                    raise ScanCancelled()
+                try:
+                    if entry.is_dir():
+                        names.append(entry.name)
+                except OSError:
+                    pass
+        return names
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def partial(self):
+        return not self.finished
+
+    def _run(self, generator):
+        try:
+            for item in generator:
+                self.results.append(item)
+            self.finished = True
+        except ScanCancelled:
+            pass
+
+    def collect(self, generator, budget):
+        """Run the generator for up to budget seconds and return its items"""
+        cancel_pending()
+        Completion.current = self
+        thread = threading.Thread(target=self._run, args=(generator, ))
+        thread.daemon = True
+        thread.start()
+        thread.join(budget or None)
+        return list(self.results)
+
+
+def cancel_pending():
+    """Cancel the scan of the previous completion if it is still running"""
+    if Completion.current is not None:
+        Completion.current.cancel()
+        Completion.current = None
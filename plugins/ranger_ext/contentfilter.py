@@ -0,0 +1,244 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Filter stack filters that look into the files
+
+    filter_stack add content REGEX     files whose head matches REGEX
+    filter_stack add firstline REGEX   files whose first line matches REGEX
+
+Only the first content_filter_max_bytes of a file are searched.  The files
+are read by a pool of threads; files larger than MMAP_THRESHOLD are
+memory-mapped instead of read.  Until the verdict for a file is known the
+filter rejects it, and a loader re-filters the directory as the verdicts
+come in, so the matches appear while the files are read.
+
+Verdicts are kept per pattern and (device, inode, mtime, size), so adding
+the same filter again later doesn't read anything.  They are all dropped
+when there are CACHE_LIMIT of them, like the results of the filter stack.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import deque
+import mmap
+import os
+import re
+import stat
+import threading
+from time import time
+
+from ranger.core.filter_stack import BaseFilter, stack_filter
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+
+from .filterstack import CACHE_LIMIT
+
+
+MMAP_THRESHOLD = 64 * 1024
+CHUNK_SIZE = 4096
+REFILTER_INTERVAL = 0.2
+
+
+def search_head(path, regex, max_bytes):
+    """Search the head of the file, memory-mapping it if the file is large"""
+    with open(path, 'rb') as fobj:
+        if os.fstat(fobj.fileno()).st_size > MMAP_THRESHOLD:
+            try:
+                mapped = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error):  # empty or not mappable
+                pass
+            else:
+                try:
+                    return regex.search(mapped, 0, max_bytes) is not None
+                finally:
+                    mapped.close()
+        return regex.search(fobj.read(max_bytes)) is not None
+
+
+def search_first_line(path, regex, max_bytes):
+    """Search the first line of the file, reading no more than max_bytes"""
+    return regex.search(read_first_line(path, max_bytes)) is not None
+
+
+def read_first_line(path, max_bytes):
+    with open(path, 'rb') as fobj:
+        chunks = []
+        size = 0
+        while size < max_bytes:
+            chunk = fobj.read(min(CHUNK_SIZE, max_bytes - size))
+            if not chunk:
+                break
+            end = chunk.find(b'\n')
+            if end >= 0:
+                chunks.append(chunk[:end])
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        return b''.join(chunks)
+
+
+class ContentReader(object):
+    """A pool of threads that computes verdicts for (filter key, path) jobs"""
+
+    def __init__(self):
+        self.verdicts = {}
+        self.stored = 0
+        self.workers = 0
+        self._jobs = deque()
+        self._queued = set()
+        self._counts = {}
+        self._cond = threading.Condition()
+
+    def verdict(self, key, signature):
+        return self.verdicts.get(key, {}).get(signature)
+
+    def submit(self, key, signature, path, test, workers):
+        job = (key, signature)
+        with self._cond:
+            if job in self._queued:
+                return
+            self._queued.add(job)
+            self._counts[key] = self._counts.get(key, 0) + 1
+            self._jobs.append((key, signature, path, test))
+            while self.workers < workers:
+                self.workers += 1
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+            self._cond.notify()
+
+    def pending(self, key):
+        with self._cond:
+            return self._counts.get(key, 0) > 0
+
+    def discard(self, key):
+        """Drop the jobs of a filter that haven't started yet"""
+        with self._cond:
+            kept = deque()
+            for job in self._jobs:
+                if job[0] == key:
+                    self._queued.discard(job[:2])
+                    self._counts[key] -= 1
+                else:
+                    kept.append(job)
+            self._jobs = kept
+
+    def wait(self, timeout):
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                key, signature, path, test = self._jobs.popleft()
+            try:
+                verdict = test(path)
+            except (OSError, IOError):
+                verdict = False
+            with self._cond:
+                if self.stored >= CACHE_LIMIT:
+                    self.verdicts = {}
+                    self.stored = 0
+                verdicts = self.verdicts.setdefault(key, {})
+                if signature not in verdicts:
+                    self.stored += 1
+                verdicts[signature] = verdict
+                self._queued.discard((key, signature))
+                self._counts[key] -= 1
+                self._cond.notify_all()
+
+
+READER = ContentReader()
+
+
+class ContentLoader(Loadable, FileManagerAware):
+    """Re-filter a directory while the verdicts of a filter come in"""
+
+    progressbar_supported = False
+
+    def __init__(self, filt, directory):
+        self.filt = filt
+        self.directory = directory
+        Loadable.__init__(self, self.generate(), 'Filtering by %s' % filt)
+
+    def generate(self):
+        last = time()
+        while READER.pending(self.filt.key):
+            READER.wait(0.01)
+            if time() - last >= REFILTER_INTERVAL:
+                last = time()
+                self.directory.refilter()
+                self.fm.ui.need_redraw = True
+            yield
+        self.filt.loader = None
+        self.directory.refilter()
+        self.fm.ui.need_redraw = True
+
+    def destroy(self):
+        READER.discard(self.filt.key)
+        self.filt.loader = None
+
+
+class _ContentFilter(BaseFilter, FileManagerAware):
+    """Base class of filters that test the content of regular files
+
+    `search' is called with the path, the compiled pattern and
+    content_filter_max_bytes, and tells whether the file matches.
+    """
+
+    kind = None
+    # The verdict may arrive later, so the filter stack must not cache it
+    cache_results = False
+    # Calls return at once, but each one costs a read on a worker thread
+    cost = 1e-3
+
+    def __init__(self, pattern, search):
+        self.pattern = pattern
+        self.regex = re.compile(pattern.encode('utf-8'))
+        self.search = search
+        self.key = (self.kind, pattern)
+        self.directory = self.fm.thisdir
+        self.loader = None
+
+    def test(self, path):
+        return self.search(path, self.regex,
+                           self.fm.settings.content_filter_max_bytes)
+
+    def __call__(self, fobj):
+        fstat = fobj.stat
+        if fstat is None or not stat.S_ISREG(fstat.st_mode):
+            return False
+        signature = (fstat.st_dev, fstat.st_ino, fstat.st_mtime, fstat.st_size)
+        verdict = READER.verdict(self.key, signature)
+        if verdict is not None:
+            return verdict
+        READER.submit(self.key, signature, fobj.path, self.test,
+                      self.fm.settings.content_filter_workers)
+        if self.loader is None:
+            self.loader = ContentLoader(self, self.directory)
+            self.fm.loader.add(self.loader)
+        return False
+
+
+@stack_filter("content")
+class ContentFilter(_ContentFilter):
+    kind = 'content'
+
+    def __init__(self, pattern):
+        _ContentFilter.__init__(self, pattern, search_head)
+
+    def __str__(self):
+        return "<Filter: content =~ /{}/>".format(self.pattern)
+
+
+@stack_filter("firstline")
+class FirstLineFilter(_ContentFilter):
+    kind = 'firstline'
+
+    def __init__(self, pattern):
+        _ContentFilter.__init__(self, pattern, search_first_line)
+
+    def __str__(self):
+        return "<Filter: first line =~ /{}/>".format(self.pattern)
@@ -0,0 +1,551 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""The copy buffer as a compact list of paths
+
+CopyBuffer keeps the copied paths grouped by directory, as {directory:
+{basename: None}}, so a directory shared by many files is stored once.
+File objects are only made when the buffer is iterated, and they are kept
+only as long as something else holds on to them.  The commands that just
+need the paths use paths() and make no File objects at all.
+
+Ranger lists the paths of the whole buffer each time it draws a column.
+The column is given visible_in() of its visible files instead (see
+column.py), so a redraw costs the same for any size of the buffer.
+
+After every change, the changes are appended to a log.  A record is one
+line:
+
+    =<directory>    the following names are in this directory
+    +<name>         the name was added
+    -<name>         the name was removed
+    !               the buffer was cleared
+
+A newline in a path is written as NUL and "n", which can't be part of a
+path, so that every record stays on one line.  When the log holds many
+more records than paths, it is replaced by one "=" record per directory
+followed by a "+" record per name.  A record that was cut off by a crash
+ends with a NUL and is skipped.
+
+A buffer that was restored from the log or loaded from a file is checked
+in the background; the paths that are gone are dropped and reported when
+the check is done.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+try:
+    from collections.abc import MutableSet
+except ImportError:
+    from collections import MutableSet
+import fcntl
+import os
+import threading
+import weakref
+from os.path import abspath, expanduser, realpath
+
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+
+from .delete import _under
+from .taglog import _Locked, _decode, _encode
+
+
+COMPACT_FACTOR = 2
+COMPACT_MIN_RECORDS = 10000
+LISTDIR_MIN_NAMES = 32
+
+
+def _path(item):
+    """The path of a member; plain paths are accepted too"""
+    return item if isinstance(item, str) else item.path
+
+
+def _escape(text):
+    """Keep a path or name on one line"""
+    return text.replace('\n', '\0n') if '\n' in text else text
+
+
+def replay(lines, dirs):
+    """Apply the records in lines to dirs; returns the number of records"""
+    records = 0
+    names = None
+    for line in lines:
+        if '\0' in line:
+            if line.endswith('\0'):
+                names = None  # cut off by a crash
+                continue
+            line = line.replace('\0n', '\n')
+        operation = line[:1]
+        records += 1
+        if operation == '=':
+            names = dirs.get(line[1:])
+            if names is None:
+                names = dirs[line[1:]] = {}
+        elif operation == '+':
+            if names is not None:
+                names[line[1:]] = None
+        elif operation == '-':
+            if names is not None:
+                names.pop(line[1:], None)
+        elif operation == '!':
+            dirs.clear()
+            names = None
+    for head in [head for head, names in dirs.items() if not names]:
+        del dirs[head]
+    return records
+
+
+def _records(changes):
+    """The log records of {directory: {basename: added}}"""
+    lines = []
+    for head, names in changes.items():
+        lines.append('=' + _escape(head))
+        lines.extend(['+' + _escape(name) if added else '-' + _escape(name)
+                      for name, added in names.items()])
+    return lines
+
+
+class CopyBufferLog(object):
+    """The append-only log a CopyBuffer is saved to"""
+
+    def __init__(self, filename):
+        self.filename = realpath(abspath(expanduser(filename)))
+        self._lockname = self.filename + '.lock'
+        self.records = 0
+
+    def _read(self):
+        try:
+            with open(self.filename, 'rb') as fobj:
+                data = fobj.read()
+        except (OSError, IOError):
+            return []
+        # A last line without a newline was cut off
+        lines = _decode(data[:data.rfind(b'\n') + 1]).split('\n')
+        lines.pop()
+        return lines
+
+    def load(self):
+        """The saved buffer as {directory: {basename: None}}"""
+        dirs = {}
+        self.records = replay(self._read(), dirs)
+        return dirs
+
+    def append(self, lines, paths):
+        """Append the records, compacting the log if it grew too long
+
+        paths is the number of paths in the buffer after the change.
+        """
+        data = _encode(''.join(line + '\n' for line in lines))
+        try:
+            with _Locked(self._lockname, fcntl.LOCK_SH):
+                fd = os.open(self.filename,
+                             os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    size = os.fstat(fd).st_size
+                    # Turn a record cut off by a crash into an invalid line
+                    # instead of letting it swallow ours
+                    if size and os.pread(fd, 1, size - 1) != b'\n':
+                        data = b'\0\n' + data
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+        except OSError:
+            return
+        self.records += len(lines)
+        if self.records > COMPACT_FACTOR * paths + COMPACT_MIN_RECORDS:
+            self.compact()
+
+    def compact(self):
+        """Replace the log with one record per directory and path"""
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with _Locked(self._lockname, fcntl.LOCK_EX):
+                # Other instances may have appended to the log as well
+                dirs = self.load()
+                records = 0
+                with open(tmpname, 'wb') as fobj:
+                    for head, names in dirs.items():
+                        fobj.write(_encode('=%s\n' % _escape(head)))
+                        fobj.write(_encode(''.join('+%s\n' % _escape(name)
+                                                   for name in names)))
+                        records += 1 + len(names)
+                    fobj.flush()
+                    os.fsync(fobj.fileno())
+                os.rename(tmpname, self.filename)
+                self.records = records
+        except OSError:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+
+
+class CopyBuffer(MutableSet):
+    """A set of File objects that stores only their paths
+
+    Plain paths are accepted wherever a File is.  Every change is saved
+    to the log, if there is one, and its records are passed to on_change.
+    The files in / are kept under the directory '', as '/a'.rpartition('/')
+    has it.
+
+    `cut' is whether the files are to be moved; it isn't saved, but
+    changing it is passed to on_change as a "~1" or "~0" record.
+    """
+
+    def __init__(self, items=(), log=None):
+        self._dirs = {}
+        self._len = 0
+        self._files = weakref.WeakValueDictionary()
+        self.lock = threading.RLock()
+        self.log = log
+        self.on_change = None
+        self.cut = False
+        self.update(items)
+
+    def load(self, dirs):
+        """Take over {directory: {basename: None}} without saving it"""
+        self._dirs = dirs
+        self._len = sum(len(names) for names in dirs.values())
+        self._files.clear()
+
+    # -- reading
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, item):
+        try:
+            head, _, name = _path(item).rpartition('/')
+        except AttributeError:
+            return False
+        names = self._dirs.get(head)
+        return names is not None and name in names
+
+    def __iter__(self):
+        return (self._file(path) for path in self.paths())
+
+    def visible_in(self, files):
+        """The files of a list that are in the buffer"""
+        return [fobj for fobj in files if fobj in self]
+
+    def __repr__(self):
+        return '<%s of %d paths>' % (type(self).__name__, self._len)
+
+    def paths(self):
+        """Iterate over the paths without making File objects"""
+        for head, names in list(self._dirs.items()):
+            for name in list(names):
+                yield head + '/' + name
+
+    def directories(self):
+        """Iterate over (directory, basenames); don't modify them"""
+        return iter(list(self._dirs.items()))
+
+    def paths_under(self, roots):
+        """The paths that are in the set roots or below one of them"""
+        result = []
+        for head, names in list(self._dirs.items()):
+            if _under(head or '/', roots):
+                result.extend(head + '/' + name for name in names)
+            else:
+                result.extend(head + '/' + name for name in names
+                              if head + '/' + name in roots)
+        return result
+
+    def records(self):
+        """The records that make an empty buffer into this one"""
+        lines = ['!', '~1' if self.cut else '~0']
+        for head, names in list(self._dirs.items()):
+            lines.append('=' + _escape(head))
+            lines.extend(['+' + _escape(name) for name in list(names)])
+        return lines
+
+    def _file(self, path):
+        fobj = self._files.get(path)
+        if fobj is None:
+            from ranger.container.file import File
+            fobj = self._files[path] = File(path, path_is_abs=True)
+        return fobj
+
+    # -- changing
+    #
+    # The changes are collected as {directory: {basename: added}}, which is
+    # how they are written to the log
+
+    def _put(self, item, changes):
+        path = item if isinstance(item, str) else item.path
+        if path is not item:
+            self._files[path] = item
+        head, _, name = path.rpartition('/')
+        names = self._dirs.get(head)
+        if names is None:
+            names = self._dirs[head] = {}
+        elif name in names:
+            return False
+        names[name] = None
+        self._len += 1
+        try:
+            changes[head][name] = True
+        except KeyError:
+            changes[head] = {name: True}
+        return True
+
+    def _take(self, head, name, changes):
+        names = self._dirs.get(head)
+        if names is None or name not in names:
+            return False
+        del names[name]
+        if not names:
+            del self._dirs[head]
+        self._len -= 1
+        try:
+            changes[head][name] = False
+        except KeyError:
+            changes[head] = {name: False}
+        return True
+
+    def _save(self, changes):
+        if changes:
+            self._emit(_records(changes) if self._len else ['!'])
+
+    def _emit(self, lines, log=True):
+        if log and self.log is not None:
+            self.log.append(lines, self._len)
+        if self.on_change is not None:
+            self.on_change(lines)
+
+    def add(self, value):
+        self.update((value,))
+
+    def discard(self, value):
+        self.difference_update((value,))
+
+    def update(self, *iterables):
+        changes = {}
+        with self.lock:
+            for iterable in iterables:
+                for item in iterable:
+                    self._put(item, changes)
+            self._save(changes)
+
+    def difference_update(self, *iterables):
+        changes = {}
+        with self.lock:
+            for iterable in iterables:
+                for item in iterable:
+                    head, _, name = _path(item).rpartition('/')
+                    self._take(head, name, changes)
+            self._save(changes)
+
+    def discard_paths(self, paths):
+        """Remove paths; returns how many of them were in the buffer"""
+        with self.lock:
+            before = self._len
+            self.difference_update(paths)
+            return before - self._len
+
+    def discard_names(self, names_by_dir):
+        """Remove {directory: basenames}; returns how many were there"""
+        changes = {}
+        with self.lock:
+            before = self._len
+            for head, names in names_by_dir.items():
+                for name in names:
+                    self._take(head, name, changes)
+            self._save(changes)
+            return before - self._len
+
+    def symmetric_difference_update(self, iterable):
+        changes = {}
+        with self.lock:
+            for item in iterable:
+                head, _, name = _path(item).rpartition('/')
+                if not self._take(head, name, changes):
+                    self._put(item, changes)
+            self._save(changes)
+
+    def replace(self, iterable):
+        """Make the buffer hold exactly the given items"""
+        new = {}
+        for item in iterable:
+            new[_path(item)] = item
+        if not new:
+            self.clear()
+            return
+        changes = {}
+        with self.lock:
+            for path in [path for path in self.paths() if path not in new]:
+                head, _, name = path.rpartition('/')
+                self._take(head, name, changes)
+            for item in new.values():
+                self._put(item, changes)
+            self._save(changes)
+
+    def clear(self):
+        with self.lock:
+            if not self._len:
+                return
+            self._dirs = {}
+            self._len = 0
+            self._files.clear()
+            self._emit(['!'])
+
+    def set_cut(self, cut):
+        with self.lock:
+            if cut != self.cut:
+                self.cut = cut
+                self._emit(['~1' if cut else '~0'], log=False)
+
+    def apply(self, lines):
+        """Apply records made elsewhere, without saving or passing them on"""
+        changes = {}
+        head = None
+        with self.lock:
+            for line in lines:
+                if '\0' in line:
+                    line = line.replace('\0n', '\n')
+                operation = line[:1]
+                if operation == '=':
+                    head = line[1:]
+                elif operation == '+':
+                    if head is not None:
+                        self._put(head + '/' + line[1:], changes)
+                elif operation == '-':
+                    if head is not None:
+                        self._take(head, line[1:], changes)
+                elif operation == '!':
+                    self._dirs = {}
+                    self._len = 0
+                    self._files.clear()
+                    head = None
+                elif operation == '~':
+                    self.cut = line[1:] == '1'
+        return changes
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        if other is self:
+            self.clear()
+        else:
+            self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        if other is self:
+            self.clear()
+        else:
+            self.symmetric_difference_update(other)
+        return self
+
+    def __iand__(self, other):
+        keep = set(_path(item) for item in other)
+        self.difference_update([path for path in self.paths()
+                                if path not in keep])
+        return self
+
+
+class _CopyBufferAttribute(object):  # pylint: disable=too-few-public-methods
+    """fm.copy_buffer; assigning a set to it changes the CopyBuffer instead"""
+
+    def __get__(self, fm, cls=None):
+        if fm is None:
+            return self
+        return fm.__dict__['_copy_buffer']
+
+    def __set__(self, fm, value):
+        current = fm.__dict__.get('_copy_buffer')
+        if current is None or isinstance(value, CopyBuffer):
+            fm.__dict__['_copy_buffer'] = value
+        elif value is not current:
+            current.replace(value)
+
+
+class _CutAttribute(object):  # pylint: disable=too-few-public-methods
+    """fm.do_cut, kept in the CopyBuffer so that it can be shared"""
+
+    def __get__(self, fm, cls=None):
+        if fm is None:
+            return self
+        return fm.__dict__['_copy_buffer'].cut
+
+    def __set__(self, fm, value):
+        fm.__dict__['_copy_buffer'].set_cut(bool(value))
+
+
+class CopyBufferCheck(Loadable, FileManagerAware):
+    """Drop the paths of the copy buffer that are gone, and report them
+
+    A directory with many copied files is listed once instead of looking
+    up each file, and the files of a directory that is gone aren't looked
+    up at all.
+    """
+
+    progressbar_supported = True
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.missing = {}
+        Loadable.__init__(self, self.generate(), 'Checking the copy buffer')
+
+    @staticmethod
+    def _missing(head, names):
+        directory = head or '/'
+        if not os.path.isdir(directory):
+            return names
+        if len(names) >= LISTDIR_MIN_NAMES:
+            try:
+                present = set(os.listdir(directory))
+            except OSError:
+                pass
+            else:
+                return [name for name in names if name not in present]
+        return [name for name in names
+                if not os.path.lexists(head + '/' + name)]
+
+    def generate(self):
+        total = max(len(self.buffer), 1)
+        checked = 0
+        for head, names in self.buffer.directories():
+            names = list(names)
+            missing = self._missing(head, names)
+            if missing:
+                self.missing[head] = missing
+            checked += len(names)
+            self.percent = min(100 * checked // total, 100)
+            yield
+        gone = self.buffer.discard_names(self.missing)
+        if gone:
+            shown = [head + '/' + name
+                     for head, names in self.missing.items()
+                     for name in names[:3]][:3]
+            text = ', '.join(shown)
+            if gone > len(shown):
+                text += ' and %d more' % (gone - len(shown))
+            self.fm.ui.redraw_main_column()
+            self.fm.notify('Dropped %d missing files from the copy buffer: %s'
+                           % (gone, text), bad=True)
+
+
+def install(fm, logfile=None):
+    """Keep fm.copy_buffer in a CopyBuffer, restored from logfile if given
+
+    The restored buffer is checked in the background.  fm.do_cut is kept
+    in the buffer as well.
+    """
+    log = CopyBufferLog(logfile) if logfile else None
+    buffer = CopyBuffer()
+    if log is not None:
+        buffer.load(log.load())
+    buffer.log = log
+    buffer.update(fm.__dict__.pop('copy_buffer', ()))
+    buffer.cut = bool(fm.__dict__.pop('do_cut', False))
+    type(fm).copy_buffer = _CopyBufferAttribute()
+    type(fm).do_cut = _CutAttribute()
+    fm.copy_buffer = buffer
+    if log is not None and len(buffer):
+        fm.loader.add(CopyBufferCheck(buffer))
+    return buffer
@@ -0,0 +1,367 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Sharing the copy buffer between ranger instances over a Unix socket
+
+One instance listens on the socket and the others connect to it.  That
+instance, the hub, puts the changes of all instances in one order: it
+applies a change, passes it on to the other instances and acknowledges it
+to the instance that made it.  A change travels as the records of the copy
+buffer log, so yanking many files of a directory sends the directory once
+and then the names, and the other instances don't read or check anything.
+
+A message is a header line, the records and an empty line.  Records are
+never empty and keep newlines in names escaped, so an empty line always
+ends a message.  The hub sends
+"*<size>" for changes made elsewhere and ".<size>" to acknowledge the
+change of the connection, where <size> is the number of paths on the hub.
+The hub is sent ">" with a change, or "?" to ask for the whole buffer.
+
+Each instance applies its own changes right away.  If an instance has no
+unacknowledged changes and its size differs from the hub's, two changes
+crossed each other and it asks for the whole buffer.  A new connection is
+sent the whole buffer as well.  A connection with more than MAX_OUTBOX
+bytes that the other side didn't read yet is dropped.  That instance
+connects again and gets the whole buffer.
+
+When the hub exits, the others elect a new hub: under a lock file, the
+first one that finds nobody listening takes over the socket.  An instance
+without others is a hub without connections, and its changes go nowhere.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import atexit
+import errno
+import fcntl
+import os
+import select
+import socket
+import stat
+import tempfile
+import threading
+
+from .taglog import _Locked, _decode, _encode
+
+
+READ_SIZE = 65536
+RETRY_SECONDS = 1.0
+MAX_OUTBOX = 64 * 1024 * 1024
+
+
+def default_socket():
+    """The socket in a directory that only the user can access"""
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        directory = os.path.join(runtime, 'ranger')
+    else:
+        directory = os.path.join(tempfile.gettempdir(),
+                                 'ranger-%d' % os.getuid())
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as err:
+        if err.errno != errno.EEXIST:
+            raise
+    dstat = os.lstat(directory)
+    if not stat.S_ISDIR(dstat.st_mode) or dstat.st_uid != os.getuid() \
+            or dstat.st_mode & 0o077:
+        raise OSError(errno.EPERM, 'Not a private directory', directory)
+    return os.path.join(directory, 'copy_buffer.sock')
+
+
+def _message(header, lines=()):
+    return _encode(header + '\n' + ''.join(line + '\n' for line in lines)
+                   + '\n')
+
+
+class _Peer(object):  # pylint: disable=too-few-public-methods
+    """A connection with the data that wasn't sent or parsed yet"""
+
+    __slots__ = ('sock', 'inbox', 'outbox', 'limit')
+
+    def __init__(self, sock):
+        sock.setblocking(False)
+        self.sock = sock
+        self.inbox = b''
+        self.outbox = bytearray()
+        self.limit = MAX_OUTBOX
+
+    def queue(self, data):
+        """Add data to the outbox; drop the connection if it is full
+
+        The thread notices the closed connection like any other.
+        """
+        self.outbox += data
+        if len(self.outbox) > self.limit:
+            self.outbox.clear()
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def messages(self):
+        """Take the complete messages out of the inbox, as lists of lines"""
+        # Records are never empty, so an empty line ends a message
+        end = self.inbox.rfind(b'\n\n')
+        if end < 0:
+            return []
+        data, self.inbox = self.inbox[:end], self.inbox[end + 2:]
+        return [_decode(part).split('\n') for part in data.split(b'\n\n')]
+
+
+class CopyBufferLink(object):
+    """Keeps a CopyBuffer the same in all instances on a socket
+
+    on_change is called in the thread of the link after changes of other
+    instances were applied.
+    """
+
+    def __init__(self, buffer, path, on_change=None):
+        self.buffer = buffer
+        self.path = path
+        self.on_change = on_change
+        self.is_hub = False
+        self._lockname = path + '.lock'
+        self._listener = None
+        self._peers = []
+        self._unacked = 0
+        # Taken after buffer.lock when both are needed
+        self._lock = threading.Lock()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_write, False)
+        self._closed = False
+
+    @property
+    def peers(self):
+        """The number of connections: other instances, or the hub"""
+        return len(self._peers)
+
+    def start(self):
+        self._elect()
+        self.buffer.on_change = self.send
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        """Stop sharing; a hub gives up the socket"""
+        if self._closed:
+            return
+        if self.is_hub:
+            # Still listening, so nobody else can have taken the socket
+            try:
+                with _Locked(self._lockname, fcntl.LOCK_EX):
+                    os.unlink(self.path)
+            except OSError:
+                pass
+        self._closed = True
+        self.buffer.on_change = None
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b'.')
+        except OSError:
+            pass  # The pipe is full, so the thread is awake anyway
+
+    def _elect(self):
+        """Connect to the hub, or become the hub if nobody listens"""
+        with _Locked(self._lockname, fcntl.LOCK_EX):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+            else:
+                with self._lock:
+                    self.is_hub = False
+                    self._unacked = 0
+                    self._peers = [_Peer(sock)]
+                return
+            try:
+                os.unlink(self.path)  # left behind by a hub that crashed
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                listener.bind(self.path)
+                listener.listen(16)
+            except OSError:
+                listener.close()
+                raise
+            listener.setblocking(False)
+            with self._lock:
+                self.is_hub = True
+                self._listener = listener
+                self._peers = []
+
+    # -- sending
+
+    def send(self, lines):
+        """Pass on a change of the buffer; called with the buffer locked"""
+        with self._lock:
+            if self.is_hub:
+                data = _message('*%d' % len(self.buffer), lines)
+            else:
+                data = _message('>', lines)
+                self._unacked += len(self._peers)
+            for peer in self._peers:
+                peer.queue(data)
+        self._wake()
+
+    def _send_all(self, peer):
+        with self.buffer.lock, self._lock:
+            data = _message('*%d' % len(self.buffer), self.buffer.records())
+            # Leave room for the whole buffer, however large
+            peer.limit = max(peer.limit, len(data) + MAX_OUTBOX)
+            peer.queue(data)
+
+    # -- the thread
+
+    def _run(self):
+        offline = False
+        while not self._closed:
+            if offline:
+                try:
+                    self._elect()
+                    offline = False
+                except OSError:
+                    pass
+            with self._lock:
+                peers = list(self._peers)
+                writers = [peer.sock for peer in peers if peer.outbox]
+            readers = [self._wake_read] + [peer.sock for peer in peers]
+            if self._listener is not None:
+                readers.append(self._listener)
+            readable, writable, _ = select.select(
+                readers, writers, [], RETRY_SECONDS if offline else None)
+            if self._wake_read in readable:
+                os.read(self._wake_read, READ_SIZE)
+            if self._listener is not None and self._listener in readable:
+                self._accept()
+            for peer in peers:
+                if peer.sock in writable:
+                    self._write(peer)
+                if peer.sock in readable and not self._read(peer):
+                    offline = not self._drop(peer)
+        self._shut()
+
+    def _shut(self):
+        for peer in self._peers:
+            peer.sock.close()
+        if self._listener is not None:
+            self._listener.close()
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except OSError:
+            return
+        peer = _Peer(sock)
+        with self._lock:
+            self._peers.append(peer)
+        self._send_all(peer)
+
+    def _write(self, peer):
+        with self._lock:
+            try:
+                sent = peer.sock.send(peer.outbox)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                peer.outbox.clear()  # _read() notices the broken connection
+                return
+            del peer.outbox[:sent]
+
+    def _read(self, peer):
+        """Read and handle messages; False if the connection is gone"""
+        try:
+            data = peer.sock.recv(READ_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+        if not data:
+            return False
+        peer.inbox += data
+        changed = False
+        for lines in peer.messages():
+            if self.is_hub:
+                changed |= self._hub_receive(peer, lines)
+            else:
+                changed |= self._receive(peer, lines)
+        if changed and self.on_change is not None:
+            self.on_change()
+        return True
+
+    def _drop(self, peer):
+        """Forget a connection; False if it was the hub and no new one
+        could be found"""
+        peer.sock.close()
+        with self._lock:
+            if peer in self._peers:
+                self._peers.remove(peer)
+        if self.is_hub or self._closed:
+            return True
+        try:
+            self._elect()
+        except OSError:
+            return False
+        return True
+
+    def _hub_receive(self, peer, lines):
+        header, records = lines[0], lines[1:]
+        if header == '?':
+            self._send_all(peer)
+        elif header == '>':
+            with self.buffer.lock:
+                self.buffer.apply(records)
+                with self._lock:
+                    size = len(self.buffer)
+                    data = _message('*%d' % size, records)
+                    for other in self._peers:
+                        if other is peer:
+                            other.queue(_message('.%d' % size))
+                        else:
+                            other.queue(data)
+            return True
+        return False
+
+    def _receive(self, peer, lines):
+        header, records = lines[0], lines[1:]
+        try:
+            size = int(header[1:])
+        except ValueError:
+            return False
+        if header[:1] not in ('*', '.'):
+            return False
+        with self.buffer.lock:
+            if header[:1] == '*':
+                self.buffer.apply(records)
+            with self._lock:
+                if header[:1] == '.':
+                    self._unacked = max(self._unacked - 1, 0)
+                if not self._unacked and len(self.buffer) != size:
+                    # Two changes crossed each other, take the hub's buffer
+                    peer.queue(_message('?'))
+        return header[:1] == '*'
+
+
+def share(fm, buffer, path=None):
+    """Share buffer with the other instances on path, or the default socket
+
+    Raises OSError if the socket can't be used.
+    """
+    def redraw():
+        # Changes can arrive before the UI is set up
+        browser = getattr(fm.ui, 'browser', None)
+        if browser is not None:
+            browser.main_column.need_redraw = True
+
+    return CopyBufferLink(buffer, path or default_socket(),
+                          on_change=redraw).start()
@@ -0,0 +1,453 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Deleting files in the background with a pool of threads
+
+TreeDeleter removes trees in post-order.  A worker takes a directory from a
+shared queue, unlinks the files in it and queues its subdirectories, so
+every subtree can be removed by another worker.  A directory is removed
+by whichever worker finishes its last subdirectory.  On a spinning disk a
+single worker goes depth first, which keeps the disk head in one place.
+
+Cancelling stops the workers after the file they are unlinking.  Files are
+removed whole and directories only once they are empty, so what is left
+is an intact part of the original trees.
+
+While the deletion is being confirmed, SelectionScan counts the files and
+bytes of the selection in the background and keeps the question up to
+date.  If it counted everything, the delete task uses its total for the
+progress bar.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import deque
+import os
+import stat
+import threading
+from time import time
+
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+from ranger.ext.human_readable import human_readable
+
+from .walker import ParallelWalker
+
+
+SSD_WORKERS = 8
+MAX_ERRORS = 100
+
+
+def has_entries(path):
+    """Whether path is a real directory with anything in it
+
+    Stops at the first entry instead of listing the whole directory.
+    """
+    if os.path.islink(path) or not os.path.isdir(path):
+        return False
+    try:
+        with os.scandir(path) as dirents:
+            return next(dirents, None) is not None
+    except OSError:
+        return False
+
+
+def is_rotational(path):
+    """Whether path is on a spinning disk, as far as /sys tells"""
+    try:
+        dev = os.stat(path).st_dev
+    except OSError:
+        return False
+    base = '/sys/dev/block/%d:%d' % (os.major(dev), os.minor(dev))
+    # Partitions have no queue/ of their own, their disk is the parent
+    for name in (base + '/queue/rotational', base + '/../queue/rotational'):
+        try:
+            with open(name, 'r') as fobj:
+                return fobj.read().strip() == '1'
+        except (OSError, IOError):
+            pass
+    return False
+
+
+def default_workers(paths):
+    if any(is_rotational(path) for path in paths):
+        return 1
+    return SSD_WORKERS
+
+
+class _Node(object):  # pylint: disable=too-few-public-methods
+    """A path being deleted; a directory waits for its subdirectories"""
+
+    __slots__ = ('path', 'parent', 'is_dir', 'pending', 'failed')
+
+    def __init__(self, path, parent, is_dir):
+        self.path = path
+        self.parent = parent
+        self.is_dir = is_dir
+        self.pending = 1
+        self.failed = False
+
+
+class TreeDeleter(object):
+    """Delete files and directory trees with several threads"""
+
+    def __init__(self, paths, workers=SSD_WORKERS):
+        self.paths = paths
+        self.workers = max(workers, 1)
+        self.files_removed = 0
+        self.dirs_removed = 0
+        self.bytes_freed = 0
+        self.errors = []
+        self._pending = deque()
+        self._active = 0
+        self._roots = 0
+        self._cond = threading.Condition()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        with self._cond:
+            return self._roots == 0 or (self.cancelled and not self._active)
+
+    def start(self):
+        for path in self.paths:
+            try:
+                is_dir = stat.S_ISDIR(os.lstat(path).st_mode)
+            except OSError as err:
+                self._error(err)
+                continue
+            self._pending.append(_Node(path, None, is_dir))
+            self._roots += 1
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, timeout):
+        with self._cond:
+            if not self.finished:
+                self._cond.wait(timeout)
+
+    def _error(self, err):
+        with self._cond:
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append(err)
+
+    def _next_node(self):
+        with self._cond:
+            while not self._pending:
+                if self._roots == 0 or self.cancelled:
+                    return None
+                self._cond.wait()
+            self._active += 1
+            return self._pending.pop()
+
+    def _work(self):
+        while not self.cancelled:
+            node = self._next_node()
+            if node is None:
+                return
+            try:
+                if node.is_dir:
+                    self._empty(node)
+                else:
+                    self._unlink(node)
+                self._release(node)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _unlink(self, node):
+        try:
+            size = os.lstat(node.path).st_size
+            os.unlink(node.path)
+        except OSError as err:
+            node.failed = True
+            self._error(err)
+            return
+        with self._cond:
+            self.files_removed += 1
+            self.bytes_freed += size
+
+    def _empty(self, node):
+        """Unlink the files of a directory and queue its subdirectories"""
+        files = size = 0
+        subdirs = []
+        try:
+            with os.scandir(node.path) as dirents:
+                for dirent in dirents:
+                    if self.cancelled:
+                        break
+                    try:
+                        if dirent.is_dir(follow_symlinks=False):
+                            subdirs.append(_Node(dirent.path, node, True))
+                            continue
+                        fsize = dirent.stat(follow_symlinks=False).st_size
+                        os.unlink(dirent.path)
+                    except OSError as err:
+                        node.failed = True
+                        self._error(err)
+                        continue
+                    files += 1
+                    size += fsize
+        except OSError as err:
+            node.failed = True
+            self._error(err)
+        with self._cond:
+            self.files_removed += files
+            self.bytes_freed += size
+            node.pending += len(subdirs)
+            self._pending.extend(subdirs)
+            self._cond.notify_all()
+
+    def _release(self, node):
+        """Remove the directories whose last subdirectory is done"""
+        while node is not None:
+            with self._cond:
+                node.pending -= 1
+                if node.pending:
+                    return
+            if node.is_dir and not node.failed and not self.cancelled:
+                try:
+                    os.rmdir(node.path)
+                    with self._cond:
+                        self.dirs_removed += 1
+                except OSError as err:
+                    node.failed = True
+                    self._error(err)
+            if node.parent is None:
+                with self._cond:
+                    self._roots -= 1
+                    self._cond.notify_all()
+            elif node.failed:
+                node.parent.failed = True
+            node = node.parent
+
+
+class SelectionScan(Loadable, FileManagerAware):
+    """Count the files and bytes below paths, for at most budget seconds"""
+
+    progressbar_supported = False
+
+    def __init__(self, paths, budget=0, workers=4):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.budget = budget
+        self.files = 0
+        self.dirs = 0
+        self.size = 0
+        self.complete = False
+        self.cut = False
+        self.on_update = None
+        self._lock = threading.Lock()
+        root = os.path.dirname(self.paths[0]) if self.paths else os.sep
+        self.walker = ParallelWalker(root, workers=workers,
+                                     accept=lambda entry: False,
+                                     on_directory=self._count)
+        Loadable.__init__(self, self.generate(), 'Counting files')
+
+    @property
+    def total(self):
+        """The number of files and directories, as TreeDeleter counts them"""
+        return self.files + self.dirs
+
+    def _count(self, _path, entries):
+        files = dirs = size = 0
+        for entry in entries:
+            if entry.stats is None:
+                files += 1
+            elif entry.is_dir and entry.stats[0] is entry.stats[1]:
+                dirs += 1
+            else:
+                files += 1
+                size += entry.stats[1].st_size
+        with self._lock:
+            self.files += files
+            self.dirs += dirs
+            self.size += size
+
+    def generate(self):
+        started = time()
+        directories = []
+        for path in self.paths:
+            try:
+                lstat = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISDIR(lstat.st_mode):
+                self.dirs += 1
+                directories.append((path, 0))
+            else:
+                self.files += 1
+                self.size += lstat.st_size
+        self.walker.start(directories)
+        shown = 0
+        while not self.walker.finished:
+            if self.budget and time() - started > self.budget:
+                self.walker.cancel()
+                self.cut = True
+                break
+            self.walker.get_batch(timeout=0.05)
+            if time() - shown >= 0.1:
+                shown = time()
+                self._update()
+            yield
+        self.complete = not self.cut and not self.walker.cancelled
+        self._update()
+
+    def _update(self):
+        if self.on_update is not None:
+            self.on_update()
+
+    def describe(self):
+        text = '%d files, %s' % (self.files, human_readable(self.size))
+        if self.cut:
+            return 'at least ' + text
+        if not self.complete:
+            return text + ' so far'
+        return text
+
+    def destroy(self):
+        self.walker.cancel()
+
+    def cancel(self):
+        self.destroy()
+        if self in self.fm.loader.queue:
+            self.fm.loader.remove(item=self)
+
+
+def _names(files, shown=3):
+    if len(files) <= shown:
+        return ', '.join(files)
+    return '%s and %d more' % (', '.join(files[:shown]), len(files) - shown)
+
+
+def ask_confirmation(fm, action, files, callback):
+    """Ask whether to go on with action, showing the size of the selection
+
+    The question is updated while the selection is counted.  The answer
+    stops the count; callback gets the answer and the SelectionScan.
+    """
+    scan = SelectionScan(files, fm.settings.delete_scan_budget)
+
+    def question():
+        return 'Confirm %s of %s (%s) (y/N)' % (action, _names(files),
+                                                scan.describe())
+
+    def answered(answer):
+        scan.cancel()
+        callback(answer, scan)
+
+    def update():
+        queue = fm.ui.console.question_queue
+        for i, asked in enumerate(queue):
+            if asked[1] is answered:
+                queue[i] = (question(), answered, asked[2])
+                fm.ui.need_redraw = True
+
+    scan.on_update = update
+    fm.ui.console.ask(question(), answered, ('n', 'N', 'y', 'Y'))
+    fm.loader.add(scan)
+
+
+def _under(path, roots):
+    while True:
+        if path in roots:
+            return True
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+
+
+class DeleteLoader(Loadable, FileManagerAware):
+    """Delete files in the background and show the progress in the task view
+
+    Removing the task from the task view cancels the deletion.
+    """
+
+    progressbar_supported = False
+
+    def __init__(self, paths, workers=0, scan=None):
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.deleter = TreeDeleter(self.paths,
+                                   workers or default_workers(self.paths))
+        self.total = scan.total if scan is not None and scan.complete else None
+        self.progressbar_supported = bool(self.total)
+        self.started = None
+        self._done = False
+        if len(self.paths) == 1:
+            descr = 'Deleting ' + os.path.basename(self.paths[0])
+        else:
+            descr = 'Deleting %d files' % len(self.paths)
+        Loadable.__init__(self, self.generate(), descr)
+
+    def generate(self):
+        self.started = time()
+        self.deleter.start()
+        while not self.deleter.finished:
+            self.deleter.wait(0.01)
+            if self.total:
+                done = self.deleter.files_removed + self.deleter.dirs_removed
+                self.percent = min(100 * done // self.total, 100)
+            yield
+        self._finish()
+
+    def get_description(self):
+        if self.started is None:
+            return self.description
+        seconds = max(time() - self.started, 1e-6)
+        deleter = self.deleter
+        return '%s (%d files, %.1f MB freed, %d files/s)' % (
+            self.description, deleter.files_removed, deleter.bytes_freed / 1e6,
+            deleter.files_removed / seconds)
+
+    def destroy(self):
+        self.deleter.cancel()
+        if self.started is not None:
+            self._finish()
+
+    def _finish(self):
+        """Forget the files that are gone and report how it went"""
+        if self._done:
+            return
+        self._done = True
+        fm = self.fm
+        roots = set(self.paths)
+        gone = [tag for tag in fm.tags.tags
+                if _under(tag, roots) and not os.path.lexists(tag)]
+        if gone:
+            fm.tags.remove(*gone)
+        fm.copy_buffer.discard_paths(
+            path for path in fm.copy_buffer.paths_under(roots)
+            if not os.path.lexists(path))
+        fm.thistab.ensure_correct_pointer()
+        fm.ui.need_redraw = True
+
+        deleter = self.deleter
+        seconds = max(time() - self.started, 1e-6)
+        summary = '%d files and %d directories, %.1f MB in %.1fs' % (
+            deleter.files_removed, deleter.dirs_removed,
+            deleter.bytes_freed / 1e6, seconds)
+        if deleter.cancelled:
+            fm.notify('Deletion cancelled after %s' % summary, bad=True)
+        elif deleter.errors:
+            fm.notify('Deleted %s; %d errors, first: %s' % (
+                summary, len(deleter.errors), deleter.errors[0]), bad=True)
+        else:
+            fm.notify('Deleted ' + summary)
+
+
+def delete_files(fm, paths, scan=None):
+    """Delete paths in the background; a complete scan gives the progress"""
+    fm.loader.add(DeleteLoader(paths, fm.settings.delete_workers, scan))
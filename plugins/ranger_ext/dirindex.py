@@ -0,0 +1,284 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A persistent index of directory names used by the `cd' tab completion
+
+The index is a trie of path components per root directory.  Every node
+remembers the mtime its directory had when it was listed, so a lookup only
+lists a directory again if it changed since.  Roots are filled in by a
+background thread and the whole index is pickled to the data directory.
+
+The background thread lists at most as many directories as a completion
+may scan, and no deeper than the completion reaches.  When the index holds
+more than MAX_NODES directories, the roots that were used least recently
+are dropped when it is saved.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import deque
+import os
+import pickle
+import threading
+import time
+
+
+# A node is a list [mtime, children] where children maps the names of the
+# subdirectories to their nodes, or is None if the directory was never listed.
+MTIME, CHILDREN = 0, 1
+
+SAVE_INTERVAL = 30
+MAX_NODES = 200000
+
+
+def list_subdirs(path):
+    """Return the names of the subdirectories of path, like next(os.walk())[1]"""
+    names = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    names.append(entry.name)
+            except OSError:
+                pass
+    return names
+
+
+class DirIndex(object):
+    """Trie of directory names, one per root, stored in a pickle file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.roots = {}
+        # {root: the time it was last used}
+        self.used = {}
+        self._lock = threading.Lock()
+        self._building = set()
+        self._dirty = False
+        self._last_save = time.time()
+        self.load()
+
+    # -- persistence
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as fobj:
+                roots = pickle.load(fobj)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+        if isinstance(roots, dict) and 'roots' in roots:
+            self.roots = roots['roots']
+            self.used = roots['used']
+        elif isinstance(roots, dict):
+            self.roots = roots  # saved before roots were evicted
+            self.used = dict.fromkeys(roots, 0)
+
+    def save(self):
+        with self._lock:
+            self._evict()
+            data = pickle.dumps({'roots': self.roots, 'used': self.used},
+                                pickle.HIGHEST_PROTOCOL)
+            self._dirty = False
+            self._last_save = time.time()
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmpname, 'wb') as fobj:
+                fobj.write(data)
+            os.rename(tmpname, self.filename)
+        except OSError:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drop the least recently used roots while there are too many nodes"""
+        sizes = dict((root, _count_nodes(node)) for root, node in self.roots.items())
+        total = sum(sizes.values())
+        for root in sorted(self.roots, key=lambda root: self.used.get(root, 0)):
+            if total <= MAX_NODES or len(self.roots) == 1:
+                break
+            if root in self._building:
+                continue
+            total -= sizes[root]
+            del self.roots[root]
+            self.used.pop(root, None)
+
+    def _save_later(self):
+        if self._dirty and time.time() - self._last_save > SAVE_INTERVAL:
+            self._last_save = time.time()
+            thread = threading.Thread(target=self.save)
+            thread.daemon = True
+            thread.start()
+
+    # -- trie access
+
+    def _root_of(self, path):
+        """The closest root at or above path, or None"""
+        roots = self.roots
+        while path not in roots:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+        return path
+
+    def _node(self, path, create=True):
+        """The node of path; call it with the lock held"""
+        root = self._root_of(path)
+        if root is None:
+            if not create:
+                return None
+            root = path
+            self.roots[root] = [None, None]
+            self.used[root] = time.time()
+        node = self.roots[root]
+        rel = os.path.relpath(path, root)
+        if rel == os.curdir:
+            return node
+        for name in rel.split(os.sep):
+            children = node[CHILDREN]
+            if children is None:
+                if not create:
+                    return None
+                children = node[CHILDREN] = {}
+            if name not in children:
+                if not create:
+                    return None
+                children[name] = [None, None]
+            node = children[name]
+        return node
+
+    def _refresh(self, path, node, mtime):
+        """List path again, keeping the subtrees of directories still present"""
+        names = list_subdirs(path)
+        with self._lock:
+            old = node[CHILDREN] or {}
+            node[CHILDREN] = dict((name, old.get(name) or [None, None])
+                                  for name in names)
+            node[MTIME] = mtime
+            self._dirty = True
+        return names
+
+    def subdirs(self, path):
+        """Return the subdirectories of path, listing it only if it changed
+
+        Raises OSError like os.scandir() if path can not be read.
+        """
+        mtime = os.stat(path).st_mtime
+        with self._lock:
+            node = self._node(path)
+            if node[CHILDREN] is not None and node[MTIME] == mtime:
+                return list(node[CHILDREN])
+        return self._refresh(path, node, mtime)
+
+    # -- background indexing
+
+    def is_indexed(self, path):
+        with self._lock:
+            return self._root_of(path) is not None
+
+    def build(self, root, max_dirs=0, max_depth=None):
+        """Index the subtree below root in a background thread
+
+        The directories are listed breadth first, at most max_dirs of them
+        (0 for no limit) and down to max_depth levels below root.
+        """
+        root = os.path.normpath(root)
+        with self._lock:
+            if root in self._building:
+                return
+            self._building.add(root)
+            self._node(root)
+        thread = threading.Thread(target=self._build,
+                                  args=(root, max_dirs, max_depth))
+        thread.daemon = True
+        thread.start()
+
+    def _build(self, root, max_dirs, max_depth):
+        try:
+            pending = deque([(root, 0)])
+            listed = 0
+            while pending and not (max_dirs and listed >= max_dirs):
+                path, depth = pending.popleft()
+                try:
+                    names = self.subdirs(path)
+                except OSError:
+                    continue
+                listed += 1
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for name in names:
+                    subpath = os.path.join(path, name)
+                    if not os.path.islink(subpath):
+                        pending.append((subpath, depth + 1))
+            self.save()
+        finally:
+            with self._lock:
+                self._building.discard(root)
+
+    # -- queries
+
+    def fuzzy_match(self, basepath, tokens, match, check=None, max_dirs=0):
+        # pylint: disable=too-many-arguments
+        """Generate directories below basepath whose components match tokens
+
+        `tokens' is reversed, like in cd._tab_fuzzy_match, and `match' is
+        called with the token and a directory name.  If given, `check' is
+        called before every directory that is looked up.  An unindexed
+        basepath is indexed as deep as the tokens reach, listing at most
+        max_dirs directories.
+        """
+        with self._lock:
+            root = self._root_of(basepath)
+            if root is not None:
+                self.used[root] = time.time()
+        if root is None:
+            self.build(basepath, max_dirs, max(len(tokens) - 1, 0))
+        if not tokens:
+            tokens = ['']
+        paths = [basepath]
+        try:
+            while paths:
+                token = tokens.pop()
+                matches = []
+                for path in paths:
+                    if check is not None:
+                        check()
+                    try:
+                        directories = self.subdirs(path)
+                    except OSError:
+                        continue
+                    found = [os.path.join(path, d) for d in directories
+                             if match(token, d)]
+                    if tokens:
+                        matches += found
+                    else:
+                        for match_path in found:
+                            yield match_path
+                paths = matches
+        finally:
+            self._save_later()
+
+
+def _count_nodes(node):
+    count = 0
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        count += 1
+        if node[CHILDREN]:
+            pending.extend(node[CHILDREN].values())
+    return count
+
+
+_INDEX = {}
+
+
+def get_dir_index(filename):
+    """Return the DirIndex stored in filename, loading it at most once"""
+    try:
+        return _INDEX[filename]
+    except KeyError:
+        index = _INDEX[filename] = DirIndex(filename)
+        return index
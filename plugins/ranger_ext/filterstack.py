@@ -0,0 +1,175 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A filter stack that is evaluated as one compiled predicate
+
+Directory.refilter() extends its list of filters with the filter stack
+and calls every filter on every file in stack order.  A FilterStack
+still holds the filters in that order, so pop, decompose and the
+combinators work as before.  But iterating over it yields a single
+predicate instead.  The predicate tries the filters that are cheapest
+per rejected file first and stops at the first one that rejects.
+
+Each filter keeps the results per file, keyed by the relative path and
+the stat signature of the file.  Re-filtering after a rotate or pop only
+calls a filter on the files that changed.  Filters whose result can
+change without the file changing set `cache_results' to False.  Filters
+that do their work elsewhere can declare their cost per call as `cost'.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from time import time
+
+
+# Guessed seconds per call, used until a filter has been measured
+PRIOR_COSTS = {
+    'TypeFilter': 1e-7,
+    'NameFilter': 1e-6,
+    'MimeFilter': 5e-6,
+    'NotFilter': 5e-6,
+    'AndFilter': 5e-6,
+    'OrFilter': 5e-6,
+}
+DEFAULT_PRIOR_COST = 1e-4
+
+CACHE_LIMIT = 100000
+
+
+def _signature(fobj):
+    stat = fobj.stat
+    if stat is None:
+        return (fobj.relative_path, None)
+    return (fobj.relative_path, stat.st_ino, stat.st_mtime, stat.st_size,
+            stat.st_mode)
+
+
+class _Term(object):
+    """A filter of the stack together with its cached results and timings"""
+
+    __slots__ = ('filt', 'cacheable', 'cache', 'calls', 'hits', 'rejected',
+                 'seconds')
+
+    def __init__(self, filt):
+        self.filt = filt
+        self.cacheable = getattr(filt, 'cache_results', True)
+        self.cache = {}
+        self.calls = 0
+        self.hits = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def test(self, fobj, signature):
+        if self.cacheable:
+            cached = self.cache.get(fobj.path)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                if not cached[1]:
+                    self.rejected += 1
+                return cached[1]
+        start = time()
+        result = bool(self.filt(fobj))
+        self.seconds += time() - start
+        self.calls += 1
+        if not result:
+            self.rejected += 1
+        if self.cacheable:
+            if len(self.cache) >= CACHE_LIMIT:
+                self.cache.clear()
+            self.cache[fobj.path] = (signature, result)
+        return result
+
+    @property
+    def cost(self):
+        """Average seconds per uncached call"""
+        declared = getattr(self.filt, 'cost', None)
+        if declared is not None:
+            return declared
+        if self.calls:
+            return self.seconds / self.calls
+        return PRIOR_COSTS.get(type(self.filt).__name__, DEFAULT_PRIOR_COST)
+
+    @property
+    def rank(self):
+        """Expected cost per rejected file; the lowest rank is tried first
+
+        A cached result costs next to nothing, so the cost is weighted by
+        the share of calls that weren't answered from the cache.
+        """
+        total = self.calls + self.hits
+        if not total:
+            return self.cost
+        rejection_rate = max(self.rejected / total, 0.01)
+        return self.cost * (self.calls + 1) / (total + 1) / rejection_rate
+
+    def describe(self):
+        total = self.calls + self.hits
+        return '%s  [%d calls, %.2f ms, %d cached, %d of %d rejected]' % (
+            self.filt, self.calls, self.seconds * 1000, self.hits,
+            self.rejected, total)
+
+
+class FilterStack(list):
+    """A list of stack filters that iterates as one compiled predicate"""
+
+    def __init__(self, filters=()):
+        list.__init__(self, filters)
+        self._terms = {}
+
+    def filters(self):
+        """The filters in stack order"""
+        return list(list.__iter__(self))
+
+    def _current_terms(self):
+        filters = self.filters()
+        keep = set(id(filt) for filt in filters)
+        for key in list(self._terms):
+            if key not in keep:
+                del self._terms[key]
+        terms = []
+        for filt in filters:
+            term = self._terms.get(id(filt))
+            if term is None or term.filt is not filt:
+                term = self._terms[id(filt)] = _Term(filt)
+            terms.append(term)
+        return terms
+
+    def evaluation_order(self):
+        """The terms in the order the predicate tries them"""
+        return sorted(self._current_terms(), key=lambda term: term.rank)
+
+    def compile(self):
+        """Return a predicate that accepts a file if all filters accept it"""
+        tests = [term.test for term in self.evaluation_order()]
+
+        def predicate(fobj):
+            signature = _signature(fobj)
+            for test in tests:
+                if not test(fobj, signature):
+                    return False
+            return True
+        return predicate
+
+    def __iter__(self):
+        if not len(self):
+            return iter(())
+        return iter((self.compile(),))
+
+    def describe(self):
+        """Lines for `filter_stack show'"""
+        terms = self._current_terms()
+        order = self.evaluation_order()
+        lines = [term.describe() for term in terms]
+        if len(terms) > 1:
+            lines.append('')
+            lines.append('Evaluation order: ' + ', '.join(
+                str(terms.index(term) + 1) for term in order))
+        return lines
+
+
+def get_filter_stack(directory):
+    """Return the filter stack of directory, turning it into a FilterStack"""
+    stack = directory.filter_stack
+    if not isinstance(stack, FilterStack):
+        stack = directory.filter_stack = FilterStack(stack)
+    return stack
@@ -0,0 +1,180 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A cache of flat listings, kept in the data directory across sessions
+
+Each (root, level) has a file with the entries of every directory that the
+flat view listed, together with the mtime the directory had.  On the next
+flat view of that root and level, a directory whose mtime is unchanged is
+served from the cache without being listed, and without stat()ing its
+files; only changed directories are listed again.
+
+The files are zlib-compressed pickles.  Using a file updates its mtime,
+and when the cache grows beyond its size limit the files that were used
+least recently are deleted.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import os
+import pickle
+import threading
+import zlib
+
+from .walker import Entry
+
+
+def _cache_name(root, level):
+    key = '%s\0%d' % (root, level)
+    return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+class FlatListingCache(object):
+    """The cached listing of one root and level while a flat view is built
+
+    Pass lookup() as the `cached' and record() as the `on_directory' hook of
+    a ParallelWalker, and call save() once the walk is complete.
+    """
+
+    def __init__(self, directory, root, level):
+        self.directory = directory
+        self.root = root
+        self.level = level
+        self.filename = os.path.join(directory, _cache_name(root, level))
+        self.hits = 0
+        self._old = None
+        self._new = {}
+        self._mtimes = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._old is not None:
+                return self._old
+            try:
+                with open(self.filename, 'rb') as fobj:
+                    state = pickle.loads(zlib.decompress(fobj.read()))
+                if state['root'] != self.root or state['level'] != self.level:
+                    raise ValueError('cache collision')
+                self._old = state['dirs']
+            except (OSError, IOError, EOFError, ValueError, KeyError, TypeError,
+                    zlib.error, pickle.UnpicklingError):
+                self._old = {}
+            return self._old
+
+    def lookup(self, path, depth):
+        old = self._load()
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        self._mtimes[path] = mtime
+        cached = old.get(path)
+        if cached is None or cached[0] != mtime:
+            return None
+        self._new[path] = cached
+        self.hits += 1
+        return [Entry(os.path.join(path, name), name, depth, stats, is_dir)
+                for name, stats, is_dir in cached[1]]
+
+    def record(self, path, entries):
+        mtime = self._mtimes.get(path)
+        if mtime is not None:
+            self._new[path] = (mtime, [(entry.name, entry.stats, entry.is_dir)
+                                       for entry in entries])
+
+    def save(self, max_size):
+        """Write the listing in a background thread, then evict old files"""
+        thread = threading.Thread(target=self._save, args=(max_size, ))
+        thread.daemon = True
+        thread.start()
+
+    def _save(self, max_size):
+        data = zlib.compress(pickle.dumps(
+            {'root': self.root, 'level': self.level, 'dirs': self._new},
+            pickle.HIGHEST_PROTOCOL))
+        if max_size and len(data) > max_size:
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmpname, 'wb') as fobj:
+                fobj.write(data)
+            os.rename(tmpname, self.filename)
+        except OSError:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+            return
+        evict(self.directory, max_size)
+
+
+def evict(directory, max_size):
+    """Delete the least recently used cache files until they fit in max_size"""
+    if not max_size:
+        return
+    files = []
+    try:
+        with os.scandir(directory) as dirents:
+            for dirent in dirents:
+                try:
+                    fstat = dirent.stat()
+                except OSError:
+                    continue
+                files.append((fstat.st_mtime, fstat.st_size, dirent.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def open_cache(directory, root, level):
+    cache = FlatListingCache(directory, root, level)
+    try:
+        os.utime(cache.filename, None)
+    except OSError:
+        pass
+    return cache
+
+
+def invalidate(directory, root=None):
+    """Delete the cached listings of root at every level, or all of them
+
+    Returns the number of deleted files.
+    """
+    if root is None:
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+    else:
+        names = [_cache_name(root, level) for level in range(-1, 100)]
+    count = 0
+    for name in names:
+        try:
+            os.unlink(os.path.join(directory, name))
+            count += 1
+        except OSError:
+            pass
+    return count
+
+
+def cache_size(directory):
+    """Return the number and total size of the cache files"""
+    count = size = 0
+    if os.path.isdir(directory):
+        with os.scandir(directory) as dirents:
+            for dirent in dirents:
+                try:
+                    size += dirent.stat().st_size
+                    count += 1
+                except OSError:
+                    pass
+    return count, size
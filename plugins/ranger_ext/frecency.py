@@ -0,0 +1,303 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A frecency database of visited directories for `cd -z'
+
+Visits are appended to a log file, which is cheap and safe with several
+ranger instances writing at the same time.  When the log grows too large, or
+a day after the last time, it is merged into the database file under an
+exclusive lock.  Then all ranks are aged: they halve every HALF_LIFE since
+the database was last aged, so directories that are no longer visited fade
+out and are dropped.  Ranks are kept as of the last aging, so a visit after
+it counts for more than 1 until the next aging brings it back to 1.  If
+there are still more than max_entries, the ones with the lowest frecency
+are dropped too.  Queries only use the in-memory tables: a dict of path ->
+[rank, last visit] and a sorted list of basenames searched with bisect.
+
+A forgotten path is logged with "-" in place of the time of the visit.  A
+newline in a path is written as NUL and "n", like in the copy buffer log,
+so that every entry stays on one line.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from bisect import bisect_left, insort
+import fcntl
+import os
+import time
+
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+LOG_COMPACT_SIZE = 256 * 1024
+AGE_INTERVAL = DAY
+HALF_LIFE = 4 * WEEK
+MIN_RANK = 0.05
+
+
+def _escape(path):
+    return path.replace('\n', '\0n') if '\n' in path else path
+
+
+def _unescape(path):
+    return path.replace('\0n', '\n') if '\0' in path else path
+
+
+def frecency(rank, last, now):
+    """The score of an entry, weighting its rank by the age of its last visit"""
+    age = now - last
+    if age < HOUR:
+        return rank * 4
+    if age < DAY:
+        return rank * 2
+    if age < WEEK:
+        return rank / 2
+    return rank / 4
+
+
+class _Lock(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, filename, operation):
+        self.filename = filename
+        self.operation = operation
+        self.fobj = None
+
+    def __enter__(self):
+        self.fobj = open(self.filename, 'a')
+        fcntl.flock(self.fobj, self.operation)
+        return self
+
+    def __exit__(self, *_):
+        fcntl.flock(self.fobj, fcntl.LOCK_UN)
+        self.fobj.close()
+
+
+class FrecencyStore(object):
+    """Directory visits with rank and recency, shared between instances"""
+
+    def __init__(self, filename, max_entries=200000):
+        self.filename = filename
+        self.logname = filename + '.log'
+        self.lockname = filename + '.lock'
+        self.max_entries = max_entries
+        self.entries = {}
+        # When the ranks in the database were last aged
+        self.aged = None
+        self._names = []
+        self._db_signature = None
+        self._log_offset = 0
+
+    # -- reading
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime, stat.st_size)
+
+    def sync(self):
+        """Catch up with the changes other instances made to the files"""
+        with _Lock(self.lockname, fcntl.LOCK_SH):
+            self._sync()
+
+    def _sync(self):
+        signature = self._signature()
+        if signature != self._db_signature:
+            self._read_db()
+            self._db_signature = signature
+            self._log_offset = 0
+        self._read_log()
+
+    def _read_db(self):
+        self.entries = {}
+        self.aged = None
+        try:
+            with open(self.filename, 'r', errors='surrogateescape',
+                      newline='\n') as fobj:
+                for line in fobj:
+                    if line.startswith('#aged\t'):
+                        try:
+                            self.aged = float(line[6:])
+                        except ValueError:
+                            pass
+                        continue
+                    try:
+                        rank, last, path = line.rstrip('\n').split('\t', 2)
+                        self.entries[_unescape(path)] = [float(rank), float(last)]
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        self._names = sorted((os.path.basename(path).lower(), path)
+                             for path in self.entries)
+
+    def _read_log(self):
+        try:
+            with open(self.logname, 'rb') as fobj:
+                fobj.seek(self._log_offset)
+                data = fobj.read()
+        except OSError:
+            return
+        end = data.rfind(b'\n') + 1
+        self._log_offset += end
+        for line in data[:end].decode('utf-8', 'surrogateescape').split('\n'):
+            try:
+                last, path = line.split('\t', 1)
+                if last == '-':
+                    self._forget(_unescape(path))
+                else:
+                    self._visit(_unescape(path), float(last))
+            except ValueError:
+                continue
+
+    def _weight(self, when):
+        """What a visit at `when' adds to a rank as of the last aging"""
+        if self.aged is None:
+            return 1.0
+        return 2.0 ** min((when - self.aged) / HALF_LIFE, 64)
+
+    def _visit(self, path, now):
+        try:
+            entry = self.entries[path]
+        except KeyError:
+            self.entries[path] = [self._weight(now), now]
+            insort(self._names, (os.path.basename(path).lower(), path))
+        else:
+            entry[0] += self._weight(now)
+            entry[1] = max(entry[1], now)
+
+    # -- writing
+
+    def _forget(self, path):
+        if self.entries.pop(path, None) is not None:
+            key = (os.path.basename(path).lower(), path)
+            i = bisect_left(self._names, key)
+            if i < len(self._names) and self._names[i] == key:
+                del self._names[i]
+
+    def _append(self, line):
+        """Append line to the log and catch up; returns the size of the log"""
+        with _Lock(self.lockname, fcntl.LOCK_SH):
+            fd = os.open(self.logname, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line.encode('utf-8', 'surrogateescape'))
+                size = os.fstat(fd).st_size
+            finally:
+                os.close(fd)
+            self._sync()
+        return size
+
+    def add(self, path):
+        """Record a visit of path, catching up with the other instances"""
+        now = time.time()
+        size = self._append('%d\t%s\n' % (now, _escape(path)))
+        if size > LOG_COMPACT_SIZE or self.aged is None or \
+                now - self.aged > AGE_INTERVAL:
+            self.compact()
+
+    def _age(self, now):
+        """Decay the ranks by the time since they were last aged"""
+        if self.aged is not None:
+            factor = 0.5 ** (max(now - self.aged, 0) / HALF_LIFE)
+            for path, entry in list(self.entries.items()):
+                entry[0] *= factor
+                if entry[0] < MIN_RANK:
+                    del self.entries[path]
+        self.aged = now
+
+    def _trim(self, now):
+        """Drop the entries with the lowest frecency beyond max_entries"""
+        if len(self.entries) > self.max_entries:
+            ranked = sorted(self.entries.items(),
+                            key=lambda item: -frecency(item[1][0], item[1][1], now))
+            self.entries = dict(ranked[:self.max_entries])
+
+    def compact(self):
+        """Merge the log into the database file and age out old entries"""
+        with _Lock(self.lockname, fcntl.LOCK_EX):
+            now = time.time()
+            self._read_db()
+            self._log_offset = 0
+            self._read_log()
+            self._age(now)
+            self._trim(now)
+            tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+            with open(tmpname, 'w', errors='surrogateescape', newline='\n') as fobj:
+                fobj.write('#aged\t%d\n' % self.aged)
+                for path, (rank, last) in self.entries.items():
+                    fobj.write('%.3f\t%d\t%s\n' % (rank, last, _escape(path)))
+            os.rename(tmpname, self.filename)
+            open(self.logname, 'w').close()
+            self._log_offset = 0
+            self._db_signature = self._signature()
+        self._names = sorted((os.path.basename(path).lower(), path)
+                             for path in self.entries)
+
+    def remove(self, path):
+        """Forget a path, e.g. because it no longer exists
+
+        The removal is logged, so that the other instances and the next
+        compaction forget the path too.
+        """
+        if path in self.entries:
+            self._append('-\t%s\n' % _escape(path))
+
+    # -- queries
+
+    def _candidates(self, last_token):
+        """Paths whose basename starts with last_token, found with bisect"""
+        i = bisect_left(self._names, (last_token, ''))
+        while i < len(self._names) and self._names[i][0].startswith(last_token):
+            yield self._names[i][1]
+            i += 1
+
+    def query(self, tokens, limit=None):
+        """Return the paths matching the tokens, best first
+
+        The last token has to match the beginning of the basename, the others
+        have to appear in the path in the given order.  If no basename starts
+        with the last token, it may appear anywhere in the basename instead.
+        """
+        tokens = [token.lower() for token in tokens if token]
+        if not tokens:
+            paths = list(self.entries)
+        else:
+            paths = list(self._candidates(tokens[-1]))
+            if not paths:
+                paths = [path for name, path in self._names if tokens[-1] in name]
+
+        def matches(path):
+            path = path.lower()
+            pos = 0
+            for token in tokens[:-1]:
+                pos = path.find(token, pos)
+                if pos < 0:
+                    return False
+                pos += len(token)
+            return True
+
+        now = time.time()
+        ranked = sorted((path for path in paths if matches(path)),
+                        key=lambda path: -frecency(self.entries[path][0],
+                                                   self.entries[path][1], now))
+        return ranked[:limit] if limit else ranked
+
+
+_STORES = {}
+
+
+def get_frecency_store(filename, max_entries, sync=True):
+    """Return the FrecencyStore for filename, reading it at most once
+
+    Without `sync', the store isn't brought up to date, as add() does that.
+    """
+    try:
+        store = _STORES[filename]
+    except KeyError:
+        store = _STORES[filename] = FrecencyStore(filename, max_entries)
+    store.max_entries = max_entries
+    if sync:
+        store.sync()
+    return store
@@ -0,0 +1,329 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A grep that runs inside ranger and lists its hits as it finds them
+
+A ParallelWalker lists the files below the selection, skipping hidden ones
+unless they are shown.  The files are handed in chunks to a pool of
+processes, shared by all searches, which search them, memory-mapping the
+large ones and skipping binary files.  Like in grep, ^ and $ match at line
+boundaries and a match can't span lines.  The files with hits are streamed
+into a VirtualListing of the current directory, and the hits themselves are
+kept in GrepSearch.current for the grep_jump command.
+
+If a trigram index covers the directory, the files it rules out are not
+searched at all.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import atexit
+from collections import OrderedDict
+import mmap
+import multiprocessing
+import os
+import re
+import stat
+import sys
+from time import time
+
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+
+from .virtual import VirtualListing
+from .walker import ParallelWalker
+
+
+MMAP_THRESHOLD = 64 * 1024
+BINARY_CHECK_BYTES = 8192
+MAX_LINE_LENGTH = 200
+CHUNK_FILES = 64
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def _search_buffer(regex, buf, size):
+    """Return [(line number, line)] of the lines of buf that match
+
+    The regex is searched in the whole buffer, but a match only counts if
+    it lies within one line, as in grep.
+    """
+    hits = []
+    lineno = 1
+    counted = 0
+    pos = 0
+    while pos <= size:
+        match = regex.search(buf, pos)
+        if match is None:
+            break
+        start = buf.rfind(b'\n', 0, match.start()) + 1
+        end = buf.find(b'\n', match.start())
+        if end < 0:
+            end = size
+        if match.end() > end and regex.search(buf, start, end) is None:
+            pos = end + 1  # the match spans lines, and the line has none
+            continue
+        lineno += buf[counted:start].count(b'\n')
+        counted = start
+        line = buf[start:end][:MAX_LINE_LENGTH].decode('utf-8', 'replace')
+        hits.append((lineno, line))
+        pos = end + 1
+    return hits
+
+
+def grep_file(regex, path):
+    """Return (hits, bytes read) for one file; binary files have no hits"""
+    with open(path, 'rb') as fobj:
+        size = os.fstat(fobj.fileno()).st_size
+        if size > MMAP_THRESHOLD:
+            try:
+                buf = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error):
+                buf = fobj.read()
+        else:
+            buf = fobj.read()
+        try:
+            if b'\0' in buf[:BINARY_CHECK_BYTES]:
+                return [], min(size, BINARY_CHECK_BYTES)
+            return _search_buffer(regex, buf, len(buf)), size
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+
+
+def grep_files(pattern, flags, paths):
+    """Search a chunk of files in a worker process
+
+    Returns [(path, hits)] for the files with hits and the number of bytes
+    that were read.
+    """
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    results = []
+    total = 0
+    for path in paths:
+        try:
+            hits, size = grep_file(regex, path)
+        except (OSError, IOError):
+            continue
+        total += size
+        if hits:
+            results.append((path, hits))
+    return results, total
+
+
+_POOLS = {}
+
+
+def _terminate_pools():
+    for pool in _POOLS.values():
+        pool.terminate()
+    _POOLS.clear()
+
+
+# Pool.__del__ fails if the pool is still around when the interpreter exits
+atexit.register(_terminate_pools)
+
+
+def worker_pool(workers):
+    """The process pool shared by all searches, started by the first one
+
+    The workers are forked from a fork server, which has no threads.  A
+    worker forked from ranger itself could inherit a lock held by one of
+    ranger's threads and hang on it.
+    """
+    pool = _POOLS.get(workers)
+    if pool is None:
+        _terminate_pools()
+        pool = _POOLS[workers] = _forkserver_pool(workers)
+    return pool
+
+
+def _forkserver_pool(workers):
+    """Start a pool whose workers are forked from a fork server
+
+    The fork server preloads grepworker, which keeps the workers from
+    running ranger's launcher.  It imports it from the directory that
+    holds plugins/, which ranger takes off sys.path after loading plugins.
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__package__ + '.grepworker'])
+    confdir = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    added = confdir not in sys.path
+    if added:
+        sys.path.insert(0, confdir)
+    try:
+        return context.Pool(workers)
+    finally:
+        if added:
+            sys.path.remove(confdir)
+
+
+def discard_pool(pool):
+    """Stop a pool that still has work of a cancelled search queued"""
+    for workers, known in list(_POOLS.items()):
+        if known is pool:
+            del _POOLS[workers]
+    pool.terminate()
+
+
+class GrepSearch(Loadable, FileManagerAware):
+    """Feed the files found by a walker to the process pool, show the hits"""
+
+    progressbar_supported = False
+    current = None
+
+    def __init__(self, directory, paths, pattern, flags=0, workers=0,
+                 index=None):
+        # pylint: disable=too-many-arguments
+        self.directory = directory
+        self.pattern = pattern
+        self.index = index
+        self.may_match = index.filter_for(pattern) if index is not None else None
+        self.skipped = 0
+        self.hits = OrderedDict()
+        self.hit_count = 0
+        self.files_searched = 0
+        self.bytes_read = 0
+        self.position = None
+        self.started = time()
+        self._encoded = pattern.encode('utf-8')
+        self._flags = flags
+        self._workers = workers or multiprocessing.cpu_count()
+        self._pool = None
+        self._pending = []
+        self._chunk = []
+        self._chunk_bytes = 0
+        self._files = [path for path in paths if not os.path.isdir(path)]
+        self._dirs = [(path, 0) for path in paths if os.path.isdir(path)]
+        settings = self.fm.settings
+        skip = None
+        if not settings.show_hidden and settings.hidden_filter:
+            skip = re.compile(settings.hidden_filter).search
+        self.walker = ParallelWalker(directory.path, skip=skip,
+                                     accept=self._accept, follow_links=False)
+        self.listing = VirtualListing(directory)
+        Loadable.__init__(self, self.generate(), 'Grep "%s"' % pattern)
+
+    @staticmethod
+    def _accept(entry):
+        return entry.stats is not None and stat.S_ISREG(entry.stats[0].st_mode)
+
+    def start(self):
+        if GrepSearch.current is not None:
+            GrepSearch.current.cancel()
+        GrepSearch.current = self
+        self.listing.begin()
+        self.listing.on_leave = self.cancel
+        self._pool = worker_pool(self._workers)
+        self.walker.start(self._dirs)
+        self.fm.loader.add(self)
+
+    def _submit(self, path, fstat):
+        if self.may_match is not None and not self.may_match(path, fstat):
+            self.skipped += 1
+            return
+        self._chunk.append(path)
+        self._chunk_bytes += fstat.st_size
+        if len(self._chunk) >= CHUNK_FILES or self._chunk_bytes >= CHUNK_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if self._chunk:
+            self._pending.append(self._pool.apply_async(
+                grep_files, (self._encoded, self._flags, self._chunk)))
+            self.files_searched += len(self._chunk)
+            self._chunk = []
+            self._chunk_bytes = 0
+
+    def _collect(self):
+        done = []
+        pending = []
+        for result in self._pending:
+            (done if result.ready() else pending).append(result)
+        if not done:
+            return
+        self._pending = pending
+        fobjs = []
+        for result in done:
+            try:
+                found, size = result.get()
+            except (OSError, IOError, re.error) as err:
+                self.fm.notify('grep: %s' % err, bad=True)
+                continue
+            self.bytes_read += size
+            for path, hits in found:
+                self.hits[path] = hits
+                self.hit_count += len(hits)
+                fobjs.append(self.listing.make_file(path))
+        if fobjs:
+            self.listing.publish(fobjs)
+
+    def generate(self):
+        for path in self._files:
+            try:
+                self._submit(path, os.stat(path))
+            except OSError:
+                pass
+        walker = self.walker
+        while not walker.finished:
+            if self.listing.replaced:
+                self._stop()
+                return
+            for entry in walker.get_batch():
+                self._submit(entry.path, entry.stats[0])
+            self._collect()
+            yield
+        if walker.cancelled:
+            return
+        self._flush()
+        while self._pending:
+            if self.listing.replaced:
+                self._stop()
+                return
+            self._pending[0].wait(0.01)
+            self._collect()
+            yield
+        self.listing.finish()
+        self.fm.notify(self.summary())
+        if self.index is not None:
+            self.index.build()
+
+    def summary(self):
+        seconds = max(time() - self.started, 1e-6)
+        text = '%d hits in %d of %d files, %.1f MB in %.1fs (%.1f MB/s)' % (
+            self.hit_count, len(self.hits), self.files_searched,
+            self.bytes_read / 1e6, seconds, self.bytes_read / 1e6 / seconds)
+        if self.index is not None:
+            text += ', %d files ruled out by the index' % self.skipped
+        return text
+
+    def get_description(self):
+        seconds = max(time() - self.started, 1e-6)
+        return '%s (%d hits, %d files, %.1f MB/s)' % (
+            self.description, self.hit_count, self.files_searched,
+            self.bytes_read / 1e6 / seconds)
+
+    def destroy(self):
+        self.walker.cancel()
+        if self._pool is not None and \
+                any(not result.ready() for result in self._pending):
+            discard_pool(self._pool)
+        self._pending = []
+
+    def _stop(self):
+        """Stop searching because ranger reloaded the directory"""
+        self.destroy()
+        self.listing.close()
+
+    def cancel(self):
+        """Stop searching; the hits found so far stay listed"""
+        self.destroy()
+        self.listing.close()
+        if self in self.fm.loader.queue:
+            self.fm.loader.remove(item=self)
+
+    def flat_hits(self):
+        """The hits in the order of the listed files"""
+        hits = self.hits
+        return [(fobj, lineno, line) for fobj in self.directory.files
+                for lineno, line in hits.get(fobj.path, ())]
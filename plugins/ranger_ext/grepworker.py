@@ -0,0 +1,24 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Preloaded by the fork server that the grep workers are forked from
+
+Before running a task, a worker of a spawn or forkserver pool re-runs the
+main script of its parent, and ranger's launcher starts ranger without a
+__main__ guard.  The grep workers don't need anything from the main
+script, so importing this module in the fork server turns that step off
+for every worker forked from it.  Ranger itself never imports it.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from multiprocessing import spawn
+
+from . import grep  # noqa: F401 pylint: disable=unused-import
+
+
+def _keep_main(main_path):  # pylint: disable=unused-argument
+    pass
+
+
+spawn._fixup_main_from_path = _keep_main  # pylint: disable=protected-access
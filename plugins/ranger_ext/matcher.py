@@ -0,0 +1,264 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Matchers for scout that are not plain regular expressions
+
+They can stand in for a compiled regex wherever ranger only calls
+search() on a file name, and they provide `pattern' and `flags' too.
+
+The glob, letter-skip and inverted matchers behave like the regexes that
+scout used to build for these modes, such as "a.*b.*c" and
+"^(?:(?!X).)*$".  Those can backtrack a lot on long names.  These
+matchers run in time linear in the length of the name instead, for a
+given pattern.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+
+
+BONUS_MATCH = 16
+BONUS_CONSECUTIVE = 8
+BONUS_BOUNDARY = 10
+BONUS_FIRST_CHAR = 6
+BONUS_BASENAME = 2
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+
+BOUNDARY_CHARS = frozenset('/_-. ')
+
+
+class FuzzyMatcher(object):
+    """fzf-like fuzzy matching that scores the matched characters
+
+    A name matches if it contains the characters of the pattern in order.
+    The score rewards consecutive characters, characters at the start of a
+    word and characters in the base name, and penalizes gaps.
+    """
+
+    def __init__(self, pattern, ignore_case=False):
+        self.pattern = pattern
+        self.flags = re.IGNORECASE if ignore_case else 0
+        self._needle = pattern.lower() if ignore_case else pattern
+        self._scores = {}
+
+    def _span(self, text):
+        """Return the shortest window text[start:end] containing the pattern"""
+        needle = self._needle
+        end = 0
+        for char in needle:
+            end = text.find(char, end)
+            if end < 0:
+                return None
+            end += 1
+        start = end
+        for char in reversed(needle):
+            start = text.rfind(char, 0, start)
+        return start, end
+
+    def score(self, text):
+        """Return the score of text, or None if it doesn't match"""
+        try:
+            return self._scores[text]
+        except KeyError:
+            pass
+        haystack = text.lower() if self.flags else text
+        span = self._span(haystack)
+        if span is None:
+            result = None
+        elif not self._needle:
+            result = 0
+        else:
+            result = self._score_span(text, haystack, *span)
+        self._scores[text] = result
+        return result
+
+    def _score_span(self, text, haystack, start, end):
+        basename_start = text.rfind('/') + 1
+        score = 0
+        previous = None
+        pos = start
+        for char in self._needle:
+            pos = haystack.find(char, pos, end)
+            score += BONUS_MATCH
+            if previous is not None:
+                gap = pos - previous - 1
+                if gap == 0:
+                    score += BONUS_CONSECUTIVE
+                else:
+                    score -= PENALTY_GAP_START + PENALTY_GAP_EXTENSION * (gap - 1)
+            if pos == 0 or text[pos - 1] in BOUNDARY_CHARS or \
+                    (text[pos - 1].islower() and text[pos].isupper()):
+                score += BONUS_FIRST_CHAR if previous is None else BONUS_BOUNDARY
+            if pos >= basename_start:
+                score += BONUS_BASENAME
+            previous = pos
+            pos += 1
+        return score
+
+    def search(self, text):
+        return self.score(text) is not None
+
+    def rank(self, texts):
+        """Return the indices of the matching texts, best match first
+
+        Ties are broken by the length of the text and then by position.
+        """
+        scored = []
+        score = self.score
+        for i, text in enumerate(texts):
+            value = score(text)
+            if value is not None:
+                scored.append((-value, len(text), i))
+        scored.sort()
+        return [i for _, _, i in scored]
+
+
+class _Anchored(object):  # pylint: disable=too-few-public-methods
+    """Base class of matchers for patterns that may start with ^ or end with $
+
+    `regex' is the equivalent regular expression, which serves as the
+    pattern attribute.
+    """
+
+    def __init__(self, pattern, regex, ignore_case=False):
+        self.pattern = regex
+        self.flags = re.IGNORECASE if ignore_case else 0
+        self.ignore_case = ignore_case
+        self.at_start = pattern.startswith('^')
+        if self.at_start:
+            pattern = pattern[1:]
+        self.at_end = pattern.endswith('$')
+        if self.at_end:
+            pattern = pattern[:-1]
+        if ignore_case:
+            pattern = pattern.lower()
+        self.body = pattern
+
+    def _prepare(self, text):
+        return text.lower() if self.ignore_case else text
+
+
+class _Segment(object):  # pylint: disable=too-few-public-methods
+    """A piece of a glob between two stars, where ? matches any character"""
+
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        if '?' in text:
+            regex = re.compile(''.join('.' if c == '?' else re.escape(c) for c in text))
+            self.find = lambda s, pos=0: _regex_find(regex, s, pos)
+            self.match_at = lambda s, pos: regex.match(s, pos) is not None
+        else:
+            self.find = lambda s, pos=0: s.find(text, pos)
+            self.match_at = lambda s, pos: s.startswith(text, pos)
+
+
+def _regex_find(regex, text, pos):
+    match = regex.search(text, pos)
+    return match.start() if match else -1
+
+
+class GlobMatcher(_Anchored):
+    """Search with a glob pattern, where * matches anything and ? one character
+
+    The pattern is split at the stars into segments which are found from
+    left to right, each as early as possible.  For globs that is enough.
+    No position is ever tried twice for the same segment.
+    """
+
+    def __init__(self, pattern, regex, ignore_case=False):
+        _Anchored.__init__(self, pattern, regex, ignore_case)
+        self.segments = [_Segment(text) for text in self.body.split('*')]
+
+    def search(self, text):
+        text = self._prepare(text)
+        segments = self.segments
+        first, last = segments[0], segments[-1]
+        if len(segments) == 1:
+            if self.at_start and self.at_end:
+                return len(text) == first.length and first.match_at(text, 0)
+            if self.at_end:
+                return len(text) >= first.length and \
+                    first.match_at(text, len(text) - first.length)
+            if self.at_start:
+                return first.match_at(text, 0)
+            return first.find(text) >= 0
+
+        if self.at_start:
+            if not first.match_at(text, 0):
+                return False
+            pos = first.length
+        else:
+            pos = first.find(text)
+            if pos < 0:
+                return False
+            pos += first.length
+        for segment in segments[1:-1]:
+            pos = segment.find(text, pos)
+            if pos < 0:
+                return False
+            pos += segment.length
+        if self.at_end:
+            start = len(text) - last.length
+            return start >= pos and last.match_at(text, start)
+        return last.find(text, pos) >= 0
+
+
+class SubsequenceMatcher(_Anchored):
+    """Search for the characters of the pattern in order, with any gaps"""
+
+    def search(self, text):
+        text = self._prepare(text)
+        body = self.body
+        if not body:
+            return not (self.at_start and self.at_end) or not text
+        end = len(text)
+        if self.at_end:
+            if not text.endswith(body[-1]):
+                return False
+            end -= 1
+            body = body[:-1]
+            if not body:
+                return not self.at_start or end == 0
+        pos = 0
+        if self.at_start:
+            if end < 1 or text[0] != body[0]:
+                return False
+            pos = 1
+            body = body[1:]
+        for char in body:
+            pos = text.find(char, pos, end)
+            if pos < 0:
+                return False
+            pos += 1
+        return True
+
+
+class InvertedMatcher(object):  # pylint: disable=too-few-public-methods
+    """Match what the wrapped matcher doesn't match
+
+    Like the regex "^(?:(?!X).)*$" this used to be, a name is rejected
+    only by a match that starts before its end, so "-v $" still matches
+    every name.
+    """
+
+    def __init__(self, matcher, pattern=None):
+        self.matcher = matcher
+        self.pattern = matcher.pattern if pattern is None else pattern
+        self.flags = matcher.flags
+
+    def search(self, text):
+        if not text:
+            return True
+        matcher = self.matcher
+        if getattr(matcher, 'body', None) == '':
+            # An empty body matches at the end, or at the very start
+            return matcher.at_end
+        found = matcher.search(text)
+        if found is None or found is False:
+            return True
+        if found is True:
+            return False  # a non-empty body starts before the end
+        return found.start() == len(text)
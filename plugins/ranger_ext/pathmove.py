@@ -0,0 +1,152 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Carry tags, bookmarks and metadata along when files are moved
+
+move_paths() takes a whole mapping of old to new paths.  A path that isn't
+in the mapping follows its closest moved parent directory, so the tags
+below a renamed directory move with it.  Finding the new path of a file
+costs a lookup per directory level, and the results for directories are
+remembered, so the tags of a directory cost one lookup each.
+
+The tags file and the bookmarks file are rewritten once, and each
+.metadata.json file that changes is rewritten once.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+
+
+class PathMapper(object):
+    """Translates paths through a mapping of moved files and directories"""
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        self._dirs = {}
+
+    def __len__(self):
+        return len(self.mapping)
+
+    def __call__(self, path):
+        """The new path of path, or None if it didn't move"""
+        new = self.mapping.get(path)
+        if new is not None:
+            return new
+        head, _, tail = path.rpartition(os.sep)
+        if not head:
+            return None
+        try:
+            new_head = self._dirs[head]
+        except KeyError:
+            new_head = self._dirs[head] = self(head)
+        if new_head is None:
+            return None
+        return new_head + os.sep + tail
+
+
+def move_tags(tags, mapper):
+    """Rename the tagged paths; returns the number of moved tags"""
+    tags.sync()
+    moved = 0
+    result = {}
+    # Build a new dict so that swapped names don't overwrite each other
+    for path, tag in tags.tags.items():
+        new = mapper(path)
+        if new is None:
+            result.setdefault(path, tag)
+        else:
+            result[new] = tag
+            moved += 1
+    if moved:
+        tags.tags = result
+        tags.dump()
+    return moved
+
+
+def move_bookmarks(bookmarks, mapper):
+    """Point the bookmarks at the new paths; returns the number changed"""
+    bookmarks.update_if_outdated()
+    moved = 0
+    for key, bfile in list(bookmarks):
+        new = mapper(bfile.path)
+        if new is not None:
+            bookmarks.dct[key] = bookmarks.bookmarktype(new)
+            moved += 1
+    if moved:
+        bookmarks.save()
+    return moved
+
+
+def move_metadata(metadata, mapper):
+    """Move the entries of the moved files between .metadata.json files
+
+    A moved directory takes its own .metadata.json along, so only the
+    entries of the files that were moved themselves need to change.
+    Returns the number of moved entries.
+    """
+    from ranger.core.metadata import METADATA_FILE_NAME
+
+    contents = {}
+    changed = set()
+
+    def content(directory):
+        metafile = os.path.join(directory, METADATA_FILE_NAME)
+        if metafile not in contents:
+            try:
+                with open(metafile, 'r') as fobj:
+                    contents[metafile] = json.load(fobj)
+            except (OSError, IOError, ValueError):
+                contents[metafile] = None
+        return metafile, contents[metafile]
+
+    by_dir = {}
+    for old, new in mapper.mapping.items():
+        old_dir, _, name = old.rpartition(os.sep)
+        by_dir.setdefault(old_dir or os.sep, []).append((old, name, new))
+
+    # Take all entries out before putting them back, for swapped names
+    taken = []
+    for old_dir, moves in by_dir.items():
+        # The old directory may have been moved in the same go
+        old_file, entries = content(mapper(old_dir) or old_dir)
+        if not entries:
+            continue
+        for old, name, new in moves:
+            entry = entries.pop(old, None)
+            if entry is None:
+                entry = entries.pop(name, None)
+            if entry is not None:
+                taken.append((new, entry))
+                changed.add(old_file)
+    for new, entry in taken:
+        new_file, new_entries = content(os.path.dirname(new))
+        if new_entries is None:
+            new_entries = contents[new_file] = {}
+        new_entries[os.path.basename(new)] = entry
+        changed.add(new_file)
+
+    for metafile in changed:
+        try:
+            with open(metafile, 'w') as fobj:
+                json.dump(contents[metafile], fobj, check_circular=True, indent=2)
+        except (OSError, IOError):
+            pass
+    if changed:
+        metadata.metadata_cache.clear()
+        metadata.metafile_cache.clear()
+    return len(taken)
+
+
+def move_paths(fm, pairs):
+    """Apply (old path, new path) pairs to tags, bookmarks and metadata"""
+    mapper = PathMapper(pairs)
+    if not mapper:
+        return
+    if fm.tags is not None:
+        move_tags(fm.tags, mapper)
+    if fm.bookmarks is not None:
+        move_bookmarks(fm.bookmarks, mapper)
+    if getattr(fm, 'metadata', None) is not None:
+        move_metadata(fm.metadata, mapper)
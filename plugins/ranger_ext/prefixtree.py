@@ -0,0 +1,58 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A prefix tree of paths, used to find the bookmarks below a directory"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+
+def _components(path):
+    return [name for name in path.split(os.sep) if name]
+
+
+class PathPrefixTree(object):
+    """Paths stored by their components
+
+    Every node keeps the list of paths that lie strictly below it, so
+    below() costs one walk down the tree per lookup.
+    """
+
+    def __init__(self, paths=()):
+        self.root = ({}, [])
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        node = self.root
+        for name in _components(path):
+            node[1].append(path)
+            node = node[0].setdefault(name, ({}, []))
+
+    def below(self, path):
+        """Return the stored paths that start with path + os.sep"""
+        if not os.path.isabs(path):
+            return []
+        node = self.root
+        for name in _components(path):
+            try:
+                node = node[0][name]
+            except KeyError:
+                return []
+        return node[1]
+
+
+class BookmarkTree(object):  # pylint: disable=too-few-public-methods
+    """Cache a PathPrefixTree of the bookmarks, rebuilt when they change"""
+
+    _cache = (None, None)
+
+    @classmethod
+    def get(cls, bookmarks):
+        paths = tuple(bfile.path for bfile in bookmarks.dct.values())
+        signature, tree = cls._cache
+        if signature != paths:
+            tree = PathPrefixTree(paths)
+            cls._cache = (paths, tree)
+        return tree
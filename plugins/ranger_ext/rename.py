@@ -0,0 +1,258 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Renaming many files at once, with a journal to recover from interruptions
+
+plan_renames() turns (old path, new path) pairs into a list of operations:
+directories to create and renames in an order in which no rename overwrites
+a file.  Renames that form cycles, like a->b and b->a, go through a
+temporary name.  A target that exists and isn't renamed away is an error.
+
+RenameJournal runs a plan.  Before the first rename it writes the plan to
+the journal file, and it appends the number of every finished operation,
+syncing the file to disk after each batch.  If the run is interrupted, the
+journal tells which operations were done, so that the run can be resumed or
+rolled back.  At most the operation after the last recorded one is in
+doubt; whether it happened is seen from which of its paths exist.  If the
+journal itself can't be written, the run is rolled back right away.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+
+
+BATCH_SIZE = 500
+MKDIR, RENAME = 'mkdir', 'rename'
+
+
+class RenameError(Exception):
+    pass
+
+
+def _temp_name(path, number):
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.%s.bulkrename-%d-%d' % (tail, os.getpid(), number))
+
+
+def plan_renames(pairs):
+    """Return the operations that rename every old path to its new path
+
+    Raises RenameError if two files would get the same name or a new name is
+    taken by a file that stays.
+    """
+    pending = {}
+    targets = set()
+    for old, new in pairs:
+        if new in targets:
+            raise RenameError('%s is the new name of two files' % new)
+        targets.add(new)
+        pending[old] = new
+    for old, new in pending.items():
+        if new not in pending and os.path.lexists(new):
+            raise RenameError('%s already exists' % new)
+
+    ops = []
+    made = set()
+    for new in pending.values():
+        parent = os.path.dirname(new)
+        if parent and parent not in made and not os.path.isdir(parent):
+            ops.append((MKDIR, parent))
+            made.add(parent)
+
+    by_new = dict((new, old) for old, new in pending.items())
+    ready = [old for old, new in pending.items() if new not in pending]
+    temps = 0
+    while pending:
+        if not ready:
+            # Only cycles are left: move one file of a cycle out of the way
+            old = next(iter(pending))
+            temps += 1
+            temp = _temp_name(old, temps)
+            ops.append((RENAME, old, temp))
+            new = pending.pop(old)
+            pending[temp] = new
+            by_new[new] = temp
+            ready.append(by_new.get(old))
+            continue
+        old = ready.pop()
+        new = pending.pop(old)
+        ops.append((RENAME, old, new))
+        # The file that was to be renamed to `old' can go now
+        waiting = by_new.get(old)
+        if waiting in pending:
+            ready.append(waiting)
+    return ops
+
+
+def _applied(operation):
+    """Whether an operation has visibly happened"""
+    if operation[0] == MKDIR:
+        return os.path.isdir(operation[1])
+    return os.path.lexists(operation[2]) and not os.path.lexists(operation[1])
+
+
+def describe(ops):
+    """Lines for the review of a plan in the editor"""
+    from ranger.ext.shell_escape import shell_escape as esc
+    lines = []
+    for operation in ops:
+        if operation[0] == MKDIR:
+            lines.append('mkdir -p -- %s' % esc(operation[1]))
+        else:
+            lines.append('mv -vi -- %s %s' % (esc(operation[1]), esc(operation[2])))
+    return lines
+
+
+class RenameJournal(object):
+    """Runs a plan of renames, recording its progress in a journal file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.ops = []
+        self.done = 0
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def load(self):
+        with open(self.filename, 'r') as fobj:
+            lines = fobj.read().splitlines()
+        try:
+            self.ops = [tuple(op) for op in json.loads(lines[0])['ops']]
+            for line in lines[1:]:
+                self.done = max(self.done, json.loads(line)['done'])
+        except (IndexError, KeyError, TypeError, ValueError):
+            # A half-written last line is expected after a crash
+            if not self.ops:
+                raise RenameError('The journal %s is damaged' % self.filename)
+        if self.done < len(self.ops) and _applied(self.ops[self.done]):
+            self.done += 1
+        return self
+
+    def start(self, ops):
+        if self.exists():
+            raise RenameError('An interrupted bulkrename is pending, use '
+                              '":bulkrename resume" or ":bulkrename rollback"')
+        self.ops = ops
+        self.done = 0
+        try:
+            with open(self.filename, 'w') as fobj:
+                fobj.write(json.dumps({'ops': ops}) + '\n')
+                fobj.flush()
+                os.fsync(fobj.fileno())
+        except (OSError, IOError) as err:
+            try:
+                os.unlink(self.filename)
+            except OSError:
+                pass
+            raise RenameError('Cannot write the journal, nothing was renamed: %s'
+                              % err)
+        return self.run()
+
+    def run(self):
+        """Do the remaining operations; returns the renamed (old, new) pairs
+
+        If a rename fails, the journal is kept and RenameError is raised.
+        If the journal can't be written, what was done is rolled back.
+        """
+        try:
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND)
+        except OSError as err:
+            raise RenameError('Cannot open the journal: %s' % err)
+        try:
+            while self.done < len(self.ops):
+                operation = self.ops[self.done]
+                try:
+                    if operation[0] == MKDIR:
+                        if not os.path.isdir(operation[1]):
+                            os.makedirs(operation[1])
+                    else:
+                        if os.path.lexists(operation[2]):
+                            raise OSError('%s already exists' % operation[2])
+                        os.rename(operation[1], operation[2])
+                except OSError as err:
+                    raise RenameError('%s (%d of %d done, use ":bulkrename resume"'
+                                      ' or ":bulkrename rollback")'
+                                      % (err, self.done, len(self.ops)))
+                self.done += 1
+                try:
+                    os.write(fd, ('{"done": %d}\n' % self.done).encode('ascii'))
+                    if self.done % BATCH_SIZE == 0:
+                        os.fsync(fd)
+                except OSError as err:
+                    raise RenameError(self._abandon(err))
+        finally:
+            os.close(fd)
+        os.unlink(self.filename)
+        return self.renamed()
+
+    def _abandon(self, err):
+        """Roll back after the journal couldn't be written; returns why"""
+        try:
+            self.rollback()
+        except (RenameError, OSError) as rollback_err:
+            return ('Cannot write the journal (%s), and the rollback stopped: %s'
+                    % (err, rollback_err))
+        return 'Cannot write the journal (%s), the renames were rolled back' % err
+
+    def rollback(self):
+        """Undo the operations that were done, newest first"""
+        for operation in reversed(self.ops[:self.done]):
+            try:
+                if operation[0] == MKDIR:
+                    os.rmdir(operation[1])
+                elif _applied(operation):
+                    os.rename(operation[2], operation[1])
+            except OSError as err:
+                if operation[0] == RENAME:
+                    raise RenameError('Rollback stopped: %s' % err)
+        os.unlink(self.filename)
+
+    def renamed(self):
+        """The (old, new) pairs of the files, following temporary names"""
+        final = {}
+        origin = {}
+        for operation in self.ops:
+            if operation[0] != RENAME:
+                continue
+            _, old, new = operation
+            source = origin.pop(old, old)
+            origin[new] = source
+            final[source] = new
+        return [(old, new) for old, new in final.items() if old != new]
+
+
+def refresh_renamed(fm, directory, pairs):
+    """Replace the renamed entries of directory instead of reloading it
+
+    This works if the directory isn't flattened and every file stayed in
+    it; otherwise the directory is marked for reloading.
+    """
+    from ranger.container.file import File
+
+    if not directory.content_loaded or directory.files_all is None:
+        return
+    if directory.flat or any(os.path.dirname(new) != directory.path
+                             for _, new in pairs):
+        directory.content_outdated = True
+        return
+    positions = dict((fobj.path, i) for i, fobj in enumerate(directory.files_all))
+    try:
+        for old, new in pairs:
+            i = positions.get(old)
+            if i is None:
+                continue
+            if directory.files_all[i].is_directory:
+                fobj = fm.get_directory(new)
+            else:
+                fobj = File(new)
+            fobj.load()
+            directory.files_all[i] = fobj
+        directory.load_content_mtime = os.stat(directory.path).st_mtime
+    except OSError:
+        directory.content_outdated = True
+        return
+    directory.filenames = [fobj.path for fobj in directory.files_all]
+    directory.sort()
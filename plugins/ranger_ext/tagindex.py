@@ -0,0 +1,156 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Tags with an index from directories to their tagged files
+
+IndexedTags keeps its `tags' dict in a _TagDict, which updates a second
+dict of {directory: {basename: tag}} whenever a tag is set or removed.
+Whatever replaces or changes `tags', be it sync() or code that edits the
+dict directly, keeps the index current.
+
+With the index, the tags of a directory's files are found by their
+basenames, without resolving the real path of every file.  Only symlinks
+still need their real path.  A directory below a symlink is looked up by
+its real path too, where the files were tagged if they were tagged from
+the real location.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.container.tags import Tags
+
+
+class _TagDict(dict):
+    """A dict of {path: tag} that keeps an index by directory
+
+    If `changed' is a set, the paths whose tag was set or removed are
+    added to it.  load() and drop() change a tag without recording it.
+    """
+
+    changed = None
+
+    def __init__(self, tags=()):
+        dict.__init__(self, tags)
+        self.by_dir = {}
+        for path, tag in dict.items(self):
+            self._index(path, tag)
+
+    def _index(self, path, tag):
+        head, _, name = path.rpartition('/')
+        try:
+            self.by_dir[head][name] = tag
+        except KeyError:
+            self.by_dir[head] = {name: tag}
+
+    def _unindex(self, path):
+        head, _, name = path.rpartition('/')
+        names = self.by_dir.get(head)
+        if names is not None:
+            names.pop(name, None)
+            if not names:
+                del self.by_dir[head]
+
+    def load(self, path, tag):
+        dict.__setitem__(self, path, tag)
+        self._index(path, tag)
+
+    def drop(self, path):
+        if dict.pop(self, path, None) is not None:
+            self._unindex(path)
+
+    def __setitem__(self, path, tag):
+        self.load(path, tag)
+        if self.changed is not None:
+            self.changed.add(path)
+
+    def __delitem__(self, path):
+        dict.__delitem__(self, path)
+        self._unindex(path)
+        if self.changed is not None:
+            self.changed.add(path)
+
+    def pop(self, path, *default):
+        if path in self:
+            self._unindex(path)
+            if self.changed is not None:
+                self.changed.add(path)
+        return dict.pop(self, path, *default)
+
+    def popitem(self):
+        path, tag = dict.popitem(self)
+        self._unindex(path)
+        if self.changed is not None:
+            self.changed.add(path)
+        return path, tag
+
+    def setdefault(self, path, tag=None):
+        if path not in self:
+            self[path] = tag
+        return dict.__getitem__(self, path)
+
+    def update(self, *args, **kwargs):
+        for path, tag in dict(*args, **kwargs).items():
+            self[path] = tag
+
+    def clear(self):
+        if self.changed is not None:
+            self.changed.update(self)
+        dict.clear(self)
+        self.by_dir.clear()
+
+
+class IndexedTags(Tags):
+    """Tags that can list the tagged files of a directory in O(1)"""
+
+    _tags = None
+
+    @property
+    def tags(self):
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        if not isinstance(value, _TagDict):
+            value = _TagDict(value)
+        self._tags = value
+
+    @classmethod
+    def from_tags(cls, tags):
+        """Turn a loaded Tags object into IndexedTags without reading again"""
+        indexed = cls.__new__(cls)
+        state = dict(tags.__dict__)
+        indexed.tags = state.pop('tags')
+        indexed.__dict__.update(state)
+        return indexed
+
+    def tagged_in(self, directory):
+        """{basename: tag} of the tagged files in directory; don't modify it"""
+        # The files in / are indexed under '', like '/a'.rpartition('/')
+        return self._tags.by_dir.get(directory.rstrip('/'), {})
+
+
+def tagged_files(tags, directory):
+    """Yield (file, tag) for the tagged files shown in directory"""
+    tagged_in = getattr(tags, 'tagged_in', None)
+    if tagged_in is None or directory.flat:
+        for fobj in directory.files:
+            tag = tags.tags.get(fobj.realpath)
+            if tag is not None:
+                yield fobj, tag
+        return
+    tagged = tagged_in(directory.path)
+    real = os.path.realpath(directory.path)
+    if real != directory.path:
+        merged = dict(tagged_in(real))
+        merged.update(tagged)
+        tagged = merged
+    alltags = tags.tags
+    for fobj in directory.files:
+        if fobj.is_link:
+            tag = alltags.get(fobj.realpath)
+        else:
+            tag = tagged.get(fobj.basename)
+        if tag is not None:
+            yield fobj, tag
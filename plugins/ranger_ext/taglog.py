@@ -0,0 +1,257 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Tags stored in an append-only log
+
+Every change to a tag appends a record to the log instead of rewriting the
+whole tags file:
+
+    +<line of the tags file>     the path is tagged, e.g. "+a:/some/path"
+    -<path>                      the path is untagged
+
+The records are applied in order, so the last one for a path wins.
+sync() only reads what was appended since the last sync, which is how
+several ranger instances see each other's changes instead of overwriting
+them.  Only the records of paths that changed since the last dump() are
+appended, so a write costs as much as the change, not as the whole set.
+
+When the log holds many more records than tags, it is compacted: the
+current tags are written to a new file which replaces the log.  Appending
+takes a shared lock and compacting an exclusive one, so no record gets
+lost in the swap.  A record that was cut off by a crash is skipped.
+
+The classic tags file can still be imported and exported.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import fcntl
+import os
+from os.path import abspath, expanduser, realpath
+
+from ranger.container.tags import ALLOWED_KEYS
+
+from .tagindex import IndexedTags, _TagDict
+
+
+COMPACT_FACTOR = 2
+COMPACT_MIN_RECORDS = 10000
+READ_SIZE = 4 * 1024 * 1024
+
+
+def _encode(text):
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def _decode(data):
+    return data.decode('utf-8', 'surrogateescape')
+
+
+class _Locked(object):  # pylint: disable=too-few-public-methods
+    """A flock() on the lock file of the log, as a context manager"""
+
+    def __init__(self, filename, operation):
+        self.filename = filename
+        self.operation = operation
+        self._fobj = None
+
+    def __enter__(self):
+        self._fobj = open(self.filename, 'a')
+        fcntl.flock(self._fobj.fileno(), self.operation)
+        return self
+
+    def __exit__(self, *_):
+        fcntl.flock(self._fobj.fileno(), fcntl.LOCK_UN)
+        self._fobj.close()
+
+
+class LoggedTags(IndexedTags):
+    """IndexedTags that keep their changes in an append-only log"""
+
+    def __init__(self, filename):  # pylint: disable=super-init-not-called
+        self._filename = realpath(abspath(expanduser(filename)))
+        self._lockname = self._filename + '.lock'
+        self._inode = None
+        self._offset = 0
+        self.records = 0
+        self.tags = {}
+        self.sync()
+
+    @property
+    def tags(self):
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        old = self._tags
+        if not isinstance(value, _TagDict):
+            value = _TagDict(value)
+        value.changed = set()
+        if old is not None and old is not value:
+            # Whoever replaced the dict expects dump() to save the difference
+            value.changed.update(path for path, tag in old.items()
+                                 if value.get(path) != tag)
+            value.changed.update(path for path, tag in value.items()
+                                 if old.get(path) != tag)
+        self._tags = value
+
+    # -- reading
+
+    def _blocks(self, fobj):
+        """Yield the complete records after the offset, a block at a time
+
+        The offset and the record count move past every yielded block.
+        """
+        rest = b''
+        while True:
+            block = fobj.read(READ_SIZE)
+            if not block:
+                return
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            if end:
+                self._offset += end
+                lines = _decode(block[:end]).split('\n')
+                lines.pop()
+                self.records += len(lines)
+                yield lines
+
+    def _apply(self, lines, set_tag, drop_tag):
+        default_tag = self.default_tag
+        for line in lines:
+            if '\0' in line:
+                continue  # cut off by a crash
+            operation = line[:1]
+            if operation == '+':
+                if len(line) > 3 and line[2] == ':':
+                    if line[1] in ALLOWED_KEYS:
+                        set_tag(line[3:], line[1])
+                else:
+                    set_tag(line[1:], default_tag)
+            elif operation == '-':
+                drop_tag(line[1:])
+
+    def sync(self):
+        """Apply the records that were appended since the last sync"""
+        try:
+            fobj = open(self._filename, 'rb')
+        except (OSError, IOError):
+            return
+        with fobj:
+            fstat = os.fstat(fobj.fileno())
+            if fstat.st_ino != self._inode or fstat.st_size < self._offset:
+                # The log is new or was compacted, read it from the start
+                self._reload(fobj, fstat.st_ino)
+                return
+            if fstat.st_size == self._offset:
+                return
+            fobj.seek(self._offset)
+            for lines in self._blocks(fobj):
+                self._apply(lines, self._tags.load, self._tags.drop)
+
+    def _reload(self, fobj, inode):
+        result = {}
+        self._inode = inode
+        self._offset = 0
+        self.records = 0
+        for lines in self._blocks(fobj):
+            self._apply(lines, result.__setitem__,
+                        lambda path: result.pop(path, None))
+        old = self._tags
+        self._tags = None
+        self.tags = result
+        # Changes that weren't dumped yet still have to be saved
+        for path in old.changed or ():
+            if path in old:
+                self._tags[path] = old[path]
+            else:
+                self._tags.pop(path, None)
+
+    # -- writing
+
+    def _record(self, path):
+        tag = self._tags.get(path)
+        if tag is None:
+            return b'-' + _encode(path) + b'\n'
+        if tag == self.default_tag:
+            return b'+' + _encode(path) + b'\n'
+        return b'+' + _encode('%s:%s' % (tag, path)) + b'\n'
+
+    def dump(self):
+        """Append the records of the paths that changed since the last dump"""
+        changed = self._tags.changed
+        if not changed:
+            return
+        data = b''.join(self._record(path) for path in changed)
+        count = len(changed)
+        changed.clear()
+        try:
+            with _Locked(self._lockname, fcntl.LOCK_SH):
+                fd = os.open(self._filename, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+                try:
+                    fstat = os.fstat(fd)
+                    size = fstat.st_size
+                    # Turn a record cut off by a crash into an invalid line
+                    # instead of letting it swallow ours
+                    if size and os.pread(fd, 1, size - 1) != b'\n':
+                        data = b'\0\n' + data
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+        except OSError:
+            return
+        if size == self._offset and self._inode in (None, fstat.st_ino):
+            # Nobody else appended since the last sync, skip our records
+            self._inode = fstat.st_ino
+            self._offset += len(data)
+            self.records += count
+            unread = 0
+        else:
+            unread = count  # counted by the next sync
+        if self.records + unread > COMPACT_FACTOR * len(self._tags) + COMPACT_MIN_RECORDS:
+            self.compact()
+
+    def compact(self):
+        """Replace the log with one record per tag"""
+        tmpname = '%s.%d.tmp' % (self._filename, os.getpid())
+        try:
+            with _Locked(self._lockname, fcntl.LOCK_EX):
+                self.sync()
+                with open(tmpname, 'wb') as fobj:
+                    for path in self._tags:
+                        fobj.write(self._record(path))
+                    fobj.flush()
+                    os.fsync(fobj.fileno())
+                    size = fobj.tell()
+                os.rename(tmpname, self._filename)
+                self._inode = os.stat(self._filename).st_ino
+                self._offset = size
+                self.records = len(self._tags)
+                # The new log has every tag, including the undumped ones
+                self._tags.changed.clear()
+        except OSError:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+
+    # -- the classic format
+
+    def import_file(self, filename):
+        """Add the tags of a classic tags file; returns their number"""
+        with open(filename, 'r', errors='surrogateescape') as fobj:
+            imported = self._parse(fobj)
+        self.sync()
+        for path, tag in imported.items():
+            self._tags[path] = tag
+        self.dump()
+        return len(imported)
+
+    def export_file(self, filename):
+        """Write the tags in the classic format"""
+        self.sync()
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmpname, 'w', errors='surrogateescape') as fobj:
+            self._compile(fobj)
+        os.rename(tmpname, filename)
@@ -0,0 +1,475 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A trash following the freedesktop.org Trash specification
+
+Files are renamed into a trash on their own filesystem and never copied:
+the home trash in $XDG_DATA_HOME/Trash for files on the filesystem of that
+directory, otherwise $topdir/.Trash/$uid if the administrator created a
+sticky $topdir/.Trash, or $topdir/.Trash-$uid.  For every trashed file a
+.trashinfo file in info/ holds its original path and the deletion date.
+
+Trashing many files writes all their .trashinfo files first, reading each
+info/ directory once to pick free names, and then does the renames.  The
+sizes of trashed directories are kept in the directorysizes file of the
+trash, so that they are only summed up once.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import stat
+import threading
+import time
+
+from urllib.parse import quote, unquote_to_bytes
+
+import ranger.api
+from ranger.core.linemode import LinemodeBase
+from ranger.ext.human_readable import human_readable
+
+from .delete import DeleteLoader
+
+
+INFO_SUFFIX = '.trashinfo'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class TrashError(Exception):
+    pass
+
+
+def _encode(path):
+    return quote(os.fsencode(path), safe='/')
+
+
+def _decode(text):
+    return os.fsdecode(unquote_to_bytes(text))
+
+
+def tree_size(path):
+    """The size of the files below path, not following symlinks"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as dirents:
+                for dirent in dirents:
+                    try:
+                        if dirent.is_dir(follow_symlinks=False):
+                            stack.append(dirent.path)
+                        else:
+                            total += dirent.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+    return total
+
+
+class TrashItem(object):  # pylint: disable=too-few-public-methods
+    """A trashed file: its name in the trash, original path and date"""
+
+    __slots__ = ('trash', 'name', 'original', 'deleted')
+
+    def __init__(self, trash, name, original, deleted):
+        self.trash = trash
+        self.name = name
+        self.original = original
+        self.deleted = deleted
+
+    @property
+    def path(self):
+        return os.path.join(self.trash.files_dir, self.name)
+
+    @property
+    def info_path(self):
+        return os.path.join(self.trash.info_dir, self.name + INFO_SUFFIX)
+
+
+class TrashDir(object):
+    """One trash directory; topdir is None for the home trash
+
+    The original paths in a topdir trash are stored relative to topdir.
+    """
+
+    def __init__(self, path, topdir=None):
+        self.path = path
+        self.topdir = topdir
+        self.files_dir = os.path.join(path, 'files')
+        self.info_dir = os.path.join(path, 'info')
+        self.sizes_file = os.path.join(path, 'directorysizes')
+        self._lock = threading.Lock()
+
+    def __eq__(self, other):
+        return isinstance(other, TrashDir) and self.path == other.path
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def ensure(self):
+        for path in (self.path, self.files_dir, self.info_dir):
+            if not os.path.isdir(path):
+                os.makedirs(path, 0o700)
+
+    # -- .trashinfo files
+
+    def _stored_path(self, path):
+        if self.topdir is not None:
+            return os.path.relpath(path, self.topdir)
+        return path
+
+    def _original_path(self, stored):
+        if self.topdir is not None and not os.path.isabs(stored):
+            return os.path.join(self.topdir, stored)
+        return stored
+
+    def _reserve(self, path, taken, date):
+        """Create the .trashinfo file of path under a free name"""
+        base = os.path.basename(path.rstrip(os.sep)) or 'root'
+        content = '[Trash Info]\nPath=%s\nDeletionDate=%s\n' % (
+            _encode(self._stored_path(path)), date)
+        number = 1
+        name = base
+        while True:
+            if name not in taken:
+                info = os.path.join(self.info_dir, name + INFO_SUFFIX)
+                try:
+                    fd = os.open(info, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                except OSError:
+                    # Taken by another program since info/ was listed
+                    if not os.path.exists(info):
+                        raise
+                    fd = None
+                taken.add(name)
+                if fd is not None:
+                    try:
+                        os.write(fd, content.encode('utf-8'))
+                    finally:
+                        os.close(fd)
+                    return name
+            number += 1
+            name = '%s.%d' % (base, number)
+
+    def read_item(self, name):
+        """Return the TrashItem of a name in files/, or None"""
+        original = deleted = None
+        try:
+            with open(os.path.join(self.info_dir, name + INFO_SUFFIX), 'r') as fobj:
+                for line in fobj:
+                    key, _, value = line.strip().partition('=')
+                    if key == 'Path':
+                        original = self._original_path(_decode(value))
+                    elif key == 'DeletionDate':
+                        try:
+                            deleted = time.mktime(time.strptime(value, DATE_FORMAT))
+                        except ValueError:
+                            pass
+        except (OSError, IOError, UnicodeDecodeError):
+            return None
+        if original is None:
+            return None
+        return TrashItem(self, name, original, deleted)
+
+    def items(self):
+        """The trashed files that have a valid .trashinfo file"""
+        try:
+            names = os.listdir(self.files_dir)
+        except OSError:
+            return []
+        return [item for item in map(self.read_item, names) if item is not None]
+
+    # -- moving files in and out
+
+    def put(self, paths):
+        """Move paths into the trash; returns [(path, item)] and errors"""
+        self.ensure()
+        date = time.strftime(DATE_FORMAT)
+        taken = set(name[:-len(INFO_SUFFIX)] for name in os.listdir(self.info_dir)
+                    if name.endswith(INFO_SUFFIX))
+        taken.update(os.listdir(self.files_dir))
+        reserved = []
+        errors = []
+        for path in paths:
+            try:
+                reserved.append((path, self._reserve(path, taken, date)))
+            except OSError as err:
+                errors.append(err)
+        moved = []
+        for path, name in reserved:
+            item = TrashItem(self, name, path, time.time())
+            try:
+                os.rename(path, item.path)
+            except OSError as err:
+                errors.append(err)
+                _unlink(item.info_path)
+                continue
+            moved.append((path, item))
+        return moved, errors
+
+    def restore(self, item):
+        """Move a trashed file back to its original path"""
+        if os.path.lexists(item.original):
+            raise TrashError('%s already exists' % item.original)
+        parent = os.path.dirname(item.original)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        os.rename(item.path, item.original)
+        _unlink(item.info_path)
+
+    # -- directorysizes
+
+    def _read_sizes(self):
+        sizes = {}
+        try:
+            with open(self.sizes_file, 'r') as fobj:
+                for line in fobj:
+                    fields = line.rstrip('\n').split(' ', 2)
+                    if len(fields) == 3:
+                        sizes[_decode(fields[2])] = (int(fields[0]), int(fields[1]))
+        except (OSError, IOError, ValueError):
+            pass
+        return sizes
+
+    def _write_sizes(self, sizes):
+        tmpname = '%s.%d.tmp' % (self.sizes_file, os.getpid())
+        try:
+            with open(tmpname, 'w') as fobj:
+                for name, (size, mtime) in sorted(sizes.items()):
+                    fobj.write('%d %d %s\n' % (size, mtime, quote(os.fsencode(name), safe='')))
+            os.rename(tmpname, self.sizes_file)
+        except OSError:
+            _unlink(tmpname)
+
+    def directory_sizes(self):
+        """Return {name: size} for the trashed directories
+
+        Directories missing from the directorysizes file are summed up,
+        entries of directories that left the trash are dropped, and the
+        file is rewritten if anything changed.
+        """
+        with self._lock:
+            cached = self._read_sizes()
+            sizes = {}
+            changed = False
+            try:
+                dirents = list(os.scandir(self.files_dir))
+            except OSError:
+                return {}
+            for dirent in dirents:
+                try:
+                    if not dirent.is_dir(follow_symlinks=False):
+                        continue
+                    mtime = int(os.stat(os.path.join(
+                        self.info_dir, dirent.name + INFO_SUFFIX)).st_mtime)
+                except OSError:
+                    continue
+                entry = cached.get(dirent.name)
+                if entry is None or entry[1] != mtime:
+                    entry = (tree_size(dirent.path), mtime)
+                    changed = True
+                sizes[dirent.name] = entry
+            if changed or len(sizes) != len(cached):
+                self._write_sizes(sizes)
+            return dict((name, size) for name, (size, _) in sizes.items())
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def home_trash():
+    data_home = os.environ.get('XDG_DATA_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return TrashDir(os.path.join(data_home, 'Trash'))
+
+
+def _device(path):
+    """The device of path or of its closest existing parent"""
+    while True:
+        try:
+            return os.stat(path).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+
+
+def _topdir(path):
+    """The mount point of the filesystem that holds path"""
+    path = os.path.realpath(path)
+    dev = os.lstat(path).st_dev
+    while True:
+        parent = os.path.dirname(path)
+        if parent == path or os.lstat(parent).st_dev != dev:
+            return path
+        path = parent
+
+
+def _topdir_trash(topdir, create):
+    uid = str(os.getuid())
+    shared = os.path.join(topdir, '.Trash')
+    own = TrashDir(os.path.join(topdir, '.Trash-' + uid), topdir)
+    try:
+        shared_stat = os.lstat(shared)
+    except OSError:
+        shared_stat = None
+    # The spec requires a sticky, non-symlinked .Trash directory
+    if shared_stat is not None and stat.S_ISDIR(shared_stat.st_mode) and \
+            shared_stat.st_mode & stat.S_ISVTX:
+        trash = TrashDir(os.path.join(shared, uid), topdir)
+        if os.path.isdir(trash.path) and not create:
+            return trash
+        try:
+            if create:
+                trash.ensure()
+                return trash
+        except OSError:
+            pass
+    if create:
+        own.ensure()
+    return own
+
+
+def trash_for(path, home=None, create=True):
+    """Return the trash directory that path would be moved to
+
+    Unless create is set, a trash on another filesystem than the home
+    trash is not created if it doesn't exist yet.
+    """
+    home = home or home_trash()
+    dev = os.lstat(path).st_dev
+    if dev == _device(home.path):
+        return home
+    try:
+        return _topdir_trash(_topdir(os.path.dirname(os.path.abspath(path))),
+                             create)
+    except OSError:
+        raise TrashError('No trash on the filesystem of %s' % path)
+
+
+def trash_paths(paths):
+    """Move paths into their trashes; returns [(path, item)] and errors"""
+    home = home_trash()
+    by_trash = {}
+    errors = []
+    for path in paths:
+        path = os.path.abspath(path)
+        try:
+            by_trash.setdefault(trash_for(path, home), []).append(path)
+        except (OSError, TrashError) as err:
+            errors.append(err)
+    moved = []
+    for trash, group in by_trash.items():
+        try:
+            done, failed = trash.put(group)
+        except OSError as err:
+            errors.append(err)
+            continue
+        moved.extend(done)
+        errors.extend(failed)
+    return moved, errors
+
+
+def trash_of_directory(path):
+    """Return the TrashDir whose files/ directory is path, or None"""
+    path = os.path.abspath(path)
+    head, tail = os.path.split(path)
+    if tail != 'files' or not os.path.isdir(os.path.join(head, 'info')):
+        return None
+    home = home_trash()
+    if os.path.realpath(head) == os.path.realpath(home.path):
+        return home
+    topdir = _topdir(head)
+    return TrashDir(head, topdir)
+
+
+class TrashEmptyLoader(DeleteLoader):
+    """Delete trashed files in parallel, then their .trashinfo files"""
+
+    def __init__(self, items, workers=0):
+        self.items = items
+        DeleteLoader.__init__(self, [item.path for item in items], workers)
+        self.description = 'Emptying the trash (%d files)' % len(items)
+
+    def _finish(self):
+        if self._done:
+            return
+        for item in self.items:
+            if not os.path.lexists(item.path):
+                _unlink(item.info_path)
+                _ITEMS.pop(item.path, None)
+        for trash in set(item.trash for item in self.items):
+            trash.directory_sizes()
+        DeleteLoader._finish(self)
+
+
+# The TrashItems shown by the trash linemode and the directory sizes, by
+# path in files/; both are cleared when they reach CACHE_LIMIT entries
+CACHE_LIMIT = 100000
+_ITEMS = {}
+_SIZES = {}
+
+
+def forget(paths):
+    for path in paths:
+        _ITEMS.pop(path, None)
+
+
+def load_sizes(trash, on_done=None):
+    """Fill the directory sizes of the trash view in a background thread"""
+    def work():
+        sizes = trash.directory_sizes()
+        if len(_SIZES) + len(sizes) > CACHE_LIMIT:
+            _SIZES.clear()
+        _SIZES.update((os.path.join(trash.files_dir, name), size)
+                      for name, size in sizes.items())
+        if on_done is not None:
+            on_done()
+    thread = threading.Thread(target=work)
+    thread.daemon = True
+    thread.start()
+
+
+def _item_of(fobj):
+    try:
+        return _ITEMS[fobj.path]
+    except KeyError:
+        if len(_ITEMS) >= CACHE_LIMIT:
+            _ITEMS.clear()
+        trash = trash_of_directory(os.path.dirname(fobj.path))
+        item = _ITEMS[fobj.path] = trash.read_item(fobj.basename) \
+            if trash is not None else None
+        return item
+
+
+@ranger.api.register_linemode
+class TrashLinemode(LinemodeBase):
+    """Shows the original path and deletion date of trashed files"""
+
+    name = 'trash'
+
+    def filetitle(self, fobj, metadata):
+        item = _item_of(fobj)
+        if item is None:
+            return fobj.relative_path
+        return item.original
+
+    def infostring(self, fobj, metadata):
+        item = _item_of(fobj)
+        if fobj.is_directory and not fobj.is_link:
+            size = _SIZES.get(fobj.path)
+            size = '?' if size is None else human_readable(size)
+        else:
+            size = human_readable(fobj.size)
+        if item is None or item.deleted is None:
+            return size
+        return '%s  %s' % (size, time.strftime('%Y-%m-%d %H:%M',
+                                               time.localtime(item.deleted)))
@@ -0,0 +1,407 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A persistent trigram index of file contents used by `:grep'
+
+For every text file below a root the index knows its mtime and size and
+which three-byte sequences it contains.  A regex can only match a file
+that contains every trigram of the literal text the regex requires, so
+`:grep' skips the files whose index entry is current but lacks one of
+them.  Files that are not indexed, or have changed since, are always
+scanned.
+
+Building is incremental: files whose mtime and size didn't change are kept.
+A changed file gets a new id and its old postings are left behind as
+garbage, which is dropped when the index is rebuilt from scratch.  The
+index stops taking in files once its estimated size reaches the cap.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from array import array
+import hashlib
+import os
+import pickle
+import re
+import stat
+import threading
+import time
+
+
+BINARY_CHECK_BYTES = 8192
+MAX_FILE_SIZE = 16 * 1024 * 1024
+# The postings of a trigram are an array of 32-bit file ids.  An array
+# with its key and dict slot takes about 180 bytes on 64-bit CPython.
+BYTES_PER_POSTING = 4
+BYTES_PER_TRIGRAM = 180
+REGEX_SPECIAL = '.^$*+?{}[]()|\\'
+QUANTIFIERS = '*?{'
+REPEAT = re.compile(r'\{\d*(?:,\d*)?\}')
+OCTAL_DIGITS = '01234567'
+HEX_DIGITS = '0123456789abcdefABCDEF'
+# The escapes followed by a payload: its longest length and its characters.
+# \0 starts an octal escape and \1 to \99 are backreferences.
+ESCAPE_PAYLOADS = dict({'x': (2, HEX_DIGITS), 'u': (4, HEX_DIGITS),
+                        'U': (8, HEX_DIGITS), '0': (2, OCTAL_DIGITS)},
+                       **{str(digit): (1, '0123456789') for digit in range(1, 10)})
+# A file entry is (mtime, size, id); binary files have the id BINARY
+BINARY = -1
+
+
+def _escape_end(pattern, i):
+    """Return the index after the payload of the escape at pattern[i]
+
+    pattern[i] is the character after the backslash.
+    """
+    char = pattern[i]
+    i += 1
+    if char == 'N' and pattern.startswith('{', i):
+        end = pattern.find('}', i)
+        return len(pattern) if end < 0 else end + 1
+    if char in ESCAPE_PAYLOADS:
+        digits, alphabet = ESCAPE_PAYLOADS[char]
+        if char in OCTAL_DIGITS and len(pattern) >= i + 2 and \
+                all(c in OCTAL_DIGITS for c in pattern[i:i + 2]):
+            digits = 2  # three octal digits are an octal escape
+        while digits and i < len(pattern) and pattern[i] in alphabet:
+            i += 1
+            digits -= 1
+    return i
+
+
+def _class_end(pattern, i):
+    """Return the index after the character class that starts at pattern[i]
+
+    A "]" right after "[" or "[^" is a literal, and so is an escaped one.
+    """
+    i += 1
+    if pattern.startswith('^', i):
+        i += 1
+    if pattern.startswith(']', i):
+        i += 1
+    while i < len(pattern):
+        if pattern[i] == '\\':
+            i += 2
+        elif pattern[i] == ']':
+            return i + 1
+        else:
+            i += 1
+    return len(pattern)
+
+
+def required_literals(pattern):
+    """Return strings that every match of the regex must contain
+
+    This is conservative: a pattern with alternatives or inline flags
+    yields no literals, and so does everything inside groups and classes.
+    A run of literal text ends at every escape that isn't a plain escaped
+    character, such as \\x41 or a backreference, and at every quantifier,
+    which takes the character before it along.
+    """
+    if '|' in pattern or pattern.startswith('(?'):
+        return []
+    literals = []
+    run = []
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            if depth == 0 and not escaped.isalnum():
+                run.append(escaped)
+                i += 2
+                continue
+            i = _escape_end(pattern, i + 1)
+            literals.append(''.join(run))
+            run = []
+            continue
+        if char == '[':
+            i = _class_end(pattern, i)
+            literals.append(''.join(run))
+            run = []
+            continue
+        if char in QUANTIFIERS and run:
+            run.pop()  # the quantified character is optional
+        if char == '{':
+            repeat = REPEAT.match(pattern, i)
+            if repeat is not None:
+                i = repeat.end() - 1  # the body is not literal text
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        if char in REGEX_SPECIAL:
+            literals.append(''.join(run))
+            run = []
+        elif depth == 0:
+            run.append(char)
+        i += 1
+    literals.append(''.join(run))
+    return [literal for literal in literals if len(literal.encode('utf-8')) >= 3]
+
+
+def trigrams(data):
+    """Return the set of trigrams of a bytes-like object as integers"""
+    data = bytearray(data)
+    return set((data[i] << 16) | (data[i + 1] << 8) | data[i + 2]
+               for i in range(len(data) - 2))
+
+
+class TrigramIndex(object):
+    """The trigram index of one root directory, stored in a pickle file"""
+
+    def __init__(self, root, filename, max_size=None):
+        self.root = root
+        self.filename = filename
+        self.max_size = max_size
+        self.files = {}
+        self.postings = {}
+        self.next_id = 0
+        self.garbage = 0
+        self.built = None
+        self.truncated = False
+        self.building = False
+        self.dropped = False
+        self._lock = threading.Lock()
+        self.load()
+
+    # -- persistence
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as fobj:
+                state = pickle.load(fobj)
+        except (OSError, IOError, EOFError, ValueError, pickle.UnpicklingError):
+            return
+        if isinstance(state, dict) and state.get('root') == self.root:
+            self.files = state['files']
+            self.postings = {trigram: ids if isinstance(ids, array)
+                             else array('I', sorted(ids))
+                             for trigram, ids in state['postings'].items()}
+            self.next_id = state['next_id']
+            self.garbage = state['garbage']
+            self.built = state['built']
+            self.truncated = state['truncated']
+
+    def save(self):
+        with self._lock:
+            data = pickle.dumps({
+                'root': self.root, 'files': self.files,
+                'postings': self.postings, 'next_id': self.next_id,
+                'garbage': self.garbage, 'built': self.built,
+                'truncated': self.truncated,
+            }, pickle.HIGHEST_PROTOCOL)
+        tmpname = '%s.%d.tmp' % (self.filename, os.getpid())
+        try:
+            with open(tmpname, 'wb') as fobj:
+                fobj.write(data)
+            os.rename(tmpname, self.filename)
+        except OSError:
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+
+    def drop(self):
+        """Delete the index; a running build stops without saving"""
+        _INDEXES.pop(self.root, None)
+        self.dropped = True
+        with self._lock:
+            self.files = {}
+            self.postings = {}
+            self.next_id = 0
+            self.garbage = 0
+            self.built = None
+            self.truncated = False
+        try:
+            os.unlink(self.filename)
+        except OSError:
+            pass
+
+    # -- building
+
+    @property
+    def posting_count(self):
+        return sum(len(ids) for ids in self.postings.values())
+
+    @property
+    def estimated_size(self):
+        return self._size(self.posting_count, len(self.postings))
+
+    @staticmethod
+    def _size(postings, keys):
+        return postings * BYTES_PER_POSTING + keys * BYTES_PER_TRIGRAM
+
+    def build(self, on_finish=None):
+        """Update the index in a background thread"""
+        with self._lock:
+            if self.building:
+                return
+            self.building = True
+        thread = threading.Thread(target=self._build, args=(on_finish, ))
+        thread.daemon = True
+        thread.start()
+
+    def _build(self, on_finish):
+        try:
+            if self.garbage > len(self.files):
+                self._clear()
+            seen = set()
+            postings = self.posting_count
+            keys = len(self.postings)
+            truncated = False
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames.sort()
+                if self.dropped:
+                    return
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        fstat = os.lstat(path)
+                    except OSError:
+                        continue
+                    if not stat.S_ISREG(fstat.st_mode) or \
+                            fstat.st_size > MAX_FILE_SIZE:
+                        continue
+                    entry = self.files.get(path)
+                    if entry is not None and \
+                            entry[:2] == (fstat.st_mtime, fstat.st_size):
+                        seen.add(path)
+                        continue
+                    if self.max_size and \
+                            self._size(postings, keys) >= self.max_size:
+                        truncated = True
+                        continue
+                    postings += self._add(path, fstat, entry)
+                    keys = len(self.postings)
+                    seen.add(path)
+            with self._lock:
+                for path in set(self.files) - seen:
+                    if self.files.pop(path)[2] != BINARY:
+                        self.garbage += 1
+                self.built = time.time()
+                self.truncated = truncated
+            self.save()
+        finally:
+            self.building = False
+            if on_finish is not None and not self.dropped:
+                on_finish(self)
+
+    def _clear(self):
+        with self._lock:
+            self.files = {}
+            self.postings = {}
+            self.garbage = 0
+
+    def _add(self, path, fstat, old_entry):
+        try:
+            with open(path, 'rb') as fobj:
+                data = fobj.read()
+        except (OSError, IOError):
+            return 0
+        if b'\0' in data[:BINARY_CHECK_BYTES]:
+            found = None
+        else:
+            found = trigrams(data)
+        with self._lock:
+            if old_entry is not None and old_entry[2] != BINARY:
+                self.garbage += 1
+            if found is None:
+                self.files[path] = (fstat.st_mtime, fstat.st_size, BINARY)
+                return 0
+            file_id = self.next_id
+            self.next_id += 1
+            self.files[path] = (fstat.st_mtime, fstat.st_size, file_id)
+            postings = self.postings
+            for trigram in found:
+                ids = postings.get(trigram)
+                if ids is None:
+                    postings[trigram] = array('I', (file_id, ))
+                else:
+                    ids.append(file_id)
+        return len(found)
+
+    # -- queries
+
+    def filter_for(self, pattern):
+        """Return a function telling whether a file may contain a match
+
+        The function takes the path and stat of a file.  It returns False
+        only for files whose index entry is current and rules them out.
+        """
+        required = set()
+        for literal in required_literals(pattern):
+            required |= trigrams(literal.encode('utf-8'))
+        with self._lock:
+            files = dict(self.files)
+            if required:
+                lists = sorted((self.postings.get(trigram, ()) for trigram in required),
+                               key=len)
+                candidates = set(lists[0])
+                for ids in lists[1:]:
+                    candidates.intersection_update(ids)
+            else:
+                candidates = None
+
+        def may_match(path, fstat):
+            entry = files.get(path)
+            if entry is None or entry[:2] != (fstat.st_mtime, fstat.st_size):
+                return True
+            if entry[2] == BINARY:
+                return False
+            return candidates is None or entry[2] in candidates
+        return may_match
+
+    def describe(self):
+        built = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.built)) \
+            if self.built else 'never'
+        binary = sum(1 for entry in self.files.values() if entry[2] == BINARY)
+        return ('%s: %d files (%d binary), %d trigrams, ~%.1f MB, built %s%s%s'
+                % (self.root, len(self.files), binary, len(self.postings),
+                   self.estimated_size / 1e6, built,
+                   ', truncated at the size cap' if self.truncated else '',
+                   ', building' if self.building else ''))
+
+
+_INDEXES = {}
+
+
+def index_filename(directory, root):
+    digest = hashlib.sha1(root.encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(directory, digest)
+
+
+def get_trigram_index(directory, root, max_size=None, create=True):
+    """Return the index of root stored in directory, or None if there is none
+
+    Without `create', only an index that was built before is returned.
+    """
+    root = os.path.normpath(root)
+    try:
+        index = _INDEXES[root]
+    except KeyError:
+        filename = index_filename(directory, root)
+        if not create and not os.path.exists(filename):
+            return None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        index = _INDEXES[root] = TrigramIndex(root, filename, max_size)
+    if max_size is not None:
+        index.max_size = max_size
+    if not create and index.built is None and not index.building:
+        return None
+    return index
+
+
+def find_trigram_index(directory, path):
+    """Return the index of path or of the closest parent that has one"""
+    path = os.path.normpath(path)
+    while True:
+        index = get_trigram_index(directory, path, create=False)
+        if index is not None:
+            return index
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
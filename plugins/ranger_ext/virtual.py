@@ -0,0 +1,195 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""Stream files found by a background search into a directory listing
+
+The listing of the directory is replaced by the found files, shown with
+their path relative to the directory like in the flat view.  Leaving the
+directory ends the search and marks the directory as outdated, so that
+ranger lists its real content again the next time it is shown.
+
+While the listing is virtual, the directory's mtime is pinned so that
+ranger doesn't reload it.  If something reloads it anyway, the listing
+takes no more files and the search stops.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+from time import time
+
+from ranger.container.directory import mtimelevel
+from ranger.container.file import File
+from ranger.core.loader import Loadable
+from ranger.core.shared import FileManagerAware
+
+
+class VirtualListing(FileManagerAware):
+    """The listing of a directory, filled by publish() instead of load()"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._handler = None
+        self._accept = None
+        self._files_all = None
+        self.on_leave = None
+
+    def begin(self):
+        directory = self.directory
+        directory.files_all = self._files_all = []
+        directory.filenames = []
+        directory.files = []
+        directory.content_loaded = True
+        directory.pointed_obj = None
+        self._pin()
+        self._accept = self._visible_predicate()
+        self._handler = self.fm.signal_bind('cd', self._on_cd)
+
+    def _pin(self):
+        """Make the directory look current to load_content_if_outdated()"""
+        directory = self.directory
+        try:
+            if directory.flat:
+                directory.load_content_mtime = mtimelevel(directory.path, directory.flat)
+            else:
+                directory.load_content_mtime = os.stat(directory.path).st_mtime
+        except OSError:
+            pass
+        directory.content_outdated = False
+
+    @property
+    def replaced(self):
+        """Whether ranger has loaded the real content of the directory again"""
+        return self.directory.files_all is not self._files_all
+
+    def _visible_predicate(self):
+        """The part of Directory.refilter() that can be checked per file"""
+        directory = self.directory
+        settings = self.fm.settings
+        tests = []
+        if not settings.show_hidden and settings.hidden_filter:
+            hidden = re.compile(settings.hidden_filter).search
+            tests.append(lambda fobj: not any(
+                hidden(name) for name in fobj.relative_path.split(os.sep)))
+        if directory.filter:
+            tests.append(lambda fobj: directory.filter.search(fobj.basename))
+        if directory.temporary_filter:
+            tests.append(lambda fobj: directory.temporary_filter.search(fobj.basename))
+        tests.extend(directory.filter_stack)
+        return lambda fobj: all(test(fobj) for test in tests)
+
+    def make_file(self, path, stats=None, is_dir=False):
+        """Create the File or Directory object for a found path"""
+        rel_to = self.directory.path
+        if is_dir:
+            fobj = self.fm.get_directory(path, preload=stats, path_is_abs=True,
+                                         basename_is_rel_to=rel_to)
+        else:
+            fobj = File(path, preload=stats, path_is_abs=True,
+                        basename_is_rel_to=rel_to)
+        fobj.load()
+        return fobj
+
+    def publish(self, fobjs):
+        """Add files to the listing; only the visible ones are shown"""
+        directory = self.directory
+        if self.replaced:
+            self.close()
+            return
+        self._pin()
+        directory.files_all.extend(fobjs)
+        directory.filenames.extend(fobj.path for fobj in fobjs)
+        directory.files.extend(fobj for fobj in fobjs if self._accept(fobj))
+        directory.last_update_time = time()
+        if directory.files and not directory.pointed_obj:
+            directory.pointed_obj = directory.files[0]
+            directory.pointer = 0
+        self.fm.ui.need_redraw = True
+
+    def finish(self):
+        """Sort the listing and apply all filters once the search is done"""
+        if self.replaced:
+            self.close()
+            return
+        self.directory.sort()
+        self.fm.ui.need_redraw = True
+
+    def restore(self):
+        """Show the real content of the directory again"""
+        self.close()
+        self.directory.unload()
+        self.directory.load_content()
+
+    def close(self):
+        if self._handler is not None:
+            self.fm.signal_unbind(self._handler)
+            self._handler = None
+
+    def _on_cd(self, signal):
+        if signal.previous is self.directory:
+            self.close()
+            self.directory.content_outdated = True
+            if self.on_leave is not None:
+                self.on_leave()
+
+
+class StreamLoader(Loadable, FileManagerAware):
+    """Move the results of a ParallelWalker into a VirtualListing
+
+    to_file(entry) turns a walker entry into a File object, or returns None
+    to drop it.  on_finish(loader) is called when the walk is over.  With
+    max_entries, the walk stops once that many files were listed and
+    `truncated' is set.
+    """
+
+    progressbar_supported = False
+
+    def __init__(self, walker, listing, descr, to_file=None, on_finish=None,
+                 max_entries=None):
+        # pylint: disable=too-many-arguments
+        self.walker = walker
+        self.listing = listing
+        self.to_file = to_file or (lambda entry: listing.make_file(
+            entry.path, entry.stats, entry.is_dir))
+        self.on_finish = on_finish
+        self.max_entries = max_entries
+        self.truncated = False
+        self.started = time()
+        self.found = 0
+        Loadable.__init__(self, self.generate(), descr)
+
+    def generate(self):
+        walker = self.walker
+        while not walker.finished:
+            if self.listing.replaced:
+                walker.cancel()
+            batch = walker.get_batch()
+            if self.max_entries:
+                batch = batch[:max(self.max_entries - self.found, 0)]
+            if batch:
+                fobjs = [fobj for fobj in map(self.to_file, batch) if fobj is not None]
+                self.found += len(fobjs)
+                self.listing.publish(fobjs)
+                if self.max_entries and self.found >= self.max_entries:
+                    self.truncated = True
+                    walker.cancel()
+            yield
+        if self.truncated or not walker.cancelled:
+            self.listing.finish()
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def get_description(self):
+        walker = self.walker
+        return '%s (%d found, %d directories)' % (
+            self.description, self.found, walker.dirs_scanned + walker.dirs_cached)
+
+    def destroy(self):
+        self.walker.cancel()
+
+    def cancel(self):
+        """Stop the walk and remove this loader from the task list"""
+        self.walker.cancel()
+        if self in self.fm.loader.queue:
+            self.fm.loader.remove(item=self)
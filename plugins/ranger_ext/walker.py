@@ -0,0 +1,203 @@
+# This file is part of ranger, the console file manager.
+# License: GNU GPL version 3, see the file "AUTHORS" for details.
+
+"""A directory walker that lists a tree with a pool of threads
+
+Every worker takes a directory from a shared queue, lists it with
+os.scandir() and stats the entries.  It queues the subdirectories and
+appends the entries to a result buffer.  The UI thread takes the results
+out in batches with get_batch(), so nothing on the UI thread waits for
+the disk.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import deque
+import os
+import stat
+import threading
+
+
+class Entry(object):  # pylint: disable=too-few-public-methods
+    """A found file: its path, name, depth and (stat, lstat) or None"""
+
+    __slots__ = ('path', 'name', 'depth', 'stats', 'is_dir')
+
+    def __init__(self, path, name, depth, stats, is_dir):
+        self.path = path
+        self.name = name
+        self.depth = depth
+        self.stats = stats
+        self.is_dir = is_dir
+
+
+def _stats(dirent):
+    try:
+        lstat = dirent.stat(follow_symlinks=False)
+        if stat.S_ISLNK(lstat.st_mode):
+            return (os.stat(dirent.path), lstat)
+        return (lstat, lstat)
+    except OSError:
+        return None
+
+
+class ParallelWalker(object):
+    """Walk the tree below root with several threads
+
+    skip(name) excludes an entry and, for directories, everything below it.
+    accept(entry) decides which of the remaining entries are reported.
+    Directories deeper than max_depth are not entered (None for no limit).
+    Symlinked directories are entered if follow_links is set, but every
+    directory is entered at most once, which breaks symlink loops.
+    on_directory(path, entries) is called on a worker thread with the
+    entries of every directory that was listed.  cached(path, depth) may
+    return the entries of a directory instead, with the given depth, so
+    that it isn't listed; it returns None if it doesn't know them.
+    """
+
+    def __init__(self, root, workers=4, skip=None, accept=None,
+                 max_depth=None, follow_links=False, on_directory=None,
+                 cached=None):
+        # pylint: disable=too-many-arguments
+        self.root = root
+        self.workers = workers
+        self.skip = skip
+        self.accept = accept
+        self.max_depth = max_depth
+        self.follow_links = follow_links
+        self.on_directory = on_directory
+        self.cached = cached
+        self.dirs_scanned = 0
+        self.dirs_cached = 0
+        self.entries_found = 0
+        self.errors = 0
+        self._results = deque()
+        self._pending = deque()
+        self._seen = set()
+        self._active = 0
+        self._cond = threading.Condition()
+        self._cancelled = threading.Event()
+        self._threads = []
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        """Whether the walk is over and all results were taken out"""
+        with self._cond:
+            idle = not self._pending and not self._active
+        return (idle or self.cancelled) and not self._results
+
+    def start(self, directories=None):
+        """Start walking root, or the given (path, depth) pairs instead"""
+        try:
+            root_stat = os.stat(self.root)
+            self._seen.add((root_stat.st_dev, root_stat.st_ino))
+        except OSError:
+            pass
+        self._pending.extend(directories if directories is not None
+                             else [(self.root, 0)])
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def get_batch(self, max_items=1000, timeout=0.01):
+        """Take up to max_items results, waiting up to timeout for the first"""
+        if not self._results and timeout:
+            with self._cond:
+                if not self._results and (self._pending or self._active):
+                    self._cond.wait(timeout)
+        batch = []
+        results = self._results
+        while results and len(batch) < max_items:
+            batch.append(results.popleft())
+        return batch
+
+    def _next_directory(self):
+        with self._cond:
+            while not self._pending:
+                if not self._active or self.cancelled:
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait()
+            self._active += 1
+            return self._pending.pop()
+
+    def _work(self):
+        while not self.cancelled:
+            item = self._next_directory()
+            if item is None:
+                return
+            try:
+                self._scan(*item)
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def _enter(self, entry):
+        if not entry.is_dir or entry.stats is None:
+            return False
+        if self.max_depth is not None and entry.depth >= self.max_depth:
+            return False
+        if not self.follow_links and entry.stats[0] is not entry.stats[1]:
+            return False
+        key = (entry.stats[0].st_dev, entry.stats[0].st_ino)
+        with self._cond:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+        return True
+
+    def _list(self, path, depth):
+        try:
+            dirents = list(os.scandir(path))
+        except OSError:
+            self.errors += 1
+            return None
+        entries = []
+        for dirent in dirents:
+            if self.cancelled:
+                return None
+            if self.skip is not None and self.skip(dirent.name):
+                continue
+            stats = _stats(dirent)
+            is_dir = stats is not None and stat.S_ISDIR(stats[0].st_mode)
+            entries.append(Entry(dirent.path, dirent.name, depth + 1, stats, is_dir))
+        if self.on_directory is not None:
+            self.on_directory(path, entries)
+        self.dirs_scanned += 1
+        return entries
+
+    def _scan(self, path, depth):
+        entries = None
+        if self.cached is not None:
+            entries = self.cached(path, depth + 1)
+        if entries is not None:
+            self.dirs_cached += 1
+        else:
+            entries = self._list(path, depth)
+            if entries is None:
+                return
+        found = []
+        subdirs = []
+        for entry in entries:
+            if self._enter(entry):
+                subdirs.append((entry.path, entry.depth))
+            if self.accept is None or self.accept(entry):
+                found.append(entry)
+        with self._cond:
+            self._results.extend(found)
+            self.entries_found += len(found)
+            self._pending.extend(subdirs)
+            self._cond.notify_all()
@@ -0,0 +1,115 @@
+"""Benchmark of :grep against the old "grep -r" subprocess on a synthetic tree
+
+Builds a tree of text files, 1 GB by default, in a temporary directory and
+times both with a warm page cache, until every hit is found.  The old
+command piped grep's output into a pager, so its time is grep's run time.
+
+Run from the config directory: python tests/bench_grep.py [megabytes]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import multiprocessing
+import os
+import random
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.ranger_ext.grep import (  # noqa: E402 pylint: disable=wrong-import-position
+    CHUNK_BYTES, CHUNK_FILES, grep_files, worker_pool)
+from plugins.ranger_ext.walker import (  # noqa: E402 pylint: disable=wrong-import-position
+    ParallelWalker)
+
+
+FILE_SIZE = 256 * 1024
+FILES_PER_DIR = 100
+PATTERN = 'needle[0-9]+'
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'return', 'self', 'value', 'index',
+         'def', 'class', 'import', 'for', 'in', 'if', 'else', '=', '(', ')']
+
+
+def make_tree(root, megabytes):
+    rng = random.Random(0)
+    blocks = []
+    for _ in range(16):
+        lines = []
+        size = 0
+        while size < FILE_SIZE:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(2, 12))]
+            if rng.random() < 0.001:
+                words.append('needle%d' % rng.randint(0, 99))
+            line = ' '.join(words) + '\n'
+            lines.append(line)
+            size += len(line)
+        blocks.append(''.join(lines).encode())
+    for i in range(megabytes * 1024 * 1024 // FILE_SIZE):
+        directory = os.path.join(root, 'dir%03d' % (i // FILES_PER_DIR))
+        if not i % FILES_PER_DIR:
+            os.mkdir(directory)
+        with open(os.path.join(directory, 'file%05d.txt' % i), 'wb') as fobj:
+            fobj.write(blocks[i % len(blocks)])
+
+
+def grep_subprocess(root):
+    output = subprocess.check_output(
+        ['grep', '--line-number', '-e', PATTERN.replace('+', '\\+'), '-r', root])
+    return output.count(b'\n')
+
+
+def grep_engine(root, pool):
+    """What GrepSearch does, without the listing and the UI"""
+    walker = ParallelWalker(root, follow_links=False, accept=lambda entry: (
+        entry.stats is not None and stat.S_ISREG(entry.stats[0].st_mode))).start()
+    pending = []
+    chunk = []
+    chunk_bytes = 0
+    pattern = PATTERN.encode()
+    while not walker.finished:
+        for entry in walker.get_batch():
+            chunk.append(entry.path)
+            chunk_bytes += entry.stats[0].st_size
+            if len(chunk) >= CHUNK_FILES or chunk_bytes >= CHUNK_BYTES:
+                pending.append(pool.apply_async(grep_files, (pattern, 0, chunk)))
+                chunk = []
+                chunk_bytes = 0
+    if chunk:
+        pending.append(pool.apply_async(grep_files, (pattern, 0, chunk)))
+    return sum(len(hits) for result in pending for _, hits in result.get()[0])
+
+
+def best_of(function, repeat=3):
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        times.append(time.time() - started)
+    return min(times)
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    root = tempfile.mkdtemp(prefix='bench_grep')
+    try:
+        make_tree(root, megabytes)
+        pool = worker_pool(multiprocessing.cpu_count())
+        hits = grep_subprocess(root)
+        assert grep_engine(root, pool) == hits
+        print('%d MB in %d files, %d hits, %d CPUs' % (
+            megabytes, megabytes * 1024 * 1024 // FILE_SIZE, hits,
+            multiprocessing.cpu_count()))
+        for name, function in [('grep -r', lambda: grep_subprocess(root)),
+                               (':grep', lambda: grep_engine(root, pool))]:
+            seconds = best_of(function)
+            print('%-8s %6.2f s %7.0f MB/s' % (name, seconds, megabytes / seconds))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
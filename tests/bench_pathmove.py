@@ -0,0 +1,97 @@
+"""Benchmark of moving 100k tags when directories are renamed
+
+Run from the config directory: python tests/bench_pathmove.py
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranger.container.tags import Tags  # noqa: E402 pylint: disable=wrong-import-position
+
+from plugins.ranger_ext.pathmove import (  # noqa: E402 pylint: disable=wrong-import-position
+    PathMapper, move_tags)
+
+
+PATHS = 100000
+PER_DIRECTORY = 100
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        times.append(time.time() - started)
+    return min(times)
+
+
+def main():
+    # Half of the tags are below /bench/moved, the rest below its sibling
+    # /bench/movedness, which shares the prefix but must stay
+    tagdict = {}
+    for i in range(PATHS):
+        top = '/bench/moved' if i % 2 else '/bench/movedness'
+        tagdict['%s/dir%04d/sub/file%06d' % (top, i // PER_DIRECTORY, i)] = '*'
+    pairs = [('/bench/moved', '/bench/renamed')]
+    with tempfile.NamedTemporaryFile() as tagfile:
+        tags = Tags(tagfile.name)
+
+        def mapping():
+            mapper = PathMapper(pairs)
+            return [mapper(path) for path in tagdict]
+
+        def moving():
+            tags.tags = dict(tagdict)
+            tags.dump()
+            started = time.time()
+            moved = move_tags(tags, PathMapper(pairs))
+            return moved, time.time() - started
+
+        def prefix_scan():
+            prefix = pairs[0][0] + '/'
+            return [path.replace(pairs[0][0], pairs[0][1], 1)
+                    if path.startswith(prefix) else None for path in tagdict]
+
+        # A bulk rename of every directory below /bench/moved
+        many = [('/bench/moved/dir%04d' % i, '/bench/moved/new%04d' % i)
+                for i in range(PATHS // PER_DIRECTORY)]
+
+        def many_mapping():
+            mapper = PathMapper(many)
+            return [mapper(path) for path in tagdict]
+
+        def many_prefix_scan():
+            result = []
+            for path in tagdict:
+                for old, new in many:
+                    if path.startswith(old + '/'):
+                        result.append(new + path[len(old):])
+                        break
+                else:
+                    result.append(None)
+            return result
+
+        assert mapping() == prefix_scan()
+        assert many_mapping() == many_prefix_scan()
+        assert moving()[0] == PATHS // 2
+        print('%d tagged paths in %d directories, %d of them moved'
+              % (PATHS, PATHS // PER_DIRECTORY, PATHS // 2))
+        rows = (
+            ('PathMapper, one moved dir:', best_of(mapping)),
+            ('prefix scan, one moved dir:', best_of(prefix_scan)),
+            ('PathMapper, %d moved dirs:' % len(many), best_of(many_mapping)),
+            ('prefix scan, %d moved dirs:' % len(many), best_of(many_prefix_scan, 1)),
+            ('move_tags, reading and writing:', min(moving()[1] for _ in range(5))),
+        )
+        for label, seconds in rows:
+            print('%-32s %7.1f ms' % (label, seconds * 1000))
+
+
+if __name__ == '__main__':
+    main()
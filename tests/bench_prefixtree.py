@@ -0,0 +1,63 @@
+"""Benchmark of the bookmark part of the `cd' tab completion
+
+Compares the prefix tree with the old scan of every bookmark for every
+candidate, for a growing number of bookmarks and 2000 candidates.
+
+Run from the config directory: python tests/bench_prefixtree.py
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.ranger_ext.prefixtree import (  # noqa: E402 pylint: disable=wrong-import-position
+    PathPrefixTree)
+
+
+CANDIDATES = 2000
+BOOKMARK_COUNTS = (10, 100, 300, 1000, 3000)
+BASE = '/home/user'
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        times.append(time.time() - started)
+    return min(times)
+
+
+def main():
+    rng = random.Random(0)
+    candidates = ['dir%04d' % i for i in range(CANDIDATES)]
+    print('%9s %12s %12s %12s' % ('bookmarks', 'scan', 'tree', 'tree build'))
+    for count in BOOKMARK_COUNTS:
+        bookmarks = [os.path.join(BASE, rng.choice(candidates), 'sub%d' % i)
+                     for i in range(count)]
+
+        def scan():
+            return [os.path.relpath(bookmark, BASE)
+                    for bookmark in bookmarks for path in candidates
+                    if bookmark.startswith(os.path.join(BASE, path) + os.sep)]
+
+        tree = PathPrefixTree(bookmarks)
+
+        def lookup():
+            return [os.path.relpath(bookmark, BASE)
+                    for path in candidates
+                    for bookmark in tree.below(os.path.join(BASE, path))]
+
+        assert sorted(scan()) == sorted(lookup())
+        print('%9d %10.2f ms %10.2f ms %10.2f ms' % (
+            count, best_of(scan) * 1000, best_of(lookup) * 1000,
+            best_of(lambda: PathPrefixTree(bookmarks)) * 1000))
+
+
+if __name__ == '__main__':
+    main()
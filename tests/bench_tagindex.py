@@ -0,0 +1,73 @@
+"""Benchmark of tagged_files() for a directory of 100k entries, 1% tagged
+
+Run from the config directory: python tests/bench_tagindex.py
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranger.container.file import File  # noqa: E402 pylint: disable=wrong-import-position
+
+from plugins.ranger_ext.tagindex import (  # noqa: E402 pylint: disable=wrong-import-position
+    IndexedTags, tagged_files)
+
+
+ENTRIES = 100000
+OTHER_TAGS = 200000
+
+
+class Directory(object):  # pylint: disable=too-few-public-methods
+    flat = 0
+
+    def __init__(self, path, names):
+        self.path = path
+        self.files = [File(os.path.join(path, name)) for name in names]
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        function()
+        times.append(time.time() - started)
+    return min(times)
+
+
+def main():
+    names = ['file%06d' % i for i in range(ENTRIES)]
+    path = '/bench/dir'
+    tagdict = {'/bench/other/%d' % i: '*' for i in range(OTHER_TAGS)}
+    tagdict.update((path + '/' + name, '*') for name in names[::100])
+    with tempfile.NamedTemporaryFile() as tagfile:
+        tags = IndexedTags(tagfile.name)
+        tags.tags.update(tagdict)
+    directory = Directory(path, names)
+
+    def indexed():
+        return list(tagged_files(tags, directory))
+
+    def by_realpath():
+        return [(f, tags.tags[f.realpath]) for f in directory.files
+                if f.realpath in tags.tags]
+
+    def by_realpath_syscall():
+        return [(f, tags.tags[os.path.realpath(f.path)]) for f in directory.files
+                if os.path.realpath(f.path) in tags.tags]
+
+    assert len(indexed()) == len(by_realpath()) == ENTRIES // 100
+    print('%d entries, %d tagged, %d tags in total'
+          % (ENTRIES, ENTRIES // 100, len(tagdict)))
+    print('indexed lookup:                 %6.1f ms' % (best_of(indexed) * 1000))
+    print('realpath loop:                  %6.1f ms' % (best_of(by_realpath) * 1000))
+    print('realpath loop, resolving paths: %6.1f ms'
+          % (best_of(by_realpath_syscall, 1) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import sys
+
+# Make the config directory importable as it is from within ranger
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import time
+
+from plugins.ranger_ext import clipboard
+from plugins.ranger_ext.clipboard import (
+    ClipboardWriter, clipboard_commands, detect)
+
+
+def test_write_pipes_text_into_every_command(tmpdir):
+    first, second = tmpdir.join('first'), tmpdir.join('second')
+    writer = ClipboardWriter()
+    writer.write([['tee', str(first)], ['tee', str(second)]], u'caf\xe9\n')
+    assert writer.flush(5)
+    assert first.read_binary() == second.read_binary() == u'caf\xe9\n'.encode('utf-8')
+    assert writer.take_error() is None
+
+
+def test_texts_queued_while_busy_are_coalesced(tmpdir):
+    log = tmpdir.join('log')
+    writer = ClipboardWriter()
+    started = tmpdir.join('started')
+    writer.write([['sh', '-c', 'touch "$1"; sleep 0.3; cat >> "$0"',
+                   str(log), str(started)]], 'first\n')
+    deadline = time.time() + 5
+    while not started.check() and time.time() < deadline:
+        time.sleep(0.01)
+    for text in ('second\n', 'third\n', 'fourth\n'):
+        writer.write([['tee', '-a', str(log)]], text)
+    assert writer.flush(5)
+    assert log.read() == 'first\nfourth\n'
+
+
+def test_flush_times_out():
+    writer = ClipboardWriter()
+    writer.write([['sh', '-c', 'sleep 0.5; cat > /dev/null']], 'text')
+    assert not writer.flush(0.05)
+    assert writer.flush(5)
+
+
+def test_errors_are_kept_until_taken(tmpdir):
+    writer = ClipboardWriter()
+    writer.write([[str(tmpdir.join('missing'))]], 'text')
+    assert writer.flush(5)
+    assert isinstance(writer.take_error(), OSError)
+    assert writer.take_error() is None
+    writer.write([['tee', str(tmpdir.join('file'))]], 'text')
+    assert writer.flush(5)
+    assert writer.take_error() is None
+
+
+def _tool(directory, name):
+    path = directory.join(name)
+    path.write('#!/bin/sh\ncat > /dev/null\n')
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_detect_follows_path(tmpdir, monkeypatch):
+    monkeypatch.setattr(clipboard, '_DETECTED', {})
+    first, second = tmpdir.mkdir('first'), tmpdir.mkdir('second')
+    monkeypatch.setenv('PATH', os.pathsep.join([str(first), str(second)]))
+    assert detect() == []
+    xclip = _tool(second, 'xclip')
+    _tool(first, 'xsel')
+    first.join('pbcopy').write('not executable')
+    assert detect() == [[xclip], [xclip, '-selection', 'clipboard']]
+    # Cached until a directory on $PATH changes
+    assert detect() is detect()
+    wl_copy = _tool(first, 'wl-copy')
+    os.utime(str(first), ns=(0, 1))
+    assert detect() == [[wl_copy]]
+    monkeypatch.setenv('PATH', str(second))
+    assert detect() == [[xclip], [xclip, '-selection', 'clipboard']]
+
+
+def test_setting_overrides_detection(tmpdir, monkeypatch):
+    monkeypatch.setattr(clipboard, '_DETECTED', {})
+    monkeypatch.setenv('PATH', str(tmpdir))
+    _tool(tmpdir, 'pbcopy')
+    assert clipboard_commands('tee "a file"') == [['tee', 'a file']]
+    assert clipboard_commands('auto') == [[str(tmpdir.join('pbcopy'))]]
+    assert clipboard_commands() == clipboard_commands('auto')
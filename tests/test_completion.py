@@ -0,0 +1,70 @@
+from __future__ import (absolute_import, division, print_function)
+
+import threading
+import time
+
+from plugins.ranger_ext.completion import Completion
+
+
+def test_finished_scan_returns_everything(tmpdir):
+    for name in ('b', 'a', 'c'):
+        tmpdir.mkdir(name)
+    tmpdir.join('file').write('')
+    completion = Completion()
+    results = completion.collect(iter(sorted(completion.subdirs(str(tmpdir)))), 5)
+    assert results == ['a', 'b', 'c']
+    assert completion.finished and not completion.partial
+
+
+def test_budget_returns_partial_results():
+    release = threading.Event()
+
+    def generate():
+        yield 'first'
+        yield 'second'
+        release.wait(5)
+        yield 'late'
+
+    completion = Completion()
+    started = time.time()
+    assert completion.collect(generate(), 0.1) == ['first', 'second']
+    assert time.time() - started < 2
+    assert completion.partial
+    release.set()
+
+
+def test_next_completion_cancels_the_running_scan(tmpdir):
+    tmpdir.mkdir('sub')
+    release = threading.Event()
+    done = threading.Event()
+    scanned = []
+
+    def generate(completion):
+        try:
+            release.wait(5)
+            scanned.append(completion.subdirs(str(tmpdir)))
+            yield 'never'
+        finally:
+            done.set()
+
+    first = Completion()
+    assert first.collect(generate(first), 0.05) == []
+    second = Completion()
+    assert second.collect(iter(['x']), 5) == ['x']
+    release.set()
+    assert done.wait(5)
+    assert scanned == [] and not first.finished
+
+
+def test_max_dirs_stops_the_scan(tmpdir):
+    tmpdir.mkdir('a').mkdir('b').mkdir('c')
+
+    def walk(completion, path):
+        for name in completion.subdirs(path):
+            yield name
+            for found in walk(completion, path + '/' + name):
+                yield found
+
+    completion = Completion(max_dirs=2)
+    assert completion.collect(walk(completion, str(tmpdir)), 5) == ['a', 'b']
+    assert completion.partial and completion.dirs_scanned == 2
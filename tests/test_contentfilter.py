@@ -0,0 +1,47 @@
+from __future__ import (absolute_import, division, print_function)
+
+import re
+
+from plugins.ranger_ext import contentfilter
+from plugins.ranger_ext.contentfilter import search_first_line, search_head
+
+
+def test_search_head_of_small_and_large_files(tmpdir, monkeypatch):
+    mapped = []
+    real_mmap = contentfilter.mmap.mmap
+    monkeypatch.setattr(contentfilter.mmap, 'mmap',
+                        lambda *args, **kwargs: mapped.append(args) or
+                        real_mmap(*args, **kwargs))
+    small = tmpdir.join('small')
+    small.write_binary(b'x' * 100 + b'needle')
+    large = tmpdir.join('large')
+    large.write_binary(b'x' * 100 + b'needle' + b'x' * contentfilter.MMAP_THRESHOLD)
+    regex = re.compile(b'needle')
+
+    # A large limit doesn't map a small file, a small one still maps a large file
+    assert search_head(str(small), regex, 1 << 20)
+    assert not mapped
+    assert search_head(str(large), regex, 200)
+    assert len(mapped) == 1
+    assert not search_head(str(large), regex, 100)
+    assert not search_head(str(small), regex, 100)
+
+
+def test_search_first_line(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'#!/bin/sh\nneedle\n')
+    assert search_first_line(str(path), re.compile(b'^#!.*sh$'), 1000)
+    assert not search_first_line(str(path), re.compile(b'needle'), 1000)
+    assert not search_first_line(str(path), re.compile(b'sh'), 5)
+
+
+def test_verdicts_are_bounded(monkeypatch):
+    monkeypatch.setattr(contentfilter, 'CACHE_LIMIT', 3)
+    reader = contentfilter.ContentReader()
+    for i in range(5):
+        reader.submit('key', i, '/path%d' % i, lambda path: True, 1)
+        while reader.pending('key'):
+            reader.wait(0.01)
+    assert reader.stored <= 3
+    assert reader.verdict('key', 4) is True
+    assert reader.verdict('key', 0) is None
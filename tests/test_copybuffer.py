@@ -0,0 +1,47 @@
+from __future__ import (absolute_import, division, print_function)
+
+import time
+
+from ranger.container.file import File
+
+from plugins.ranger_ext.column import ColumnView
+from plugins.ranger_ext.copybuffer import CopyBuffer
+
+
+class Column(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, files, scroll_begin, hei):
+        self.target = type('Target', (object, ), {'files': files})()
+        self.scroll_begin = scroll_begin
+        self.hei = hei
+
+
+def test_paths_and_files():
+    buffer = CopyBuffer(['/a/b', '/a/c', '/d'])
+    assert len(buffer) == 3
+    assert sorted(buffer.paths()) == ['/a/b', '/a/c', '/d']
+    assert sorted(f.path for f in buffer) == ['/a/b', '/a/c', '/d']
+    assert '/a/b' in buffer and File('/d') in buffer
+    buffer.discard('/a/b')
+    assert '/a/b' not in buffer and len(buffer) == 2
+
+
+def test_the_column_view_lists_only_visible_copied_files():
+    files = [File('/dir/%d' % i) for i in range(100)]
+    buffer = CopyBuffer(['/dir/%d' % i for i in range(0, 100, 2)] + ['/other'])
+    fm = type('FM', (object, ), {'copy_buffer': buffer, 'other': 1})()
+    view = ColumnView(fm, Column(files, 10, 5))
+    assert [f.path for f in view.copy_buffer] == ['/dir/10', '/dir/12', '/dir/14']
+    assert view.other == 1
+    # The buffer itself stays complete
+    assert len(list(buffer)) == 51
+
+
+def test_drawing_does_not_depend_on_the_buffer_size():
+    files = [File('/dir/%d' % i) for i in range(50)]
+    buffer = CopyBuffer(['/big/%d' % i for i in range(200000)])
+    fm = type('FM', (object, ), {'copy_buffer': buffer})()
+    view = ColumnView(fm, Column(files, 0, 50))
+    started = time.time()
+    for _ in range(100):
+        assert view.copy_buffer == []
+    assert time.time() - started < 1.0
@@ -0,0 +1,64 @@
+from __future__ import (absolute_import, division, print_function)
+
+import socket
+import time
+
+from plugins.ranger_ext import copyshare
+from plugins.ranger_ext.copybuffer import CopyBuffer, CopyBufferLog
+from plugins.ranger_ext.copyshare import CopyBufferLink, _Peer
+
+
+def wait(condition, seconds=5):
+    end = time.time() + seconds
+    while time.time() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_names_with_newlines_are_shared_as_they_are(tmpdir):
+    path = str(tmpdir.join('socket'))
+    buffers = [CopyBuffer(), CopyBuffer()]
+    links = [CopyBufferLink(buf, path).start() for buf in buffers]
+    try:
+        assert wait(lambda: links[1].peers == 1)
+        names = ['/d/a\n\nb', '/d/c\n=/etc', '/d/e\n!', '/d\n/f', '/d/g\n']
+        buffers[1].update(names)
+        buffers[1].add('/d/last')
+        assert wait(lambda: '/d/last' in buffers[0])
+        assert sorted(buffers[0].paths()) == sorted(names + ['/d/last'])
+        buffers[0].discard('/d/c\n=/etc')
+        assert wait(lambda: '/d/c\n=/etc' not in buffers[1])
+        assert len(buffers[1]) == len(names)
+    finally:
+        for link in links:
+            link.close()
+
+
+def test_names_with_newlines_survive_the_log(tmpdir):
+    log = CopyBufferLog(str(tmpdir.join('log')))
+    buf = CopyBuffer(log=log)
+    names = ['/d/a\nb', '/d/c\n=/etc', '/d\n/e']
+    buf.update(names)
+    buf.discard('/d/a\nb')
+    for _ in range(2):
+        restored = CopyBuffer()
+        restored.load(log.load())
+        assert sorted(restored.paths()) == sorted(names[1:])
+        log.compact()
+
+
+def test_full_outbox_drops_the_connection(monkeypatch):
+    monkeypatch.setattr(copyshare, 'MAX_OUTBOX', 10)
+    left, right = socket.socketpair()
+    try:
+        peer = _Peer(left)
+        peer.queue(b'x' * 10)
+        assert len(peer.outbox) == 10
+        peer.queue(b'y')
+        assert not peer.outbox
+        assert right.recv(10) == b''  # the other side sees the end
+    finally:
+        left.close()
+        right.close()
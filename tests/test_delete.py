@@ -0,0 +1,200 @@
+from __future__ import (absolute_import, division, print_function)
+
+import errno
+import os
+import time
+
+import pytest
+
+from ranger.container.file import File
+from ranger.container.tags import Tags
+from ranger.core.shared import FileManagerAware, SettingsAware
+from ranger.ext.human_readable import human_readable
+
+from plugins.ranger_ext import delete
+from plugins.ranger_ext.copybuffer import CopyBuffer
+from plugins.ranger_ext.delete import DeleteLoader, SelectionScan, TreeDeleter
+
+
+def make_tree(root, dirs=4, depth=3, files=5):
+    """Create a tree; returns the number of files and directories in it"""
+    count = [0, 0]
+
+    def fill(directory, level):
+        for i in range(files):
+            directory.join('file%d' % i).write('x' * i)
+            count[0] += 1
+        if level < depth:
+            for i in range(dirs):
+                fill(directory.mkdir('dir%d' % i), level + 1)
+                count[1] += 1
+
+    fill(root, 1)
+    return count
+
+
+def run(deleter, timeout=10):
+    deleter.start()
+    deadline = time.time() + timeout
+    while not deleter.finished and time.time() < deadline:
+        deleter.wait(0.05)
+    assert deleter.finished
+    return deleter
+
+
+def test_delete_trees_with_several_workers(tmpdir):
+    files, dirs = make_tree(tmpdir.mkdir('tree'))
+    single = tmpdir.join('single')
+    single.write('xyz')
+    deleter = run(TreeDeleter([str(tmpdir.join('tree')), str(single)], workers=4))
+    assert tmpdir.listdir() == []
+    assert deleter.errors == []
+    assert deleter.files_removed == files + 1
+    assert deleter.dirs_removed == dirs + 1
+    assert deleter.bytes_freed == 10 * (files // 5) + 3
+
+
+def test_cancel_leaves_intact_trees(tmpdir, monkeypatch):
+    files, _ = make_tree(tmpdir.mkdir('tree'))
+    unlink = os.unlink
+
+    def slow_unlink(path):
+        time.sleep(0.005)
+        unlink(path)
+
+    monkeypatch.setattr(os, 'unlink', slow_unlink)
+    deleter = TreeDeleter([str(tmpdir.join('tree'))], workers=2).start()
+    time.sleep(0.05)
+    deleter.cancel()
+    run(deleter)
+    assert deleter.cancelled
+    assert 0 < deleter.files_removed < files
+    # Only emptied directories are gone, so every file left has its parent
+    for root, _, names in os.walk(str(tmpdir)):
+        for name in names:
+            assert os.path.isfile(os.path.join(root, name))
+    assert tmpdir.join('tree').check(dir=True)
+
+
+def test_unreadable_subtree_is_kept(tmpdir, monkeypatch):
+    make_tree(tmpdir.mkdir('tree'))
+    locked = str(tmpdir.join('tree', 'dir1', 'dir2'))
+    scandir = os.scandir
+
+    def denying_scandir(path):
+        if path == locked:
+            raise OSError(errno.EACCES, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', denying_scandir)
+    deleter = run(TreeDeleter([str(tmpdir.join('tree'))], workers=3))
+    assert len(deleter.errors) == 1 and deleter.errors[0].filename == locked
+    # The locked directory and its parents stay, everything else is gone
+    assert sorted(os.listdir(str(tmpdir.join('tree')))) == ['dir1']
+    assert sorted(os.listdir(str(tmpdir.join('tree', 'dir1')))) == ['dir2']
+    assert len(os.listdir(locked)) == 5
+
+
+class FM(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, tags, copy_buffer):
+        self.tags = tags
+        self.copy_buffer = copy_buffer
+        self.thistab = type('Tab', (object, ), {
+            'ensure_correct_pointer': lambda self: None})()
+        self.ui = type('UI', (object, ), {'need_redraw': False})()
+        self.notices = []
+
+    def notify(self, text, bad=False):
+        self.notices.append((text, bad))
+
+
+def test_delete_loader_forgets_deleted_files(tmpdir, monkeypatch):
+    tree = tmpdir.mkdir('tree')
+    make_tree(tree, dirs=2, depth=2)
+    kept = tmpdir.join('kept')
+    kept.write('')
+    tags = Tags(str(tmpdir.join('tagged')))
+    tags.tags.update({str(tree.join('dir0', 'file1')): '*', str(kept): '*'})
+    tags.dump()
+    buffer = CopyBuffer([File(str(tree.join('file2'))), File(str(kept))])
+    fm = FM(tags, buffer)
+    monkeypatch.setattr(FileManagerAware, 'fm', fm, raising=False)
+    monkeypatch.setattr(delete, 'default_workers', lambda paths: 2)
+    loader = DeleteLoader([str(tree)])
+    for _ in loader.load_generator:
+        pass
+    assert not tree.check()
+    assert list(tags.tags) == [str(kept)]
+    assert [fobj.path for fobj in buffer] == [str(kept)]
+    assert fm.ui.need_redraw
+    (text, bad), = fm.notices
+    assert text.startswith('Deleted 15 files and 3 directories') and not bad
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    # For human_readable() in SelectionScan.describe()
+    monkeypatch.setattr(SettingsAware, 'settings', type(
+        'Settings', (object, ), {'size_in_bytes': False})(), raising=False)
+
+
+def scan_of(paths, budget=0):
+    scan = SelectionScan(paths, budget=budget, workers=3)
+    updates = []
+    scan.on_update = lambda: updates.append((scan.files, scan.size))
+    for _ in scan.generate():
+        pass
+    return scan, updates
+
+
+@pytest.mark.usefixtures('settings')
+def test_scan_matches_the_deletion(tmpdir):
+    files, dirs = make_tree(tmpdir.mkdir('tree'))
+    tmpdir.join('single').write('xyz')
+    tmpdir.join('tree', 'link').mksymlinkto(tmpdir.join('tree', 'dir0'))
+    paths = [str(tmpdir.join('tree')), str(tmpdir.join('single'))]
+    scan, updates = scan_of(paths)
+    assert scan.complete and not scan.cut
+    assert scan.files == files + 2 and scan.dirs == dirs + 1
+    assert updates[-1] == (scan.files, scan.size)
+    assert scan.describe() == '%d files, %s' % (
+        scan.files, human_readable(scan.size))
+    deleter = run(TreeDeleter(paths, workers=2))
+    assert scan.total == deleter.files_removed + deleter.dirs_removed
+    assert scan.size == deleter.bytes_freed
+
+
+@pytest.mark.usefixtures('settings')
+def test_scan_budget_gives_a_lower_bound(tmpdir, monkeypatch):
+    make_tree(tmpdir.mkdir('tree'))
+    full, _ = scan_of([str(tmpdir.join('tree'))])
+    scandir = os.scandir
+
+    def slow_scandir(path):
+        time.sleep(0.02)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', slow_scandir)
+    scan, _ = scan_of([str(tmpdir.join('tree'))], budget=0.03)
+    assert scan.cut and not scan.complete
+    assert scan.describe().startswith('at least ')
+    assert scan.files < full.files and scan.size <= full.size
+
+
+def test_scan_skips_unreadable_subtrees(tmpdir, monkeypatch):
+    make_tree(tmpdir.mkdir('tree'))
+    full, _ = scan_of([str(tmpdir.join('tree'))])
+    locked = str(tmpdir.join('tree', 'dir1'))
+    scandir = os.scandir
+
+    def denying_scandir(path):
+        if path == locked:
+            raise OSError(errno.EACCES, 'Permission denied', path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', denying_scandir)
+    scan, _ = scan_of([str(tmpdir.join('tree')), str(tmpdir.join('missing'))])
+    assert scan.complete
+    assert scan.walker.errors == 1
+    # dir1 itself is counted, not the 5 + 4 * 5 files and 4 dirs below it
+    assert scan.files == full.files - 25 and scan.dirs == full.dirs - 4
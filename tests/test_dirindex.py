@@ -0,0 +1,93 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import time
+
+from plugins.ranger_ext import dirindex
+from plugins.ranger_ext.dirindex import CHILDREN, DirIndex
+
+
+def make_tree(tmpdir, depth, width):
+    paths = [tmpdir]
+    for _ in range(depth):
+        paths = [path.mkdir('d%d' % i) for path in paths for i in range(width)]
+    return str(tmpdir)
+
+
+def wait_built(index):
+    while index._building:  # pylint: disable=protected-access
+        time.sleep(0.01)
+
+
+def listed(node):
+    count = 0
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if node[CHILDREN] is not None:
+            count += 1
+            pending.extend(node[CHILDREN].values())
+    return count
+
+
+def test_root_of_is_the_closest_root(tmpdir):
+    index = DirIndex(str(tmpdir.join('index')))
+    index.roots = {'/a': [None, None], '/a/b': [None, None], '/': [None, None]}
+    assert index._root_of('/a/b/c') == '/a/b'  # pylint: disable=protected-access
+    assert index._root_of('/a/bc') == '/a'  # pylint: disable=protected-access
+    assert index._root_of('/x') == '/'  # pylint: disable=protected-access
+    del index.roots['/']
+    assert index._root_of('/x/y') is None  # pylint: disable=protected-access
+
+
+def test_build_stops_at_max_dirs_and_depth(tmpdir):
+    root = make_tree(tmpdir.mkdir('tree'), 4, 3)
+    index = DirIndex(str(tmpdir.join('index')))
+    index.build(root, max_dirs=5)
+    wait_built(index)
+    assert listed(index.roots[root]) == 5
+
+    index = DirIndex(str(tmpdir.join('index2')))
+    index.build(root, max_depth=1)
+    wait_built(index)
+    assert listed(index.roots[root]) == 1 + 3
+
+
+def test_fuzzy_match_indexes_only_as_deep_as_the_tokens(tmpdir):
+    root = make_tree(tmpdir.mkdir('tree'), 4, 3)
+    index = DirIndex(str(tmpdir.join('index')))
+    found = list(index.fuzzy_match(root, ['d1', 'd0'], lambda t, d: d.startswith(t)))
+    assert found == [os.path.join(root, 'd0', 'd1')]
+    wait_built(index)
+    assert listed(index.roots[root]) == 1 + 3
+
+
+def test_least_recently_used_roots_are_evicted(tmpdir, monkeypatch):
+    monkeypatch.setattr(dirindex, 'MAX_NODES', 30)
+    index = DirIndex(str(tmpdir.join('index')))
+    old = make_tree(tmpdir.mkdir('old'), 2, 4)
+    new = make_tree(tmpdir.mkdir('new'), 2, 4)
+    for root in (old, new):
+        index.build(root)
+        wait_built(index)
+    index.used[old] = 0
+    index.save()
+    assert list(DirIndex(index.filename).roots) == [new]
+
+
+def test_fuzzy_match_marks_its_root_used(tmpdir, monkeypatch):
+    index = DirIndex(str(tmpdir.join('index')))
+    old = make_tree(tmpdir.mkdir('old'), 2, 4)
+    new = make_tree(tmpdir.mkdir('new'), 2, 4)
+    for root in (old, new):
+        index.build(root)
+        wait_built(index)
+    # Both roots stay until now, as the builds save without evicting
+    assert sorted(index.roots) == [new, old]
+    monkeypatch.setattr(dirindex, 'MAX_NODES', 30)
+    index.used[old] = 0
+    assert list(index.fuzzy_match(old, ['d1'], lambda t, d: d == t)) == [
+        os.path.join(old, 'd1')]
+    assert index.used[old] > index.used[new]
+    index.save()
+    assert list(DirIndex(index.filename).roots) == [old]
@@ -0,0 +1,85 @@
+from __future__ import (absolute_import, division, print_function)
+
+from collections import namedtuple
+
+from plugins.ranger_ext.filterstack import FilterStack, get_filter_stack
+
+
+Stat = namedtuple('Stat', 'st_ino st_mtime st_size st_mode')
+
+
+class FakeFile(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, name, mtime=0):
+        self.path = '/dir/' + name
+        self.relative_path = name
+        self.basename = name
+        self.stat = Stat(1, mtime, 0, 0o100644)
+
+
+class CountingFilter(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, accept, cost=None, cache_results=True):
+        self.accept = accept
+        self.calls = []
+        self.cost = cost
+        self.cache_results = cache_results
+
+    def __call__(self, fobj):
+        self.calls.append(fobj.basename)
+        return self.accept(fobj)
+
+
+def test_iterates_as_one_predicate_and_keeps_the_stack_order():
+    first = CountingFilter(lambda f: True)
+    second = CountingFilter(lambda f: True)
+    stack = FilterStack([first, second])
+    assert stack.filters() == [first, second]
+    assert len(list(stack)) == 1
+    assert stack.pop() is second
+    assert list(FilterStack()) == []
+
+
+def test_cheap_selective_filters_run_first():
+    expensive = CountingFilter(lambda f: f.basename.startswith('a'), cost=1e-2)
+    cheap = CountingFilter(lambda f: f.basename.endswith('.txt'), cost=1e-7)
+    stack = FilterStack([expensive, cheap])
+    assert [term.filt for term in stack.evaluation_order()] == [cheap, expensive]
+    predicate, = stack
+    files = [FakeFile(name) for name in ('a.txt', 'a.py', 'b.txt', 'b.py')]
+    assert [f.basename for f in files if predicate(f)] == ['a.txt']
+    assert cheap.calls == ['a.txt', 'a.py', 'b.txt', 'b.py']
+    # Files the cheap filter rejected never reach the expensive one
+    assert expensive.calls == ['a.txt', 'b.txt']
+    assert stack.describe()[-1] == 'Evaluation order: 2, 1'
+
+
+def test_results_are_cached_by_stat_signature():
+    filt = CountingFilter(lambda f: True)
+    stack = FilterStack([filt])
+    files = [FakeFile('a'), FakeFile('b')]
+    predicate, = stack
+    assert all(predicate(f) for f in files)
+    # Recompiling, as after a rotate or pop, answers from the cache
+    predicate, = stack
+    assert all(predicate(f) for f in files)
+    assert filt.calls == ['a', 'b']
+    files[1].stat = files[1].stat._replace(st_mtime=1)
+    assert all(predicate(f) for f in files)
+    assert filt.calls == ['a', 'b', 'b']
+
+
+def test_uncacheable_filters_are_called_every_time():
+    filt = CountingFilter(lambda f: True, cache_results=False)
+    predicate, = FilterStack([filt])
+    fobj = FakeFile('a')
+    predicate(fobj)
+    predicate(fobj)
+    assert filt.calls == ['a', 'a']
+
+
+def test_get_filter_stack_converts_once():
+    directory = type('Directory', (object, ), {})()
+    filt = CountingFilter(lambda f: True)
+    directory.filter_stack = [filt]
+    stack = get_filter_stack(directory)
+    assert isinstance(stack, FilterStack) and stack.filters() == [filt]
+    assert get_filter_stack(directory) is stack
@@ -0,0 +1,80 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import time
+
+from plugins.ranger_ext.flatcache import cache_size, evict, invalidate, open_cache
+from plugins.ranger_ext.walker import ParallelWalker
+
+
+def flat_listing(cachedir, root, level=-1):
+    """Walk root like the flat view does; returns (paths, cache)"""
+    cache = open_cache(cachedir, root, level)
+    walker = ParallelWalker(root, workers=2, cached=cache.lookup,
+                            on_directory=cache.record).start()
+    paths = []
+    while not walker.finished:
+        paths.extend(entry.path for entry in walker.get_batch(timeout=0.05))
+    saved = os.stat(cache.filename).st_mtime_ns if os.path.exists(cache.filename) \
+        else None
+    cache.save(0)
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        if os.path.exists(cache.filename) and \
+                os.stat(cache.filename).st_mtime_ns != saved:
+            break
+        time.sleep(0.01)
+    return sorted(paths), cache
+
+
+def make_tree(root):
+    for name in ('a', 'b'):
+        sub = root.mkdir(name)
+        sub.join('file').write('')
+        sub.mkdir('deep').join('file').write('')
+
+
+def test_unchanged_directories_come_from_the_cache(tmpdir):
+    make_tree(tmpdir.mkdir('root'))
+    root = str(tmpdir.join('root'))
+    listed, cache = flat_listing(str(tmpdir.join('cache')), root)
+    assert cache.hits == 0
+    again, cache = flat_listing(str(tmpdir.join('cache')), root)
+    assert again == listed and cache.hits == 5
+
+
+def test_changed_mtime_lists_the_directory_again(tmpdir):
+    make_tree(tmpdir.mkdir('root'))
+    root = str(tmpdir.join('root'))
+    listed, _ = flat_listing(str(tmpdir.join('cache')), root)
+    deep = tmpdir.join('root', 'a', 'deep')
+    deep.join('new').write('')
+    os.utime(str(deep), ns=(0, 1))
+    again, cache = flat_listing(str(tmpdir.join('cache')), root)
+    assert again == sorted(listed + [str(deep.join('new'))])
+    assert cache.hits == 4
+    _, cache = flat_listing(str(tmpdir.join('cache')), root)
+    assert cache.hits == 5
+
+
+def test_levels_and_roots_are_cached_apart(tmpdir):
+    make_tree(tmpdir.mkdir('root'))
+    root = str(tmpdir.join('root'))
+    cachedir = str(tmpdir.join('cache'))
+    flat_listing(cachedir, root)
+    assert open_cache(cachedir, root, 2).lookup(root, 1) is None
+    assert open_cache(cachedir, root + '/a', -1).lookup(root + '/a', 1) is None
+    assert cache_size(cachedir)[0] == 1
+    assert invalidate(cachedir, root) == 1
+    assert cache_size(cachedir) == (0, 0)
+
+
+def test_evict_deletes_the_least_recently_used(tmpdir):
+    for age, name in enumerate(('new', 'old', 'oldest')):
+        path = tmpdir.join(name)
+        path.write('x' * 100)
+        os.utime(str(path), (1000 - age, 1000 - age))
+    evict(str(tmpdir), 250)
+    assert sorted(os.listdir(str(tmpdir))) == ['new', 'old']
+    evict(str(tmpdir), 0)
+    assert len(os.listdir(str(tmpdir))) == 2
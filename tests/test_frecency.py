@@ -0,0 +1,97 @@
+from __future__ import (absolute_import, division, print_function)
+
+import pytest
+
+from plugins.ranger_ext import frecency
+from plugins.ranger_ext.frecency import HALF_LIFE, FrecencyStore
+
+
+class Clock(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def make_store(tmpdir, monkeypatch, max_entries=1000):
+    clock = Clock(1e9)
+    monkeypatch.setattr(frecency.time, 'time', clock.time)
+    return FrecencyStore(str(tmpdir.join('frecency')), max_entries), clock
+
+
+def test_visits_are_counted_once(tmpdir, monkeypatch):
+    store, _ = make_store(tmpdir, monkeypatch)
+    for _ in range(3):
+        store.add('/a')
+    store.add('/b')
+    assert store.entries['/a'][0] == 3
+    assert store.query(['a']) == ['/a']
+    other = FrecencyStore(store.filename)
+    other.sync()
+    assert other.entries == store.entries
+
+
+def test_ranks_age_with_time_below_max_entries(tmpdir, monkeypatch):
+    store, clock = make_store(tmpdir, monkeypatch)
+    for _ in range(8):
+        store.add('/often')
+    store.add('/once')
+    clock.now += HALF_LIFE
+    store.add('/new')
+    assert store.entries['/often'][0] == 4
+    assert store.entries['/once'][0] == 0.5
+    assert store.entries['/new'][0] == 1
+    clock.now += 4 * HALF_LIFE
+    store.add('/new')
+    assert '/once' not in store.entries
+    assert store.entries['/often'][0] == 0.25
+    reread = FrecencyStore(store.filename)
+    reread.sync()
+    assert reread.aged == store.aged
+    assert sorted(reread.entries) == sorted(store.entries)
+    for path, (rank, _) in store.entries.items():
+        assert reread.entries[path][0] == pytest.approx(rank, abs=1e-3)
+
+
+def test_weakest_entries_beyond_max_are_dropped(tmpdir, monkeypatch):
+    store, _ = make_store(tmpdir, monkeypatch, max_entries=2)
+    for path in ['/a', '/a', '/b', '/b', '/c']:
+        store.add(path)
+    store.compact()
+    assert sorted(store.entries) == ['/a', '/b']
+
+
+def test_removal_reaches_other_instances_and_the_database(tmpdir, monkeypatch):
+    store, _ = make_store(tmpdir, monkeypatch)
+    store.add('/gone')
+    store.add('/kept')
+    other = FrecencyStore(store.filename)
+    other.sync()
+    store.remove('/gone')
+    assert store.query(['gone']) == []
+    other.sync()
+    assert sorted(other.entries) == ['/kept']
+    other.compact()
+    reread = FrecencyStore(store.filename)
+    reread.sync()
+    assert sorted(reread.entries) == ['/kept']
+    store.add('/gone')
+    assert sorted(store.entries) == ['/gone', '/kept']
+
+
+def test_paths_with_line_breaks_stay_whole(tmpdir, monkeypatch):
+    store, _ = make_store(tmpdir, monkeypatch)
+    odd = ['/a\nb', '/c\rd', '/e\x0cf\tg']
+    for path in odd:
+        store.add(path)
+    other = FrecencyStore(store.filename)
+    other.sync()
+    assert sorted(other.entries) == sorted(odd)
+    store.compact()
+    reread = FrecencyStore(store.filename)
+    reread.sync()
+    assert sorted(reread.entries) == sorted(odd)
+    store.remove('/a\nb')
+    reread.sync()
+    assert sorted(reread.entries) == ['/c\rd', '/e\x0cf\tg']
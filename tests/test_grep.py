@@ -0,0 +1,67 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import re
+import subprocess
+import sys
+
+from plugins.ranger_ext.grep import _search_buffer, grep_files, worker_pool
+
+
+def search(pattern, data, flags=0):
+    regex = re.compile(pattern, flags | re.MULTILINE)
+    return _search_buffer(regex, data, len(data))
+
+
+def test_anchors_match_at_line_boundaries():
+    data = b'one\ntwo\nthree\n'
+    assert search(br'^t', data) == [(2, 'two'), (3, 'three')]
+    assert search(br'o$', data) == [(2, 'two')]
+
+
+def test_matches_do_not_span_lines():
+    data = b'foo\nbar\nfoo bar\n'
+    assert search(br'foo\sbar', data) == [(3, 'foo bar')]
+    assert search(br'o[^x]*b', data) == [(3, 'foo bar')]
+    assert search(br'\n', data) == []
+
+
+def test_spanning_match_does_not_hide_a_later_one_on_its_line():
+    data = b'a\nb a b\n'
+    assert search(br'a\s*b', data) == [(2, 'b a b')]
+
+
+def test_grep_files(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'alpha\nbeta\n')
+    results, size = grep_files(b'^beta$', 0, [str(path)])
+    assert results == [(str(path), [(2, 'beta')])]
+    assert size == 11
+
+
+def test_pool_is_reused():
+    pool = worker_pool(2)
+    assert worker_pool(2) is pool
+    assert pool.apply(len, ('abc', )) == 3
+
+
+# A main script without a __main__ guard, like ranger's launcher
+SCRIPT = """
+import sys
+sys.path.insert(0, %(root)r)
+from plugins.ranger_ext.grep import grep_files, worker_pool
+sys.path.remove(%(root)r)
+print('started')
+print(worker_pool(2).apply(grep_files, (b'beta', 0, [%(path)r]))[0])
+"""
+
+
+def test_workers_do_not_rerun_the_main_script(tmpdir):
+    path = tmpdir.join('file')
+    path.write_binary(b'alpha\nbeta\n')
+    script = tmpdir.join('launcher')
+    script.write(SCRIPT % {'root': os.path.dirname(os.path.dirname(__file__)),
+                           'path': str(path)})
+    output = subprocess.check_output([sys.executable, str(script)], timeout=60)
+    assert output.decode().splitlines() == [
+        'started', str([(str(path), [(2, 'beta')])])]
@@ -0,0 +1,74 @@
+from __future__ import (absolute_import, division, print_function)
+
+import random
+import re
+
+import pytest
+
+from plugins.ranger_ext.commands import scout
+
+
+ALPHABET = 'ab.*?^$_'
+TEXT_ALPHABET = 'abAB.*?-_ '
+
+
+def baseline_regex(flags, pattern):
+    """The regex that scout built before it had matchers"""
+    frmat = "%s"
+    if pattern == ".":
+        return re.compile("")
+    ignore_case = 'i' in flags or 's' in flags and pattern.islower()
+    if pattern.startswith('^'):
+        pattern = pattern[1:]
+        frmat = "^" + frmat
+    if pattern.endswith('$'):
+        pattern = pattern[:-1]
+        frmat += "$"
+    if 'r' in flags:
+        regex = pattern
+    elif 'g' in flags:
+        regex = re.escape(pattern).replace("\\*", ".*").replace("\\?", ".")
+    elif 'l' in flags:
+        regex = ".*".join(re.escape(c) for c in pattern)
+    else:
+        regex = re.escape(pattern)
+    regex = frmat % regex
+    if 'v' in flags:
+        regex = "^(?:(?!%s).)*$" % regex
+    options = re.UNICODE
+    if ignore_case:
+        options |= re.IGNORECASE
+    try:
+        return re.compile(regex, options)
+    except re.error:
+        return re.compile("")
+
+
+def build(flags, pattern):
+    line = 'scout -%s %s' % (flags, pattern) if flags else 'scout ' + pattern
+    return scout(line)._build_regex()
+
+
+def assert_same(flags, pattern, texts):
+    matcher = build(flags, pattern)
+    regex = baseline_regex(flags, pattern)
+    for text in texts:
+        assert bool(matcher.search(text)) == bool(regex.search(text)), \
+            (flags, pattern, text)
+
+
+@pytest.mark.parametrize('flags', ['v', 'gv', 'lv', 'rv'])
+@pytest.mark.parametrize('pattern', ['$', '^', '^$', '^a$', 'a$', '^a', '*', '^*$'])
+def test_inverted_anchors(flags, pattern):
+    assert_same(flags, pattern, ['', 'a', 'b', 'ab', 'ba', 'aa', '*'])
+
+
+@pytest.mark.parametrize('flags', ['', 'g', 'l', 'gi', 'li', 's', 'gv', 'lv', 'v',
+                                   'giv', 'lsv'])
+def test_fuzz_against_regex(flags):
+    rng = random.Random(flags)
+    for _ in range(300):
+        pattern = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 5)))
+        texts = [''.join(rng.choice(TEXT_ALPHABET) for _ in range(rng.randint(1, 8)))
+                 for _ in range(20)]
+        assert_same(flags, pattern, texts)
@@ -0,0 +1,89 @@
+from __future__ import (absolute_import, division, print_function)
+
+import json
+
+from ranger.container.bookmarks import Bookmarks
+from ranger.container.file import File
+from ranger.container.tags import Tags
+from ranger.core.metadata import MetadataManager
+
+from plugins.ranger_ext.pathmove import (
+    PathMapper, move_bookmarks, move_metadata, move_tags)
+
+
+def test_mapper_follows_moved_parents():
+    mapper = PathMapper([('/a/b', '/a/x'), ('/c', '/d')])
+    assert mapper('/a/b') == '/a/x'
+    assert mapper('/a/b/c/d') == '/a/x/c/d'
+    assert mapper('/c/b') == '/d/b'
+    assert mapper('/a') is None
+    assert mapper('/e/b') is None
+
+
+def test_mapper_leaves_siblings_sharing_a_prefix():
+    mapper = PathMapper([('/a/b', '/a/x')])
+    assert mapper('/a/bc') is None
+    assert mapper('/a/bc/b') is None
+    assert mapper('/a/b.txt') is None
+    assert mapper('/a/b/c') == '/a/x/c'
+
+
+def test_move_tags(tmpdir):
+    tags = Tags(str(tmpdir.join('tagged')))
+    tags.tags.update({'/a/b': '*', '/a/b/c': 'x', '/a/bc': '*', '/q': 'y',
+                      '/p': 'z'})
+    tags.dump()
+    # Swapped names keep their own tags
+    mapper = PathMapper([('/a/b', '/a/renamed'), ('/q', '/p'), ('/p', '/q')])
+    assert move_tags(tags, mapper) == 4
+    expected = {'/a/renamed': '*', '/a/renamed/c': 'x', '/a/bc': '*',
+                '/p': 'y', '/q': 'z'}
+    assert tags.tags == expected
+    assert Tags(str(tmpdir.join('tagged'))).tags == expected
+
+
+def test_move_bookmarks(tmpdir):
+    bookmarks = Bookmarks(str(tmpdir.join('bookmarks')), bookmarktype=File)
+    bookmarks.load()
+    for key, path in (('a', '/a/b'), ('b', '/a/b/deep'), ('c', '/a/bc')):
+        bookmarks.dct[key] = File(path)
+    bookmarks.save()
+    assert move_bookmarks(bookmarks, PathMapper([('/a/b', '/z')])) == 2
+    assert dict((key, bfile.path) for key, bfile in bookmarks) == {
+        'a': '/z', 'b': '/z/deep', 'c': '/a/bc'}
+    saved = Bookmarks(str(tmpdir.join('bookmarks')), bookmarktype=File)
+    saved.load()
+    assert saved.dct['b'].path == '/z/deep'
+
+
+def test_move_metadata(tmpdir):
+    metadata = MetadataManager()
+    source, target = tmpdir.mkdir('source'), tmpdir.mkdir('target')
+    source.join('.metadata.json').write(json.dumps({
+        'moved': {'title': 'one'},
+        str(source.join('full')): {'title': 'two'},
+        'movedness': {'title': 'stays'}}))
+    metadata.metafile_cache['stale'] = {}
+    mapper = PathMapper([(str(source.join('moved')), str(target.join('moved'))),
+                         (str(source.join('full')), str(target.join('renamed')))])
+    assert move_metadata(metadata, mapper) == 2
+    assert json.loads(source.join('.metadata.json').read()) == {
+        'movedness': {'title': 'stays'}}
+    assert json.loads(target.join('.metadata.json').read()) == {
+        'moved': {'title': 'one'}, 'renamed': {'title': 'two'}}
+    assert not metadata.metafile_cache
+
+
+def test_move_metadata_of_a_moved_directory(tmpdir):
+    # The directory's own .metadata.json moves along with it
+    metadata = MetadataManager()
+    old = tmpdir.join('old')
+    tmpdir.mkdir('new').join('.metadata.json').write(json.dumps({
+        'file': {'title': 'inside'}}))
+    tmpdir.join('.metadata.json').write(json.dumps({'old': {'title': 'dir'}}))
+    mapper = PathMapper([(str(old), str(tmpdir.join('new')))])
+    assert move_metadata(metadata, mapper) == 1
+    assert json.loads(tmpdir.join('.metadata.json').read()) == {
+        'new': {'title': 'dir'}}
+    assert json.loads(tmpdir.join('new', '.metadata.json').read()) == {
+        'file': {'title': 'inside'}}
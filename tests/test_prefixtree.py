@@ -0,0 +1,43 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import random
+
+from plugins.ranger_ext.prefixtree import BookmarkTree, PathPrefixTree
+
+
+class Bookmark(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, path):
+        self.path = path
+
+
+class Bookmarks(object):  # pylint: disable=too-few-public-methods
+    def __init__(self, paths):
+        self.dct = dict((str(i), Bookmark(path)) for i, path in enumerate(paths))
+
+
+def random_paths(rng, count):
+    names = ['a', 'b', 'ab', 'a b', 'c.d']
+    return ['/' + '/'.join(rng.choice(names) for _ in range(rng.randint(1, 4)))
+            for _ in range(count)]
+
+
+def test_below_matches_startswith():
+    rng = random.Random(4)
+    bookmarks = random_paths(rng, 200)
+    tree = PathPrefixTree(bookmarks)
+    for path in random_paths(rng, 200) + ['/', 'a', 'a/b', '']:
+        expected = [b for b in bookmarks
+                    if os.path.isabs(path) and b.startswith(path.rstrip('/') + '/')]
+        assert sorted(tree.below(path)) == sorted(expected), path
+
+
+def test_bookmark_tree_is_rebuilt_only_when_bookmarks_change():
+    bookmarks = Bookmarks(['/a/b', '/c'])
+    tree = BookmarkTree.get(bookmarks)
+    assert BookmarkTree.get(bookmarks) is tree
+    assert tree.below('/a') == ['/a/b']
+    bookmarks.dct['x'] = Bookmark('/a/d')
+    changed = BookmarkTree.get(bookmarks)
+    assert changed is not tree
+    assert sorted(changed.below('/a')) == ['/a/b', '/a/d']
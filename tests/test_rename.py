@@ -0,0 +1,142 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+import pytest
+
+from plugins.ranger_ext import rename
+from plugins.ranger_ext.rename import (
+    RENAME, RenameError, RenameJournal, plan_renames)
+
+
+def make_files(tmpdir, names):
+    for name in names:
+        tmpdir.join(name).write(name)
+
+
+def contents(tmpdir):
+    return dict((path.basename, path.read()) for path in tmpdir.listdir()
+                if path.isfile() and path.basename != 'journal')
+
+
+def run_plan(tmpdir, pairs):
+    base = str(tmpdir)
+    ops = plan_renames([(os.path.join(base, old), os.path.join(base, new))
+                        for old, new in pairs])
+    journal = RenameJournal(str(tmpdir.join('journal')))
+    return journal.start(ops), journal
+
+
+def test_swap(tmpdir):
+    make_files(tmpdir, ['a', 'b'])
+    renamed, journal = run_plan(tmpdir, [('a', 'b'), ('b', 'a')])
+    assert contents(tmpdir) == {'a': 'b', 'b': 'a'}
+    assert len(renamed) == 2
+    assert not journal.exists()
+
+
+def test_three_cycle_and_chain(tmpdir):
+    make_files(tmpdir, ['a', 'b', 'c', 'd'])
+    run_plan(tmpdir, [('a', 'b'), ('b', 'c'), ('c', 'a'), ('d', 'e')])
+    assert contents(tmpdir) == {'a': 'c', 'b': 'a', 'c': 'b', 'e': 'd'}
+
+
+def test_collisions_are_refused(tmpdir):
+    make_files(tmpdir, ['a', 'b', 'c'])
+    with pytest.raises(RenameError):
+        run_plan(tmpdir, [('a', 'c')])
+    with pytest.raises(RenameError):
+        run_plan(tmpdir, [('a', 'x'), ('b', 'x')])
+    assert contents(tmpdir) == {'a': 'a', 'b': 'b', 'c': 'c'}
+
+
+def test_new_directories_are_created(tmpdir):
+    make_files(tmpdir, ['a'])
+    run_plan(tmpdir, [('a', 'sub/dir/a')])
+    assert tmpdir.join('sub', 'dir', 'a').read() == 'a'
+
+
+def crash_after(tmpdir, monkeypatch, pairs, count):
+    """Start a plan and make the rename number count + 1 fail"""
+    real_rename = os.rename
+    calls = []
+
+    def failing_rename(old, new):
+        if len(calls) == count:
+            raise OSError('disk on fire')
+        calls.append((old, new))
+        real_rename(old, new)
+
+    monkeypatch.setattr(rename.os, 'rename', failing_rename)
+    with pytest.raises(RenameError):
+        run_plan(tmpdir, pairs)
+    monkeypatch.setattr(rename.os, 'rename', real_rename)
+    return RenameJournal(str(tmpdir.join('journal'))).load()
+
+
+CYCLE = [('a', 'b'), ('b', 'c'), ('c', 'a')]
+
+
+def test_resume_after_a_crash(tmpdir, monkeypatch):
+    make_files(tmpdir, ['a', 'b', 'c'])
+    journal = crash_after(tmpdir, monkeypatch, CYCLE, 2)
+    assert journal.done == 2
+    assert sorted(os.path.basename(new) for _, new in journal.run()) == ['a', 'b', 'c']
+    assert contents(tmpdir) == {'a': 'c', 'b': 'a', 'c': 'b'}
+    assert not journal.exists()
+
+
+def test_resume_when_the_last_rename_was_not_recorded(tmpdir, monkeypatch):
+    make_files(tmpdir, ['a', 'b', 'c'])
+    crash_after(tmpdir, monkeypatch, CYCLE, 2)
+    # Do the next rename as if ranger died before recording it
+    journal = RenameJournal(str(tmpdir.join('journal'))).load()
+    _, old, new = journal.ops[2]
+    os.rename(old, new)
+    journal = RenameJournal(str(tmpdir.join('journal'))).load()
+    assert journal.done == 3
+    journal.run()
+    assert contents(tmpdir) == {'a': 'c', 'b': 'a', 'c': 'b'}
+
+
+def test_rollback(tmpdir, monkeypatch):
+    make_files(tmpdir, ['a', 'b', 'c'])
+    journal = crash_after(tmpdir, monkeypatch, CYCLE + [('x', 'y')], 3)
+    journal.rollback()
+    assert contents(tmpdir) == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert not journal.exists()
+
+
+def test_torn_journal_line(tmpdir, monkeypatch):
+    make_files(tmpdir, ['a', 'b', 'c'])
+    crash_after(tmpdir, monkeypatch, CYCLE, 2)
+    with open(str(tmpdir.join('journal')), 'a') as fobj:
+        fobj.write('{"do')
+    assert RenameJournal(str(tmpdir.join('journal'))).load().done == 2
+
+
+def test_unwritable_journal_rolls_back(tmpdir, monkeypatch):
+    make_files(tmpdir, ['a', 'b', 'c'])
+
+    def full_disk(fd, data):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(rename.os, 'write', full_disk)
+    with pytest.raises(RenameError) as err:
+        run_plan(tmpdir, CYCLE)
+    assert 'rolled back' in str(err.value)
+    assert contents(tmpdir) == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert not tmpdir.join('journal').exists()
+
+
+def test_journal_that_cannot_be_created(tmpdir):
+    make_files(tmpdir, ['a', 'b'])
+    ops = plan_renames([(str(tmpdir.join('a')), str(tmpdir.join('c')))])
+    journal = RenameJournal(str(tmpdir.join('missing', 'journal')))
+    with pytest.raises(RenameError):
+        journal.start(ops)
+    assert contents(tmpdir) == {'a': 'a', 'b': 'b'}
+
+
+def test_edited_plans_do_not_overwrite_silently():
+    assert rename.describe([(RENAME, '/d/a', '/d/b')]) == ['mv -vi -- /d/a /d/b']
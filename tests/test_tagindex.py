@@ -0,0 +1,62 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.container.file import File
+
+from plugins.ranger_ext.column import ColumnView
+from plugins.ranger_ext.tagindex import IndexedTags, tagged_files
+
+
+class Directory(object):  # pylint: disable=too-few-public-methods
+    flat = 0
+
+    def __init__(self, path, names):
+        self.path = path
+        self.files = [File(os.path.join(path, name)) for name in names]
+
+
+def make_tags(tmpdir, tags):
+    indexed = IndexedTags(str(tmpdir.join('tagged')))
+    indexed.tags.update(tags)
+    return indexed
+
+
+def test_index_follows_changes(tmpdir):
+    tags = make_tags(tmpdir, {'/a/x': '*', '/a/y': 'b', '/z': 'c'})
+    assert tags.tagged_in('/a') == {'x': '*', 'y': 'b'}
+    assert tags.tagged_in('/') == {'z': 'c'}
+    del tags.tags['/a/x']
+    tags.tags.pop('/a/y')
+    assert tags.tagged_in('/a') == {}
+
+
+def test_tagged_files(tmpdir):
+    tags = make_tags(tmpdir, {'/a/x': '*', '/a/y': 'b', '/b/x': 'c'})
+    found = tagged_files(tags, Directory('/a', ['w', 'x', 'y']))
+    assert sorted((f.basename, tag) for f, tag in found) == [('x', '*'), ('y', 'b')]
+
+
+def test_directory_below_a_symlink(tmpdir):
+    real = tmpdir.mkdir('real')
+    real.join('x').write('')
+    real.join('y').write('')
+    link = tmpdir.join('link')
+    link.mksymlinkto(real)
+    tags = make_tags(tmpdir, {str(real.join('x')): '*', str(link.join('y')): 'b'})
+    found = tagged_files(tags, Directory(str(link), ['x', 'y']))
+    assert sorted((f.basename, tag) for f, tag in found) == [('x', '*'), ('y', 'b')]
+
+
+def test_column_view_answers_like_all_tags(tmpdir):
+    tags = make_tags(tmpdir, {'/a/x': '*', '/a/y': 'b', '/b/x': 'c', '/z': 'd'})
+    column = type('Column', (object, ), {'target': Directory('/a', [])})()
+    fm = type('FM', (object, ), {'tags': tags})()
+    view = ColumnView(fm, column)
+    for path in ['/a/x', '/a/y', '/a/w', '/b/x', '/b/y', '/z', '/a/x/y', None]:
+        assert (path in view.tags) == (path in tags)
+        if path in tags:
+            assert view.tags.marker(path) == tags.marker(path)
+    assert view.tags is view.tags
+    column.target = Directory('/', [])
+    assert '/z' in ColumnView(fm, column).tags
@@ -0,0 +1,65 @@
+from __future__ import (absolute_import, division, print_function)
+
+from plugins.ranger_ext import taglog
+from plugins.ranger_ext.taglog import LoggedTags
+
+
+def test_two_instances_see_each_others_changes(tmpdir):
+    logfile = str(tmpdir.join('tagged.log'))
+    first = LoggedTags(logfile)
+    second = LoggedTags(logfile)
+    first.tags['/a'] = '*'
+    first.dump()
+    second.tags['/b'] = 'x'
+    second.dump()
+    first.sync()
+    second.sync()
+    assert first.tags == second.tags == {'/a': '*', '/b': 'x'}
+    del first.tags['/a']
+    first.dump()
+    second.sync()
+    assert second.tags == {'/b': 'x'}
+    assert LoggedTags(logfile).tags == {'/b': 'x'}
+
+
+def test_torn_last_record_is_skipped(tmpdir):
+    logfile = tmpdir.join('tagged.log')
+    tags = LoggedTags(str(logfile))
+    tags.tags['/a'] = '*'
+    tags.dump()
+    with logfile.open('ab') as fobj:
+        fobj.write(b'+/cut off by a cra')
+    other = LoggedTags(str(logfile))
+    other.tags['/b'] = '*'
+    other.dump()
+    assert LoggedTags(str(logfile)).tags == {'/a': '*', '/b': '*'}
+
+
+def test_compaction_counts_each_record_once(tmpdir, monkeypatch):
+    monkeypatch.setattr(taglog, 'COMPACT_MIN_RECORDS', 10)
+    tags = LoggedTags(str(tmpdir.join('tagged.log')))
+    for i in range(20):
+        tags.tags['/%d' % i] = '*'
+    tags.dump()
+    for i in range(10):
+        del tags.tags['/%d' % i]
+    tags.dump()
+    # 30 records for 10 tags is just at the limit
+    assert tags.records == 30
+    del tags.tags['/10']
+    tags.dump()
+    assert tags.records == 9
+    assert LoggedTags(str(tmpdir.join('tagged.log'))).tags == tags.tags
+
+
+def test_compaction_saves_undumped_changes_once(tmpdir):
+    logfile = tmpdir.join('tagged.log')
+    tags = LoggedTags(str(logfile))
+    tags.tags['/a'] = '*'
+    tags.dump()
+    tags.tags['/b'] = '*'
+    tags.compact()
+    size = logfile.size()
+    tags.dump()
+    assert logfile.size() == size
+    assert LoggedTags(str(logfile)).tags == {'/a': '*', '/b': '*'}
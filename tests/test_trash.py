@@ -0,0 +1,117 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+import pytest
+
+from plugins.ranger_ext import trash as trashmod
+from plugins.ranger_ext.trash import TrashDir, TrashError, trash_for, tree_size
+
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    monkeypatch.setenv('XDG_DATA_HOME', str(tmpdir.join('data')))
+    return trashmod.home_trash()
+
+
+def test_trashinfo_round_trip(tmpdir, home):
+    odd = tmpdir.join('100% sure & a\tb')
+    odd.write('x')
+    (_, item), = home.put([str(odd)])[0]
+    with open(item.info_path, 'r') as fobj:
+        assert fobj.read().splitlines()[1].endswith('/100%25%20sure%20%26%20a%09b')
+    read = home.read_item(item.name)
+    assert read.original == str(odd)
+    assert read.deleted is not None
+    assert [found.name for found in home.items()] == [item.name]
+
+
+def test_topdir_trash_stores_relative_paths(tmpdir):
+    trash = TrashDir(str(tmpdir.join('.Trash-1')), str(tmpdir))
+    path = tmpdir.mkdir('sub').join('file')
+    path.write('x')
+    (_, item), = trash.put([str(path)])[0]
+    with open(item.info_path, 'r') as fobj:
+        assert 'Path=sub/file\n' in fobj.read()
+    assert trash.read_item(item.name).original == str(path)
+
+
+def test_name_collisions_get_a_number(tmpdir, home):
+    names = []
+    for parent in ('a', 'b', 'c'):
+        path = tmpdir.mkdir(parent).join('file')
+        path.write(parent)
+        (_, item), = home.put([str(path)])[0]
+        names.append(item.name)
+    assert names == ['file', 'file.2', 'file.3']
+    # A name taken only in info/ is skipped as well
+    os.unlink(os.path.join(home.files_dir, 'file.2'))
+    path = tmpdir.join('file')
+    path.write('d')
+    (_, item), = home.put([str(path)])[0]
+    assert item.name == 'file.4'
+
+
+def test_restore(tmpdir, home):
+    path = tmpdir.mkdir('gone').join('file')
+    path.write('content')
+    (_, item), = home.put([str(path)])[0]
+    assert not path.check()
+    tmpdir.join('gone').remove()
+    home.restore(item)
+    assert path.read() == 'content'
+    assert not os.path.exists(item.info_path)
+    assert home.items() == []
+
+
+def test_restore_refuses_to_overwrite(tmpdir, home):
+    path = tmpdir.join('file')
+    path.write('old')
+    (_, item), = home.put([str(path)])[0]
+    path.write('new')
+    with pytest.raises(TrashError):
+        home.restore(item)
+    assert path.read() == 'new'
+    assert os.path.exists(item.path) and os.path.exists(item.info_path)
+
+
+def test_tree_size_of_a_deep_tree(tmpdir):
+    path = str(tmpdir)
+    dirs = []
+    for _ in range(1200):
+        path = os.path.join(path, 'd')
+        os.mkdir(path)
+        with open(os.path.join(path, 'f'), 'w') as fobj:
+            fobj.write('xy')
+        dirs.append(path)
+    try:
+        assert tree_size(str(tmpdir)) == 2400
+    finally:
+        # Too deep for the recursive cleanup of tmpdir
+        for path in reversed(dirs):
+            os.unlink(os.path.join(path, 'f'))
+            os.rmdir(path)
+
+
+def test_directory_sizes(tmpdir, home):
+    path = tmpdir.mkdir('dir')
+    path.join('file').write('x' * 10)
+    path.mkdir('sub').join('file').write('x' * 5)
+    (_, item), = home.put([str(path)])[0]
+    assert home.directory_sizes() == {item.name: 15}
+    assert os.path.exists(home.sizes_file)
+    os.unlink(item.path.rstrip('/') + '/file')
+    assert home.directory_sizes() == {item.name: 15}
+
+
+def test_trash_for_without_create(tmpdir, home, monkeypatch):
+    path = tmpdir.join('file')
+    path.write('x')
+    assert trash_for(str(path), create=False) == home
+    monkeypatch.setattr(trashmod, '_device', lambda path: -1)
+    monkeypatch.setattr(trashmod, '_topdir', lambda path: str(tmpdir))
+    trash = trash_for(str(path), create=False)
+    assert trash.path == str(tmpdir.join('.Trash-%d' % os.getuid()))
+    assert not os.path.exists(trash.path)
+    assert trash_for(str(path)) == trash
+    assert os.path.isdir(trash.files_dir)
@@ -0,0 +1,75 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import random
+import re
+import threading
+
+import pytest
+
+from plugins.ranger_ext.trigram import TrigramIndex, required_literals, trigrams
+
+
+PATTERNS = [
+    'a{100}', 'foo{1,3}bar', 'ab{,2}cde', r'\x41BCD', r'ABCD', r'\101bcd',
+    r'\0123xyz', r'\12345', r'(ab)\1cdef', r'(a)\1xyzw', r'\N{DIGIT ONE}abcd',
+    r'x\.yz?w', 'abc+def', 'a[bc]def', 'ab{x}cd', '(abc)?defg', r'\d\d\dabc',
+    '[^]abc]def', '[]x]yz', r'[\]abc]def', r'[^\]xyz]abcd',
+]
+
+
+def may_contain(pattern, text):
+    """Whether text has the trigrams of every literal of pattern"""
+    found = trigrams(text.encode('utf-8'))
+    return all(trigrams(literal.encode('utf-8')) <= found
+               for literal in required_literals(pattern))
+
+
+def test_quantifier_bodies_and_escape_payloads_are_not_literals():
+    assert required_literals('a{100}') == []
+    assert required_literals('foo{1,3}bar') == ['bar']
+    assert required_literals(r'\x41BC') == []
+    assert required_literals(r'\101bcd') == ['bcd']
+    assert required_literals(r'(ab)\1cde') == ['cde']
+    assert required_literals('abcdef') == ['abcdef']
+
+
+def test_brackets_inside_classes_do_not_end_them():
+    assert required_literals('[^]abc]def') == ['def']
+    assert required_literals('[]x]yz') == []
+    assert required_literals('[]x]yzw') == ['yzw']
+    assert required_literals(r'[\]abc]def') == ['def']
+
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_no_false_negatives(pattern):
+    regex = re.compile(pattern)
+    rng = random.Random(pattern)
+    alphabet = 'aAbBcCdDeEfFgwxyz0123456789.1'
+    for _ in range(300):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        if regex.search(text):
+            assert may_contain(pattern, text), (pattern, text)
+    # Texts built from a match itself
+    for literal in ['a' * 100, 'foobar', 'fooobar', 'acde', 'ABCD', 'Abcd',
+                    '\n3xyz', 'S45', 'ababcdef', 'a\x01xyz', '1abcd', 'x.yw',
+                    'abccdef', 'acdef', 'ab{x}cd', 'defg', '123abc', 'xdef',
+                    ']yz', 'xyz', 'zabcd']:
+        if regex.search(literal):
+            assert may_contain(pattern, literal), (pattern, literal)
+
+
+def test_index_finds_files_with_matches(tmpdir):
+    root = tmpdir.mkdir('root')
+    root.join('one').write('x = "AAAA"\n')
+    root.join('two').write('foooobar\n')
+    root.join('three').write('nothing here\n')
+    index = TrigramIndex(str(root), str(tmpdir.join('index')))
+    built = threading.Event()
+    index.build(on_finish=lambda _: built.set())
+    assert built.wait(10)
+    for pattern, expected in [(r'\x41{4}', 'one'), ('fo{2,}bar', 'two')]:
+        may_match = index.filter_for(pattern)
+        path = os.path.join(str(root), expected)
+        assert may_match(path, os.stat(path))
+    assert index.estimated_size > 0
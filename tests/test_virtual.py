@@ -0,0 +1,69 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from ranger.container.file import File
+
+from plugins.ranger_ext.virtual import VirtualListing
+
+
+class Settings(object):  # pylint: disable=too-few-public-methods
+    show_hidden = True
+    hidden_filter = ''
+
+
+class FM(object):
+    def __init__(self):
+        self.settings = Settings()
+        self.ui = type('UI', (object, ), {'need_redraw': False})()
+        self.handlers = []
+
+    def signal_bind(self, name, function):
+        self.handlers.append((name, function))
+        return (name, function)
+
+    def signal_unbind(self, handler):
+        self.handlers.remove(handler)
+
+
+class Directory(object):  # pylint: disable=too-few-public-methods
+    flat = 0
+    filter = None
+    temporary_filter = None
+
+    def __init__(self, path):
+        self.path = path
+        self.filter_stack = []
+        self.files_all = self.files = []
+        self.load_content_mtime = -1
+        self.content_outdated = True
+
+
+def make_listing(tmpdir):
+    directory = Directory(str(tmpdir))
+    listing = VirtualListing(directory)
+    listing.fm = FM()
+    listing.begin()
+    return directory, listing
+
+
+def test_directory_is_pinned_while_virtual(tmpdir):
+    directory, listing = make_listing(tmpdir)
+    assert directory.load_content_mtime == os.stat(str(tmpdir)).st_mtime
+    assert not directory.content_outdated
+    tmpdir.join('new').write('')
+    directory.content_outdated = True
+    listing.publish([File(str(tmpdir.join('new')))])
+    assert directory.load_content_mtime == os.stat(str(tmpdir)).st_mtime
+    assert not directory.content_outdated
+    assert [f.basename for f in directory.files] == ['new']
+
+
+def test_listing_stops_when_the_directory_is_reloaded(tmpdir):
+    directory, listing = make_listing(tmpdir)
+    assert not listing.replaced
+    directory.files_all = directory.files = ['reloaded']
+    assert listing.replaced
+    listing.publish([File(str(tmpdir.join('found')))])
+    assert directory.files_all == ['reloaded']
+    assert not listing.fm.handlers
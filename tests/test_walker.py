@@ -0,0 +1,94 @@
+from __future__ import (absolute_import, division, print_function)
+
+import os
+
+from plugins.ranger_ext.walker import ParallelWalker
+
+
+def walk(walker, directories=None):
+    walker.start(directories)
+    found = []
+    while not walker.finished:
+        found.extend(walker.get_batch(timeout=0.05))
+    return found
+
+
+def make_tree(root):
+    root.join('top').write('')
+    root.mkdir('a').join('file').write('')
+    root.join('a').mkdir('deeper').join('file').write('')
+    root.mkdir('.git').join('config').write('')
+
+
+def names(entries, root):
+    return sorted(os.path.relpath(entry.path, str(root)) for entry in entries)
+
+
+def test_walk_reports_every_entry_with_its_depth(tmpdir):
+    make_tree(tmpdir)
+    found = walk(ParallelWalker(str(tmpdir), workers=3))
+    assert names(found, tmpdir) == ['.git', '.git/config', 'a', 'a/deeper',
+                                    'a/deeper/file', 'a/file', 'top']
+    depths = dict((entry.name, entry.depth) for entry in found if entry.is_dir)
+    assert depths == {'.git': 1, 'a': 1, 'deeper': 2}
+
+
+def test_skip_accept_and_max_depth(tmpdir):
+    make_tree(tmpdir)
+    found = walk(ParallelWalker(str(tmpdir), skip=lambda name: name == '.git',
+                                accept=lambda entry: not entry.is_dir))
+    assert names(found, tmpdir) == ['a/deeper/file', 'a/file', 'top']
+    found = walk(ParallelWalker(str(tmpdir), max_depth=1))
+    assert names(found, tmpdir) == ['.git', 'a', 'top']
+
+
+def test_symlink_loops_are_entered_once(tmpdir):
+    make_tree(tmpdir)
+    tmpdir.join('a', 'deeper', 'loop').mksymlinkto(tmpdir.join('a'))
+    found = walk(ParallelWalker(str(tmpdir), follow_links=True))
+    assert 'a/deeper/loop' in names(found, tmpdir)
+    assert not any('loop/' in name for name in names(found, tmpdir))
+    found = walk(ParallelWalker(str(tmpdir.join('a')), follow_links=False))
+    loop, = [entry for entry in found if entry.name == 'loop']
+    assert loop.is_dir and loop.stats[0] is not loop.stats[1]
+
+
+def test_unreadable_directories_are_counted(tmpdir, monkeypatch):
+    make_tree(tmpdir)
+    scandir = os.scandir
+    locked = str(tmpdir.join('a'))
+
+    def denying_scandir(path):
+        if path == locked:
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', denying_scandir)
+    walker = ParallelWalker(str(tmpdir))
+    found = walk(walker)
+    assert names(found, tmpdir) == ['.git', '.git/config', 'a', 'top']
+    assert walker.errors == 1 and walker.dirs_scanned == 2
+
+
+def test_on_directory_and_cached_listings(tmpdir):
+    make_tree(tmpdir)
+    listed = {}
+    walker = ParallelWalker(
+        str(tmpdir), on_directory=lambda path, entries: listed.setdefault(
+            path, sorted(entry.name for entry in entries)),
+        cached=lambda path, depth: [] if path.endswith('.git') else None)
+    found = walk(walker)
+    assert '.git/config' not in names(found, tmpdir)
+    assert walker.dirs_cached == 1 and walker.dirs_scanned == 3
+    assert listed[str(tmpdir.join('a'))] == ['deeper', 'file']
+
+
+def test_cancel_stops_the_walk(tmpdir):
+    for i in range(50):
+        tmpdir.mkdir('dir%d' % i).mkdir('sub')
+    walker = ParallelWalker(str(tmpdir), workers=2,
+                            on_directory=lambda path, entries: walker.cancel())
+    found = walk(walker)
+    assert walker.cancelled and walker.finished
+    assert walker.dirs_scanned == 1
+    assert len(found) == 50